@@ -0,0 +1,97 @@
+"""
+Storage file and list-response serialization on 50k synthetic transactions.
+
+Compares the previous encoding (json module, indent=4; FastAPI response_model
+validation of every item) with business.serialization (orjson when installed,
+compact) and routes.fast_json. Best of 5 runs (3 for HTTP), FastAPI TestClient.
+
+    python scripts/bench_serialization.py
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import List
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server')
+sys.path.insert(0, SERVER_DIR)
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from business import serialization  # noqa: E402
+from business.models import Transaction  # noqa: E402
+from business.routes import fast_json  # noqa: E402
+
+random.seed(0)
+TRANSACTIONS = [{
+    'id': f'{i:08d}-aaaa-bbbb-cccc-dddddddddddd',
+    'description': random.choice(['Mercado São João', 'Uber', 'Aluguel', 'Salário']),
+    'value': round(random.uniform(1, 999), 2),
+    'type': random.choice(['income', 'expense', 'investment']),
+    'category': 'geral',
+    'date': f'2025-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}',
+    'credit_card_id': None,
+    'created_at': '2025-01-01T10:00:00.000000',
+} for i in range(50000)]
+
+
+def best_ms(fn, runs=5):
+    best = float('inf')
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(), 'transactions.json')
+
+    def old_write():
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(TRANSACTIONS, f, indent=4, ensure_ascii=False)
+
+    def old_read():
+        with open(path, 'r', encoding='utf-8') as f:
+            json.load(f)
+
+    def new_write():
+        with open(path, 'wb') as f:
+            serialization.dump(TRANSACTIONS, f)
+
+    def new_read():
+        with open(path, 'rb') as f:
+            serialization.load(f)
+
+    old_write()
+    old_size = os.path.getsize(path)
+    old_write_ms, old_read_ms = best_ms(old_write), best_ms(old_read)
+    new_write()
+    new_size = os.path.getsize(path)
+    new_write_ms, new_read_ms = best_ms(new_write), best_ms(new_read)
+    print(f"orjson installed: {serialization.HAS_ORJSON}")
+    print(f"file write  {old_write_ms:6.0f} ms -> {new_write_ms:6.0f} ms")
+    print(f"file read   {old_read_ms:6.0f} ms -> {new_read_ms:6.0f} ms")
+    print(f"file size   {old_size / 1e6:6.1f} MB -> {new_size / 1e6:6.1f} MB")
+
+    app = FastAPI()
+
+    @app.get('/old', response_model=List[Transaction])
+    async def old_list():
+        return TRANSACTIONS
+
+    @app.get('/new', response_model=List[Transaction])
+    async def new_list():
+        return fast_json(TRANSACTIONS, Transaction)
+
+    client = TestClient(app)
+    assert client.get('/old').json() == client.get('/new').json()
+    old_ms = best_ms(lambda: client.get('/old'), 3)
+    new_ms = best_ms(lambda: client.get('/new'), 3)
+    print(f"GET 50k     {old_ms:6.0f} ms -> {new_ms:6.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
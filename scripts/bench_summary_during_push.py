@@ -0,0 +1,88 @@
+"""
+GET /summary latency while a blocking POST /sync/push runs.
+
+Four clients poll /summary, first while the server is idle and then during a
+full push whose Firestore writes are stubbed to block 250 ms per collection.
+Uses an in-process ASGI client and a temporary data directory.
+
+    python scripts/bench_summary_during_push.py
+
+For the numbers without the worker-thread offloading, run it against a
+checkout from before it was introduced:
+
+    git worktree add /tmp/before <commit>^ && python scripts/bench_summary_during_push.py /tmp/before/server
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+SERVER_DIR = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server')
+sys.path.insert(0, SERVER_DIR)
+
+from business import storage, firebase_sync  # noqa: E402
+storage.BASE_DATA_DIR = tempfile.mkdtemp()
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from business.routes import router  # noqa: E402
+
+
+def slow_push_collection(uid, name, data, only_changed=False):
+    time.sleep(0.25)   # a blocking Firestore round trip
+    return {"count": len(data), "deleted": 0, "unchanged": 0, "failed": 0, "seconds": 0.25, "docs_per_sec": 0.0}
+
+
+firebase_sync.is_firebase_available = lambda: True
+firebase_sync.push_collection = slow_push_collection
+# Trees from before push_collection existed push through this one
+firebase_sync.sync_collection_to_firebase = lambda uid, name, data: slow_push_collection(uid, name, data)["count"]
+firebase_sync.update_sync_metadata = lambda uid, sync_type: None
+firebase_sync.check_legacy_data_exists = lambda uid: False
+firebase_sync.auto_sync_collection = lambda uid, collection_name: True
+try:
+    from business import outbox  # noqa: E402
+    outbox.enqueue = lambda uid, collection_name: None
+except ImportError:
+    pass
+
+app = FastAPI()
+app.include_router(router, prefix='/api/business')
+
+
+async def main():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        for i in range(200):
+            await client.post('/api/business/transactions?uid=u1', json={
+                'description': 'x', 'value': i, 'type': 'expense', 'category': 'c',
+                'date': f'2026-01-{i % 28 + 1:02d}'})
+
+        async def poll_summary(stop, latencies):
+            while not stop.is_set():
+                started = time.perf_counter()
+                response = await client.get('/api/business/summary?uid=u2')
+                assert response.status_code == 200
+                latencies.append((time.perf_counter() - started) * 1000)
+                await asyncio.sleep(0.005)
+
+        for label, push in (('idle', False), ('during push', True)):
+            latencies, stop = [], asyncio.Event()
+            pollers = [asyncio.create_task(poll_summary(stop, latencies)) for _ in range(4)]
+            if push:
+                started = time.perf_counter()
+                response = await client.post('/api/business/sync/push?uid=u1')
+                print(f"  push took {(time.perf_counter() - started) * 1000:.0f} ms -> {response.status_code}")
+            else:
+                await asyncio.sleep(2)
+            stop.set()
+            await asyncio.gather(*pollers)
+            latencies.sort()
+            pct = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+            print(f"  {label:12s} n={len(latencies):5d} p50={pct(.5):7.1f} ms "
+                  f"p99={pct(.99):7.1f} ms max={latencies[-1]:7.1f} ms")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -44,7 +44,7 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Em desenvolvimento, permitir todas as origens
     allow_credentials=False,  # Não permitir credentials quando allow_origins=["*"]
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+    allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
     allow_headers=["*"],
     expose_headers=["*"],
 )
@@ -208,6 +208,7 @@ async def read_url(request: ReadUrlRequest):
 
 # ===== MEMORY ENDPOINTS =====
 from memory import save_memory, search_memories, list_memories, delete_memory, get_memory_count, update_memory
+from business.executor import run_blocking
 
 class MemorySaveRequest(BaseModel):
     user_id: str
@@ -238,7 +239,8 @@ async def api_save_memory(request: MemorySaveRequest):
     """Salva uma nova memória para o usuário."""
     from fastapi.responses import JSONResponse
     try:
-        memory_id = save_memory(
+        memory_id = await run_blocking(
+            'memory', save_memory,
             user_id=request.user_id,
             content=request.content,
             memory_type=request.memory_type,
@@ -265,7 +267,8 @@ async def api_save_memory(request: MemorySaveRequest):
 @app.post("/api/memory/search")
 async def api_search_memories(request: MemorySearchRequest):
     """Busca memórias semanticamente similares."""
-    results = search_memories(
+    results = await run_blocking(
+        'memory', search_memories,
         user_id=request.user_id,
         query=request.query,
         n_results=request.n_results,
@@ -280,8 +283,8 @@ async def api_list_memories(user_id: str, limit: int = 50):
     """Lista todas as memórias de um usuário."""
     from fastapi.responses import JSONResponse
     try:
-        memories = list_memories(user_id, limit=limit)
-        count = get_memory_count(user_id)
+        memories = await run_blocking('memory', list_memories, user_id, limit=limit)
+        count = await run_blocking('memory', get_memory_count, user_id)
         
         return JSONResponse(
             content={"memories": memories, "total": count},
@@ -301,7 +304,8 @@ async def api_list_memories(user_id: str, limit: int = 50):
 async def api_update_memory(request: MemoryUpdateRequest):
     """Atualiza uma memória existente."""
     from fastapi.responses import JSONResponse
-    success = update_memory(
+    success = await run_blocking(
+        'memory', update_memory,
         user_id=request.user_id,
         memory_id=request.memory_id,
         content=request.content,
@@ -325,7 +329,7 @@ async def api_update_memory(request: MemoryUpdateRequest):
 async def api_delete_memory(request: MemoryDeleteRequest):
     """Deleta uma memória específica."""
     from fastapi.responses import JSONResponse
-    success = delete_memory(request.user_id, request.memory_id)
+    success = await run_blocking('memory', delete_memory, request.user_id, request.memory_id)
     
     if success:
         return JSONResponse(
@@ -342,6 +346,13 @@ async def api_delete_memory(request: MemoryDeleteRequest):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=3001)
+    # LUNA_WORKERS > 1 runs several worker processes; business storage locks
+    # its files, so they can share data/business
+    workers = int(os.getenv("LUNA_WORKERS", "1"))
+    if workers > 1:
+        uvicorn.run("app:app", host="0.0.0.0", port=3001, workers=workers,
+                    app_dir=os.path.dirname(os.path.abspath(__file__)))
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=3001)
 
 
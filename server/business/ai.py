@@ -24,8 +24,7 @@ def suggest_category(description: str, transaction_type: str = "expense") -> Tup
     desc_norm = normalize_text(description)
     
     # 1. Historical Pattern Matching
-    transactions = storage.get_transactions({'limit': 1000})
-    same_type_txs = [tx for tx in transactions if tx.get('type') == transaction_type]
+    same_type_txs = storage.query_transactions(types=transaction_type, limit=1000)
     
     if same_type_txs:
         # Check for exact normalized description matches first (high confidence)
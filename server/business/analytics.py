@@ -6,27 +6,20 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 from collections import defaultdict
 from . import storage
+from . import rollups
 
 def get_cash_flow_data(months: int = 6) -> List[Dict]:
     """
     Returns income/expense totals per month for chart visualization.
     """
-    transactions = storage.get_transactions({'limit': 1000})
-    
-    # Group by month
-    monthly_data = defaultdict(lambda: {'income': 0.0, 'expense': 0.0})
-    
-    for tx in transactions:
-        try:
-            date = datetime.strptime(tx['date'], '%Y-%m-%d')
-            month_key = date.strftime('%Y-%m')
-            
-            if tx['type'] == 'income':
-                monthly_data[month_key]['income'] += tx['value']
-            else:
-                monthly_data[month_key]['expense'] += tx['value']
-        except:
-            continue
+    # Anything that isn't income counts as an expense here
+    monthly_data = {
+        month_key: {
+            'income': totals['income'],
+            'expense': totals['expense'] + totals['investment'] + totals['other']
+        }
+        for month_key, totals in rollups.totals_by_period().items()
+    }
     
     # Get last N months
     today = datetime.now()
@@ -52,8 +45,6 @@ def get_category_breakdown(period: str = 'month') -> List[Dict]:
     """
     Returns spending by category for pie chart visualization.
     """
-    transactions = storage.get_transactions({'limit': 500})
-    
     # Filter by period
     today = datetime.now()
     if period == 'month':
@@ -63,21 +54,25 @@ def get_category_breakdown(period: str = 'month') -> List[Dict]:
     else:
         start_date = today - timedelta(days=365)
     
+    transactions = storage.query_transactions(
+        start_date=start_date.strftime('%Y-%m-%d'), types='expense'
+    )
+    
     # Group expenses by category
     category_totals = defaultdict(float)
     
     for tx in transactions:
-        if tx['type'] != 'expense':
-            continue
         try:
-            tx_date = datetime.strptime(tx['date'], '%Y-%m-%d')
-            if tx_date >= start_date:
-                category = tx.get('category', 'outros')
-                category_totals[category] += tx['value']
+            category = tx.get('category', 'outros')
+            category_totals[category] += tx['value']
         except:
             continue
-    
-    # Convert to list and sort
+    return category_breakdown(category_totals)
+
+def category_breakdown(category_totals: Dict[str, float]) -> List[Dict]:
+    """
+    Pie chart rows from already summed {category: spent}, largest first.
+    """
     result = [
         {'category': cat, 'value': round(val, 2)}
         for cat, val in category_totals.items()
@@ -94,8 +89,7 @@ def get_projections() -> Dict:
     - Pending bills
     """
     # Current balance
-    summary = storage.get_summary()
-    current_balance = summary.get('balance', 0.0)
+    current_balance = storage.get_balance()
     
     # Recurring items (expected income/expense)
     recurring_items = storage.get_recurring()
@@ -126,16 +120,17 @@ def get_projections() -> Dict:
         'trend': 'up' if projected_balance > current_balance else 'down'
     }
 
-def get_key_metrics() -> Dict:
+def get_key_metrics(summary: Optional[Dict] = None, categories: Optional[List[Dict]] = None) -> Dict:
     """
     Calculates key financial metrics:
     - Average daily spending
     - Savings rate
     - Top expense category
     - Transaction count
+    `summary` and `categories` (this month's breakdown) are computed when not given.
     """
-    transactions = storage.get_transactions({'limit': 500})
-    summary = storage.get_summary()
+    if summary is None:
+        summary = storage.get_summary()
     
     today = datetime.now()
     month_start = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
@@ -154,31 +149,28 @@ def get_key_metrics() -> Dict:
         savings_rate = ((monthly_income - monthly_expenses) / monthly_income) * 100
     
     # Top expense category this month
-    category_breakdown = get_category_breakdown('month')
-    top_category = category_breakdown[0] if category_breakdown else {'category': 'N/A', 'value': 0}
-    
-    # Transaction counts
-    month_txs = [
-        tx for tx in transactions
-        if tx.get('date', '').startswith(today.strftime('%Y-%m'))
-    ]
+    if categories is None:
+        categories = get_category_breakdown('month')
+    top_category = categories[0] if categories else {'category': 'N/A', 'value': 0}
     
     return {
         'avg_daily_spending': round(avg_daily_spending, 2),
         'savings_rate': round(savings_rate, 1),
         'top_category': top_category['category'],
         'top_category_value': top_category['value'],
-        'transaction_count': len(month_txs),
+        'transaction_count': summary.get('transaction_count', 0),
         'days_tracked': days_in_month
     }
 
-def get_full_analytics() -> Dict:
+def get_full_analytics(summary: Optional[Dict] = None, categories: Optional[List[Dict]] = None) -> Dict:
     """
     Returns all analytics data in a single response.
     """
+    if categories is None:
+        categories = get_category_breakdown('month')
     return {
         'cashflow': get_cash_flow_data(6),
-        'categories': get_category_breakdown('month'),
+        'categories': categories,
         'projections': get_projections(),
-        'metrics': get_key_metrics()
+        'metrics': get_key_metrics(summary, categories)
     }
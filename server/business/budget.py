@@ -9,7 +9,6 @@ def calculate_budget_usage(budget: Dict, transactions: List[Dict]) -> Dict:
     category = budget.get('category', '')
     period = budget.get('period', '') # YYYY-MM
     budget_type = budget.get('type', 'expense')
-    budget_amount = budget.get('amount', 0)
 
     # Filter transactions by month, category and type
     relevant_txs = [
@@ -20,7 +19,13 @@ def calculate_budget_usage(budget: Dict, transactions: List[Dict]) -> Dict:
     ]
 
     actual_amount = sum(float(tx.get('value', 0)) for tx in relevant_txs)
-    
+    return budget_with_actual(budget, actual_amount)
+
+def budget_with_actual(budget: Dict, actual_amount: float) -> Dict:
+    """
+    Usage fields for a budget item whose spending is already known.
+    """
+    budget_amount = budget.get('amount', 0)
     percentage = (actual_amount / budget_amount * 100) if budget_amount > 0 else 0
     
     status = "ok"
@@ -45,7 +50,7 @@ def get_budgets_with_usage(period: Optional[str] = None) -> List[Dict]:
         period = datetime.now().strftime("%Y-%m")
     
     budgets = storage.get_budget()
-    transactions = storage.get_transactions() # In real app, might want to filter by month first
+    transactions = storage.get_transactions_for_period(period)
     
     period_budgets = [b for b in budgets if b.get('period') == period]
     
@@ -102,7 +107,7 @@ def check_budget_impact(category: str, value: float, tx_type: str = 'expense') -
         return None
     
     # Calculate new usage
-    transactions = storage.get_transactions()
+    transactions = storage.query_transactions(period=period, categories=category, types='expense')
     usage = calculate_budget_usage(matching_budget, transactions)
     
     return {
@@ -16,7 +16,12 @@ def calculate_card_metrics(card: Dict, transactions: List[Dict]) -> Dict:
             tx.get('credit_card_id') == card_id and
             tx.get('date', '').startswith(current_period)):
             current_bill += float(tx.get('value', 0))
-            
+    return card_with_bill(card, current_bill)
+
+def card_with_bill(card: Dict, current_bill: float) -> Dict:
+    """
+    Metrics for a credit card whose current bill is already known.
+    """
     limit = float(card.get('limit', 0))
     used_limit_base = float(card.get('used_limit', 0))
     
@@ -52,7 +57,8 @@ def get_cards_with_metrics() -> List[Dict]:
     Get all credit cards with their calculated metrics.
     """
     cards = storage.get_cards()
-    transactions = storage.get_transactions({'limit': 1000}) # Load enough to cover the month
+    # Metrics only look at the current month
+    transactions = storage.query_transactions(period=datetime.now().strftime("%Y-%m"), types='expense')
     
     return [calculate_card_metrics(c, transactions) for c in cards]
 
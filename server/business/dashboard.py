@@ -0,0 +1,112 @@
+"""
+Dashboard Module - Everything the Main Screen Shows, in One Call
+Builds the summary, budgets, cards, goals, piggy bank summary, notifications
+and analytics together. Each collection is loaded once and the transactions
+the views need (the requested month through the end of the data) are
+traversed once; the per-view helpers then work from those totals instead of
+each scanning the transactions again.
+"""
+import os
+import threading
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from . import storage
+from . import budget
+from . import credit_cards
+from . import goals
+from . import piggy_banks
+from . import notifications
+from . import analytics
+
+def get_dashboard(period: Optional[str] = None) -> Dict:
+    """
+    All main screen views. `period` (YYYY-MM, default this month) applies to
+    the summary and budgets, like on their own endpoints; everything else is
+    about the current month.
+    """
+    today = datetime.now()
+    current = today.strftime("%Y-%m")
+    period = period or current
+    month_start = today.replace(day=1).strftime('%Y-%m-%d')
+
+    # --- One pass over the transactions ---
+    budget_totals = defaultdict(float)   # (month, category, type) -> sum
+    card_bills = defaultdict(float)      # card id -> this month's expenses
+    category_totals = defaultdict(float) # category -> expenses since month start
+    for tx in storage.query_transactions(start_date=min(period, current)):
+        tx_date = tx.get('date', '')
+        tx_type = tx.get('type')
+        try:
+            value = float(tx.get('value', 0))
+        except (TypeError, ValueError):
+            continue
+        budget_totals[(tx_date[:7], tx.get('category', '').lower(), tx_type)] += value
+        if tx_type == 'expense':
+            if tx_date.startswith(current):
+                card_bills[tx.get('credit_card_id')] += value
+            if tx_date >= month_start:
+                category_totals[tx.get('category', 'outros')] += value
+
+    all_budgets = storage.get_budget()
+
+    def budgets_for(month: str):
+        return [
+            budget.budget_with_actual(b, budget_totals.get(
+                (month, b.get('category', '').lower(), b.get('type', 'expense')), 0.0))
+            for b in all_budgets if b.get('period') == month
+        ]
+
+    budgets = budgets_for(period)
+    current_budgets = budgets if period == current else budgets_for(current)
+
+    summary = storage.get_summary(period)
+    current_summary = summary if period == current else storage.get_summary(current)
+
+    cards = [credit_cards.card_with_bill(c, card_bills.get(c.get('id'), 0.0)) for c in storage.get_cards()]
+    goals_with_metrics = goals.get_goals_with_metrics(current_summary)
+    categories = analytics.category_breakdown(category_totals)
+
+    active = notifications.generate_notifications(
+        budgets=current_budgets, cards=cards, balance=summary['balance'],
+        goals_with_metrics=goals_with_metrics)
+
+    return {
+        "period": period,
+        "summary": summary,
+        "budgets": budgets,
+        "cards": cards,
+        "goals": goals_with_metrics,
+        "piggy_banks": piggy_banks.get_piggy_bank_summary(),
+        "notifications": [n.dict() for n in active],
+        "analytics": analytics.get_full_analytics(current_summary, categories)
+    }
+
+# =============================================================================
+# RESPONSE CACHE
+# =============================================================================
+# Encoded dashboards by (user, period), tagged with the collection version
+# tag they were built at. A tag only matches while none of the collections
+# changed, so other clients of the same user polling the dashboard get the
+# stored bytes instead of a rebuild.
+
+CACHE_USERS = int(os.getenv('LUNA_DASHBOARD_CACHE_USERS', '256'))
+
+_cache: "OrderedDict[Tuple[str, Optional[str]], Tuple[str, bytes]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+def get_cached(key: Tuple[str, Optional[str]], tag: str) -> Optional[bytes]:
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is None or entry[0] != tag:
+            return None
+        _cache.move_to_end(key)
+        return entry[1]
+
+def remember(key: Tuple[str, Optional[str]], tag: str, content: bytes):
+    with _cache_lock:
+        _cache[key] = (tag, content)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_USERS:
+            _cache.popitem(last=False)
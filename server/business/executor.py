@@ -0,0 +1,66 @@
+"""
+Blocking Work Execution
+Route handlers are async, but storage (file/SQLite I/O), Firestore and the
+embedding model are synchronous. Blocking calls go through run_blocking()
+(or the @offload decorator) so they run on worker threads instead of
+stalling the event loop.
+
+Each subsystem has its own concurrency limit, so a long sync push or a
+burst of embedding calls can't take every worker thread away from the
+cheap storage reads:
+    storage    LUNA_LIMIT_STORAGE    (default 16)
+    firestore  LUNA_LIMIT_FIRESTORE  (default 4)
+    memory     LUNA_LIMIT_MEMORY     (default 2)
+The request's context (the storage user context included) is carried into
+the worker thread.
+"""
+import contextvars
+import functools
+import os
+from typing import Callable, Dict
+
+from anyio import CapacityLimiter, to_thread
+
+SUBSYSTEM_LIMITS = {
+    'storage': int(os.getenv('LUNA_LIMIT_STORAGE', '16')),
+    'firestore': int(os.getenv('LUNA_LIMIT_FIRESTORE', '4')),
+    'memory': int(os.getenv('LUNA_LIMIT_MEMORY', '2')),
+}
+
+_limiters: Dict[str, CapacityLimiter] = {}
+
+def _limiter(subsystem: str) -> CapacityLimiter:
+    # Created lazily: a limiter must be created inside a running event loop
+    limiter = _limiters.get(subsystem)
+    if limiter is None:
+        limiter = _limiters[subsystem] = CapacityLimiter(SUBSYSTEM_LIMITS[subsystem])
+    return limiter
+
+async def run_blocking(subsystem: str, func: Callable, *args, **kwargs):
+    """Run a blocking call on a worker thread, within the subsystem's limit."""
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, func, *args, **kwargs)
+    return await to_thread.run_sync(call, limiter=_limiter(subsystem))
+
+def offload(subsystem: str):
+    """
+    Turn a synchronous route handler into an async one whose body runs via
+    run_blocking. FastAPI still sees the original signature.
+    """
+    def decorator(func: Callable):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await run_blocking(subsystem, func, *args, **kwargs)
+        return wrapper
+    return decorator
+
+def get_limiter_stats() -> Dict[str, Dict]:
+    """Current use of each subsystem's limit, for monitoring."""
+    return {
+        name: {
+            "limit": SUBSYSTEM_LIMITS[name],
+            "in_use": _limiters[name].borrowed_tokens if name in _limiters else 0,
+            "waiting": _limiters[name].statistics().tasks_waiting if name in _limiters else 0
+        }
+        for name in SUBSYSTEM_LIMITS
+    }
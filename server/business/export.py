@@ -1,8 +1,9 @@
 import csv
 import io
-import json
 from typing import List, Dict
 from . import storage
+from . import serialization
+from . import rollups
 
 def export_transactions_csv() -> str:
     """
@@ -30,9 +31,10 @@ def export_transactions_csv() -> str:
         
     return output.getvalue()
 
-def export_full_report_json() -> str:
+def export_full_report_json() -> bytes:
     """
-    Generates a full JSON report containing all business data (backup-like).
+    Generates a full JSON report containing all business data (backup-like),
+    encoded as indented UTF-8 JSON.
     """
     data = {
         "summary": storage.get_summary(),
@@ -50,19 +52,19 @@ def export_full_report_json() -> str:
     from . import tags
     data["tags"] = tags.load_tags()
     
-    return json.dumps(data, indent=4, ensure_ascii=False)
+    return serialization.dumps(data, pretty=True)
 
 def get_report_summary() -> Dict:
     """
     Generates a dictionary summary for reporting purposes.
     """
     summary = storage.get_summary()
-    transactions = storage.get_transactions()
+    totals = rollups.all_time_totals()
     
     # Simple stats
-    total_txs = len(transactions)
-    income_txs = len([t for t in transactions if t.get('type') == 'income'])
-    expense_txs = len([t for t in transactions if t.get('type') == 'expense'])
+    total_txs = totals['count']
+    income_txs = totals['income_count']
+    expense_txs = totals['expense_count']
     
     return {
         **summary,
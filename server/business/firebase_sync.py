@@ -2,10 +2,13 @@
 Firebase Sync Module for Business Data
 Handles synchronization between local storage and Firestore.
 """
-from datetime import datetime
-from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import hashlib
 import os
 import sys
+import time
 
 # Add server directory to path for imports
 server_dir = os.path.join(os.path.dirname(__file__), '..')
@@ -31,6 +34,8 @@ except ImportError:
     except ImportError as e:
         print(f"[Firebase Sync] Firebase not available - running in offline mode: {e}")
 
+from . import locks
+from . import serialization
 from . import storage
 
 # =============================================================================
@@ -50,6 +55,50 @@ COLLECTIONS = [
     'piggy_bank_transactions'
 ]
 
+# Pushes go out as WriteBatch commits of up to FIRESTORE_BATCH_SIZE writes
+# (Firestore's per-batch limit), at most LUNA_FIRESTORE_BATCH_CONCURRENCY in
+# flight at once. A batch commits atomically, so a failed one is retried as a
+# whole, up to LUNA_FIRESTORE_BATCH_RETRIES times with backoff.
+FIRESTORE_BATCH_SIZE = 500
+FIRESTORE_BATCH_CONCURRENCY = int(os.getenv('LUNA_FIRESTORE_BATCH_CONCURRENCY', '4'))
+FIRESTORE_BATCH_RETRIES = int(os.getenv('LUNA_FIRESTORE_BATCH_RETRIES', '3'))
+
+# Pulls read LUNA_FIRESTORE_PULL_PAGE_SIZE documents per query. After the
+# first, a pull only asks for documents pushed since the newest synced_at it
+# saw last time, minus LUNA_SYNC_PULL_OVERLAP_SECONDS for clock differences
+# between the devices that push.
+PULL_PAGE_SIZE = int(os.getenv('LUNA_FIRESTORE_PULL_PAGE_SIZE', '500'))
+PULL_OVERLAP_SECONDS = int(os.getenv('LUNA_SYNC_PULL_OVERLAP_SECONDS', '300'))
+
+# A full push or pull works on up to LUNA_FIRESTORE_COLLECTION_CONCURRENCY
+# collections at once, so it takes about as long as the slowest collection
+# (each of them still committing up to LUNA_FIRESTORE_BATCH_CONCURRENCY batches)
+COLLECTION_CONCURRENCY = int(os.getenv('LUNA_FIRESTORE_COLLECTION_CONCURRENCY', '4'))
+
+# =============================================================================
+# SYNC STATE
+# =============================================================================
+# For each collection a local document (sync_state.<collection>.json in the
+# user's directory) records the content hash of every record as last pushed
+# and the ids pushed as tombstones. Auto-sync compares the collection with it
+# and writes only new and changed records, plus tombstones for the ones that
+# are gone.
+
+def _sync_state_name(collection_name: str) -> str:
+    return f"sync_state.{collection_name}"
+
+def _sync_state_lock(uid: str, collection_name: str) -> locks.FileLock:
+    return locks.lock_for(os.path.join(storage.get_user_data_dir(uid), _sync_state_name(collection_name)))
+
+def _load_sync_state(collection_name: str) -> Dict:
+    state = storage._load_doc(_sync_state_name(collection_name)) or {}
+    # The loaded document is shared with the storage cache; work on copies
+    return {"docs": dict(state.get("docs", {})), "deleted": dict(state.get("deleted", {})),
+            "pulled_through": state.get("pulled_through")}
+
+def _save_sync_state(collection_name: str, state: Dict):
+    storage._save_doc(_sync_state_name(collection_name), state)
+
 # =============================================================================
 # CORE SYNC FUNCTIONS
 # =============================================================================
@@ -64,41 +113,138 @@ def is_firebase_available() -> bool:
     except:
         return False
 
-def sync_collection_to_firebase(uid: str, collection_name: str, data: List[Dict]) -> int:
+def _content_hash(item: Dict) -> str:
+    """Hash of a record's content, ignoring its sync stamp."""
+    content = {k: v for k, v in item.items() if k != 'synced_at'}
+    return hashlib.blake2b(serialization.dumps(content, sort_keys=True), digest_size=8).hexdigest()
+
+def _commit_batch(db, collection_ref, writes: List[Tuple]) -> bool:
+    """Apply (doc id, data, ...) writes in one WriteBatch, retrying the whole batch on failure."""
+    for attempt in range(FIRESTORE_BATCH_RETRIES + 1):
+        batch = db.batch()
+        for doc_id, data, *_ in writes:
+            batch.set(collection_ref.document(doc_id), data, merge=True)
+        try:
+            batch.commit()
+            return True
+        except Exception as e:
+            if attempt == FIRESTORE_BATCH_RETRIES:
+                print(f"[Firebase Sync] Batch of {len(writes)} failed after {attempt + 1} attempts: {e}")
+                return False
+            time.sleep(0.5 * 2 ** attempt)
+    return False
+
+def push_collection(uid: str, collection_name: str, data: List[Dict], only_changed: bool = False) -> Dict:
     """
-    Sync a collection to Firestore.
-    Returns number of documents synced.
+    Write a collection to Firestore in batches. Records the local sync state
+    no longer has are written as tombstones ({"deleted": true}). With
+    `only_changed`, records whose content matches what was last pushed are
+    skipped. Returns {"count", "deleted", "unchanged", "failed", "seconds", "docs_per_sec"}.
     """
+    stats = {"count": 0, "deleted": 0, "unchanged": 0, "failed": 0, "seconds": 0.0, "docs_per_sec": 0.0}
     if not is_firebase_available():
-        return 0
+        return stats
     
+    started = time.perf_counter()
     try:
         db = get_firestore()
         collection_ref = db.collection("users").document(uid).collection(f"business_{collection_name}")
         
-        count = 0
-        for item in data:
-            item_id = item.get('id')
-            if not item_id:
-                continue
+        with storage.user_context(uid), _sync_state_lock(uid, collection_name):
+            state = _load_sync_state(collection_name)
+            synced_at = datetime.now().isoformat()
             
-            # Add sync timestamp
-            item['synced_at'] = datetime.now().isoformat()
+            # (doc id, data, content hash or None for a tombstone)
+            writes = []
+            current = set()
+            for item in data:
+                item_id = item.get('id')
+                if not item_id:
+                    continue
+                digest = _content_hash(item)
+                current.add(item_id)
+                if only_changed and state['docs'].get(item_id) == digest:
+                    stats["unchanged"] += 1
+                    continue
+                doc = dict(item, synced_at=synced_at)
+                if item_id in state['deleted']:
+                    # Brings back a record that was pushed as a tombstone
+                    doc['deleted'] = False
+                writes.append((item_id, doc, digest))
+            for item_id in state['docs']:
+                if item_id not in current:
+                    writes.append((item_id, {"id": item_id, "deleted": True, "deleted_at": synced_at,
+                                             "synced_at": synced_at}, None))
             
-            collection_ref.document(item_id).set(item, merge=True)
-            count += 1
-        
-        print(f"[Firebase Sync] Synced {count} {collection_name} to Firebase for user {uid[:8]}...")
-        return count
-    
+            chunks = [writes[i:i + FIRESTORE_BATCH_SIZE] for i in range(0, len(writes), FIRESTORE_BATCH_SIZE)]
+            if len(chunks) <= 1:
+                committed = [_commit_batch(db, collection_ref, chunk) for chunk in chunks]
+            else:
+                with ThreadPoolExecutor(max_workers=min(FIRESTORE_BATCH_CONCURRENCY, len(chunks)),
+                                        thread_name_prefix="firestore-batch") as pool:
+                    committed = list(pool.map(lambda chunk: _commit_batch(db, collection_ref, chunk), chunks))
+            
+            # Failed writes keep their old state, so the next sync tries them again
+            for chunk, ok in zip(chunks, committed):
+                if not ok:
+                    stats["failed"] += len(chunk)
+                    continue
+                for item_id, _, digest in chunk:
+                    if digest is None:
+                        state['docs'].pop(item_id, None)
+                        state['deleted'][item_id] = synced_at
+                        stats["deleted"] += 1
+                    else:
+                        state['docs'][item_id] = digest
+                        state['deleted'].pop(item_id, None)
+                        stats["count"] += 1
+            if any(committed):
+                _save_sync_state(collection_name, state)
     except Exception as e:
         print(f"[Firebase Sync] Error syncing {collection_name}: {e}")
-        return 0
+        stats["error"] = str(e)
+    
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    if stats["seconds"] > 0:
+        stats["docs_per_sec"] = round((stats["count"] + stats["deleted"]) / stats["seconds"], 1)
+    return stats
+
+def sync_collection_to_firebase(uid: str, collection_name: str, data: List[Dict]) -> int:
+    """
+    Sync a collection to Firestore.
+    Returns number of documents synced.
+    """
+    stats = push_collection(uid, collection_name, data)
+    if stats["count"] or stats["deleted"] or stats["failed"]:
+        print(f"[Firebase Sync] Synced {stats['count']} {collection_name} to Firebase for user {uid[:8]}... "
+              f"({stats['deleted']} deleted, {stats['docs_per_sec']} docs/s, {stats['failed']} failed)")
+    return stats["count"]
+
+def _pull_pages(collection_ref, since: Optional[str] = None) -> Iterator[List]:
+    """
+    Documents of a Firestore collection, PULL_PAGE_SIZE at a time: all of them
+    (by id) or, with `since`, those with a later synced_at.
+    """
+    if since:
+        query = collection_ref.where('synced_at', '>', since).order_by('synced_at')
+    else:
+        query = collection_ref.order_by('__name__')
+    last = None
+    while True:
+        page_query = query.limit(PULL_PAGE_SIZE)
+        if last is not None:
+            page_query = page_query.start_after(last)
+        page = list(page_query.stream())
+        if page:
+            yield page
+        if len(page) < PULL_PAGE_SIZE:
+            return
+        last = page[-1]
 
 def sync_collection_from_firebase(uid: str, collection_name: str) -> List[Dict]:
     """
     Pull a collection from Firestore.
-    Returns list of documents.
+    Returns list of documents (tombstones of deleted records left out).
     """
     if not is_firebase_available():
         return []
@@ -106,14 +252,14 @@ def sync_collection_from_firebase(uid: str, collection_name: str) -> List[Dict]:
     try:
         db = get_firestore()
         collection_ref = db.collection("users").document(uid).collection(f"business_{collection_name}")
-        
-        docs = collection_ref.stream()
         data = []
-        for doc in docs:
-            item = doc.to_dict()
-            item['id'] = doc.id
-            data.append(item)
-        
+        for page in _pull_pages(collection_ref):
+            for doc in page:
+                item = doc.to_dict()
+                if item.get('deleted') is True:
+                    continue
+                item['id'] = doc.id
+                data.append(item)
         print(f"[Firebase Sync] Pulled {len(data)} {collection_name} from Firebase for user {uid[:8]}...")
         return data
     
@@ -121,52 +267,157 @@ def sync_collection_from_firebase(uid: str, collection_name: str) -> List[Dict]:
         print(f"[Firebase Sync] Error pulling {collection_name}: {e}")
         return []
 
-def sync_all_to_firebase(uid: str) -> Dict[str, int]:
+def _for_each_collection(uid: str, work: Callable[[str], Dict]) -> Dict[str, Dict]:
     """
-    Sync all collections to Firebase.
-    Returns dict with counts per collection.
+    Run `work(collection_name)` for every collection on a bounded pool, in
+    `uid`'s storage context. Each result gets the collection's "seconds"; a
+    collection that raises gets {"count": 0, "error"} without affecting the rest.
     """
-    # Set user context
-    storage.set_user_context(uid)
-    
-    results = {}
-    for collection_name in COLLECTIONS:
+    def run(collection_name: str) -> Dict:
+        started = time.perf_counter()
         try:
-            data = storage._load_json(collection_name)
-            count = sync_collection_to_firebase(uid, collection_name, data)
-            results[collection_name] = count
+            with storage.user_context(uid):
+                result = work(collection_name)
         except Exception as e:
             print(f"[Firebase Sync] Error with {collection_name}: {e}")
-            results[collection_name] = 0
+            result = {"count": 0, "error": str(e)}
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        return result
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(COLLECTION_CONCURRENCY, len(COLLECTIONS))),
+                            thread_name_prefix="firestore-collection") as pool:
+        return dict(zip(COLLECTIONS, pool.map(run, COLLECTIONS)))
+
+def push_all_to_firebase(uid: str) -> Dict:
+    """
+    Sync all collections to Firebase, several at a time.
+    Returns {"synced": {collection: count}, "stats": {collection: push_collection stats},
+    "count", "failed", "errors": {collection: error}, "seconds", "docs_per_sec"}.
+    """
+    started = time.perf_counter()
+    stats = _for_each_collection(
+        uid, lambda collection_name: push_collection(uid, collection_name, storage._load_json(collection_name)))
     
     # Update sync metadata
     update_sync_metadata(uid, 'push')
     
-    return results
+    seconds = round(time.perf_counter() - started, 3)
+    results = {name: s["count"] for name, s in stats.items()}
+    count = sum(results.values())
+    print(f"[Firebase Sync] Pushed {count} docs for user {uid[:8]}... in {seconds}s")
+    return {
+        "synced": results,
+        "stats": stats,
+        "count": count,
+        "failed": sum(s.get("failed", 0) for s in stats.values()),
+        "errors": {name: s["error"] for name, s in stats.items() if "error" in s},
+        "seconds": seconds,
+        "docs_per_sec": round(count / seconds, 1) if seconds > 0 else 0.0
+    }
 
-def sync_all_from_firebase(uid: str) -> Dict[str, int]:
+def sync_all_to_firebase(uid: str) -> Dict[str, int]:
     """
-    Pull all collections from Firebase and save locally.
+    Sync all collections to Firebase.
     Returns dict with counts per collection.
     """
-    # Set user context
-    storage.set_user_context(uid)
+    return push_all_to_firebase(uid)["synced"]
+
+def _pull_watermark(pulled_through: str) -> str:
+    """The synced_at an incremental pull starts after."""
+    try:
+        return (datetime.fromisoformat(pulled_through) - timedelta(seconds=PULL_OVERLAP_SECONDS)).isoformat()
+    except ValueError:
+        return pulled_through
+
+def _pull_and_save(uid: str, collection_name: str, full: bool = False) -> Dict:
+    """
+    Merge Firestore's documents into the local collection, one page at a
+    time: new and changed records are written by id and tombstones delete
+    theirs. Only documents pushed since the last pull are read, unless this
+    is the collection's first pull or `full` is set; a full pull also drops
+    local records Firestore doesn't have.
+    Returns {"count", "tombstones", "pages", "incremental"}.
+    """
+    db = get_firestore()
+    collection_ref = db.collection("users").document(uid).collection(f"business_{collection_name}")
     
-    results = {}
-    for collection_name in COLLECTIONS:
-        try:
-            data = sync_collection_from_firebase(uid, collection_name)
-            if data:
-                storage._save_json(collection_name, data)
-            results[collection_name] = len(data)
-        except Exception as e:
-            print(f"[Firebase Sync] Error with {collection_name}: {e}")
-            results[collection_name] = 0
+    with _sync_state_lock(uid, collection_name):
+        state = _load_sync_state(collection_name)
+        pulled_through = None if full else state["pulled_through"]
+        stats = {"count": 0, "tombstones": 0, "pages": 0, "incremental": pulled_through is not None}
+        pulled_at = datetime.now().isoformat()
+        seen = set()
+        
+        # Pages are written as they arrive, flushed to disk once at the end
+        with storage.group_commit():
+            for page in _pull_pages(collection_ref, _pull_watermark(pulled_through) if pulled_through else None):
+                _, index = storage._load_indexed(collection_name)
+                inserts, updates, deletes = [], [], []
+                for doc in page:
+                    item = doc.to_dict()
+                    synced_at = item.get('synced_at')
+                    if synced_at and (pulled_through is None or synced_at > pulled_through):
+                        pulled_through = synced_at
+                    seen.add(doc.id)
+                    if item.get('deleted') is True:
+                        deletes.append(doc.id)
+                        state["docs"].pop(doc.id, None)
+                        state["deleted"][doc.id] = item.get('deleted_at') or pulled_at
+                        continue
+                    item['id'] = doc.id
+                    (updates if doc.id in index else inserts).append(item)
+                    # What was just pulled is what Firestore has; nothing to push back
+                    state["docs"][doc.id] = _content_hash(item)
+                    state["deleted"].pop(doc.id, None)
+                storage._write_records(collection_name, inserts=inserts, updates=updates, deletes=deletes)
+                stats["count"] += len(inserts) + len(updates)
+                stats["tombstones"] += len(deletes)
+                stats["pages"] += 1
+            
+            if not stats["incremental"] and seen:
+                _, index = storage._load_indexed(collection_name)
+                stale = [record_id for record_id in index if record_id not in seen]
+                storage._write_records(collection_name, deletes=stale)
+                for record_id in stale:
+                    state["docs"].pop(record_id, None)
+        
+        # Saved after the data, so a crash in between only repeats this pull
+        state["pulled_through"] = pulled_through
+        _save_sync_state(collection_name, state)
+    
+    print(f"[Firebase Sync] Pulled {stats['count']} {collection_name} ({stats['tombstones']} deleted, "
+          f"{'incremental' if stats['incremental'] else 'full'}) from Firebase for user {uid[:8]}...")
+    return stats
+
+def pull_all_from_firebase(uid: str, full: bool = False) -> Dict:
+    """
+    Pull all collections from Firebase and merge them locally, several at a
+    time; only what changed since the last pull unless `full`.
+    Returns {"pulled": {collection: count}, "stats": {collection: _pull_and_save
+    stats + "seconds"}, "errors": {collection: error}, "seconds"}.
+    """
+    started = time.perf_counter()
+    if is_firebase_available():
+        stats = _for_each_collection(uid, lambda collection_name: _pull_and_save(uid, collection_name, full))
+    else:
+        stats = {name: {"count": 0, "tombstones": 0, "seconds": 0.0} for name in COLLECTIONS}
     
     # Update sync metadata
     update_sync_metadata(uid, 'pull')
     
-    return results
+    return {
+        "pulled": {name: s["count"] for name, s in stats.items()},
+        "stats": stats,
+        "errors": {name: s["error"] for name, s in stats.items() if "error" in s},
+        "seconds": round(time.perf_counter() - started, 3)
+    }
+
+def sync_all_from_firebase(uid: str, full: bool = False) -> Dict[str, int]:
+    """
+    Pull all collections from Firebase and save locally.
+    Returns dict with counts per collection.
+    """
+    return pull_all_from_firebase(uid, full)["pulled"]
 
 # =============================================================================
 # SYNC METADATA
@@ -213,10 +464,11 @@ def check_legacy_data_exists(uid: str) -> bool:
     legacy_dir = os.path.join(os.getcwd(), '_legacy', 'data', 'business', uid)
     return os.path.exists(legacy_dir) and os.path.isdir(legacy_dir)
 
-def migrate_legacy_data(uid: str) -> Dict[str, int]:
+def migrate_legacy_data(uid: str, on_progress: Optional[Callable[[str, int, int], None]] = None) -> Dict[str, int]:
     """
     Migrate data from legacy system to new structure.
-    Returns dict with counts of migrated items.
+    Returns dict with counts of migrated items. `on_progress(step, done, total)`
+    is called after each collection.
     """
     legacy_dir = os.path.join(os.getcwd(), '_legacy', 'data', 'business', uid)
     
@@ -224,104 +476,146 @@ def migrate_legacy_data(uid: str) -> Dict[str, int]:
         print(f"[Migration] No legacy data found for user {uid[:8]}...")
         return {}
     
-    # Set user context for new storage
-    storage.set_user_context(uid)
-    
-    results = {}
+    steps = ['transactions', 'tags', 'recurring', 'budget', 'goals', 'cards']
+    def report(step: str):
+        if on_progress:
+            on_progress(step, steps.index(step) + 1, len(steps))
+
+    # Write into the user's new storage
+    with storage.user_context(uid):
+        results = {}
     
-    # Migrate transactions
-    legacy_tx_path = os.path.join(legacy_dir, 'transactions.json')
-    if os.path.exists(legacy_tx_path):
-        try:
-            import json
-            with open(legacy_tx_path, 'r', encoding='utf-8') as f:
-                legacy_data = json.load(f)
+        # Migrate transactions
+        legacy_tx_path = os.path.join(legacy_dir, 'transactions.json')
+        if os.path.exists(legacy_tx_path):
+            try:
+                import json
+                with open(legacy_tx_path, 'r', encoding='utf-8') as f:
+                    legacy_data = json.load(f)
             
-            # Normalize date formats
-            normalized = []
-            for tx in legacy_data:
-                normalized_tx = normalize_legacy_transaction(tx)
-                normalized.append(normalized_tx)
+                # Normalize date formats
+                normalized = []
+                for tx in legacy_data:
+                    normalized_tx = normalize_legacy_transaction(tx)
+                    normalized.append(normalized_tx)
             
-            # Save to new structure
-            storage._save_json('transactions', normalized)
-            results['transactions'] = len(normalized)
-            print(f"[Migration] Migrated {len(normalized)} transactions for user {uid[:8]}...")
-        except Exception as e:
-            print(f"[Migration] Error migrating transactions: {e}")
-            results['transactions'] = 0
+                # Add to the new structure
+                _merge_legacy_records('transactions', normalized)
+                results['transactions'] = len(normalized)
+                print(f"[Migration] Migrated {len(normalized)} transactions for user {uid[:8]}...")
+            except Exception as e:
+                print(f"[Migration] Error migrating transactions: {e}")
+                results['transactions'] = 0
     
-    # Migrate tags
-    legacy_tags_path = os.path.join(legacy_dir, 'tags.json')
-    if os.path.exists(legacy_tags_path):
-        try:
-            import json
-            with open(legacy_tags_path, 'r', encoding='utf-8') as f:
-                legacy_tags = json.load(f)
+        report('transactions')
+
+        # Migrate tags
+        legacy_tags_path = os.path.join(legacy_dir, 'tags.json')
+        if os.path.exists(legacy_tags_path):
+            try:
+                import json
+                with open(legacy_tags_path, 'r', encoding='utf-8') as f:
+                    legacy_tags = json.load(f)
             
-            storage._save_json('tags', legacy_tags)
-            results['tags'] = len(legacy_tags)
-            print(f"[Migration] Migrated {len(legacy_tags)} tags for user {uid[:8]}...")
-        except Exception as e:
-            print(f"[Migration] Error migrating tags: {e}")
-            results['tags'] = 0
+                _merge_legacy_records('tags', legacy_tags)
+                results['tags'] = len(legacy_tags)
+                print(f"[Migration] Migrated {len(legacy_tags)} tags for user {uid[:8]}...")
+            except Exception as e:
+                print(f"[Migration] Error migrating tags: {e}")
+                results['tags'] = 0
 
-    # Migrate recurring
-    legacy_recurring_path = os.path.join(legacy_dir, 'recurring.json')
-    if os.path.exists(legacy_recurring_path):
-        try:
-            with open(legacy_recurring_path, 'r', encoding='utf-8') as f:
-                legacy_recurring = json.load(f)
-            storage._save_json('recurring', legacy_recurring)
-            results['recurring'] = len(legacy_recurring)
-            print(f"[Migration] Migrated {len(legacy_recurring)} recurring items for user {uid[:8]}...")
-        except Exception as e:
-            print(f"[Migration] Error migrating recurring: {e}")
-            results['recurring'] = 0
+        report('tags')
 
-    # Migrate budgets
-    legacy_budget_path = os.path.join(legacy_dir, 'budget.json')
-    if os.path.exists(legacy_budget_path):
-        try:
-            with open(legacy_budget_path, 'r', encoding='utf-8') as f:
-                legacy_budget = json.load(f)
-            storage._save_json('budget', legacy_budget)
-            results['budget'] = len(legacy_budget)
-            print(f"[Migration] Migrated {len(legacy_budget)} budgets for user {uid[:8]}...")
-        except Exception as e:
-            print(f"[Migration] Error migrating budgets: {e}")
-            results['budget'] = 0
+        # Migrate recurring
+        legacy_recurring_path = os.path.join(legacy_dir, 'recurring.json')
+        if os.path.exists(legacy_recurring_path):
+            try:
+                with open(legacy_recurring_path, 'r', encoding='utf-8') as f:
+                    legacy_recurring = json.load(f)
+                _merge_legacy_records('recurring', legacy_recurring)
+                results['recurring'] = len(legacy_recurring)
+                print(f"[Migration] Migrated {len(legacy_recurring)} recurring items for user {uid[:8]}...")
+            except Exception as e:
+                print(f"[Migration] Error migrating recurring: {e}")
+                results['recurring'] = 0
 
-    # Migrate goals
-    legacy_goals_path = os.path.join(legacy_dir, 'goals.json')
-    if os.path.exists(legacy_goals_path):
-        try:
-            with open(legacy_goals_path, 'r', encoding='utf-8') as f:
-                legacy_goals = json.load(f)
-            storage._save_json('goals', legacy_goals)
-            results['goals'] = len(legacy_goals)
-            print(f"[Migration] Migrated {len(legacy_goals)} goals for user {uid[:8]}...")
-        except Exception as e:
-            print(f"[Migration] Error migrating goals: {e}")
-            results['goals'] = 0
+        report('recurring')
 
-    # Migrate cards
-    legacy_cards_path = os.path.join(legacy_dir, 'credit_cards.json')
-    if os.path.exists(legacy_cards_path):
-        try:
-            with open(legacy_cards_path, 'r', encoding='utf-8') as f:
-                legacy_cards = json.load(f)
-            storage._save_json('cards', legacy_cards)
-            results['cards'] = len(legacy_cards)
-            print(f"[Migration] Migrated {len(legacy_cards)} cards for user {uid[:8]}...")
-        except Exception as e:
-            print(f"[Migration] Error migrating cards: {e}")
-            results['cards'] = 0
+        # Migrate budgets
+        legacy_budget_path = os.path.join(legacy_dir, 'budget.json')
+        if os.path.exists(legacy_budget_path):
+            try:
+                with open(legacy_budget_path, 'r', encoding='utf-8') as f:
+                    legacy_budget = json.load(f)
+                _merge_legacy_records('budget', legacy_budget)
+                results['budget'] = len(legacy_budget)
+                print(f"[Migration] Migrated {len(legacy_budget)} budgets for user {uid[:8]}...")
+            except Exception as e:
+                print(f"[Migration] Error migrating budgets: {e}")
+                results['budget'] = 0
+
+        report('budget')
+
+        # Migrate goals
+        legacy_goals_path = os.path.join(legacy_dir, 'goals.json')
+        if os.path.exists(legacy_goals_path):
+            try:
+                with open(legacy_goals_path, 'r', encoding='utf-8') as f:
+                    legacy_goals = json.load(f)
+                _merge_legacy_records('goals', legacy_goals)
+                results['goals'] = len(legacy_goals)
+                print(f"[Migration] Migrated {len(legacy_goals)} goals for user {uid[:8]}...")
+            except Exception as e:
+                print(f"[Migration] Error migrating goals: {e}")
+                results['goals'] = 0
+
+        report('goals')
 
-    # Mark migration as complete
-    mark_migration_complete(uid)
+        # Migrate cards
+        legacy_cards_path = os.path.join(legacy_dir, 'credit_cards.json')
+        if os.path.exists(legacy_cards_path):
+            try:
+                with open(legacy_cards_path, 'r', encoding='utf-8') as f:
+                    legacy_cards = json.load(f)
+                _merge_legacy_records('cards', legacy_cards)
+                results['cards'] = len(legacy_cards)
+                print(f"[Migration] Migrated {len(legacy_cards)} cards for user {uid[:8]}...")
+            except Exception as e:
+                print(f"[Migration] Error migrating cards: {e}")
+                results['cards'] = 0
+
+        report('cards')
+
+        # Mark migration as complete
+        mark_migration_complete(uid)
     
-    return results
+        return results
+
+def _merge_legacy_records(collection_name: str, records: List[Dict]) -> int:
+    """
+    Add legacy records to a local collection by id. The migration runs while
+    the user's requests are served, so the collection isn't replaced: records
+    already there (written meanwhile, or by an earlier attempt) are kept.
+    Legacy records without an id get one derived from their content, so
+    running the migration again doesn't duplicate them. Returns how many
+    were added.
+    """
+    with storage._write_lock(storage.get_current_user_id(), collection_name):
+        _, index = storage._load_indexed(collection_name)
+        new, seen = [], set(index)
+        for record in records:
+            if not isinstance(record, dict):
+                continue
+            record = dict(record)
+            if not record.get('id'):
+                digest = hashlib.blake2b(serialization.dumps(record, sort_keys=True), digest_size=8).hexdigest()
+                record['id'] = f"legacy-{digest}"
+            if record['id'] not in seen:
+                seen.add(record['id'])
+                new.append(record)
+        if new:
+            storage._write_records(collection_name, inserts=new)
+    return len(new)
 
 def normalize_legacy_transaction(tx: Dict) -> Dict:
     """Normalize a legacy transaction to the new format."""
@@ -355,7 +649,7 @@ def normalize_legacy_transaction(tx: Dict) -> Dict:
 def mark_migration_complete(uid: str):
     """Mark that migration is complete for a user."""
     # Create local flag file
-    user_dir = storage.get_user_data_dir()
+    user_dir = storage.get_user_data_dir(uid)
     flag_file = os.path.join(user_dir, '.migrated')
     try:
         with open(flag_file, 'w') as f:
@@ -380,7 +674,7 @@ def mark_migration_complete(uid: str):
 def is_migration_complete(uid: str) -> bool:
     """Check if migration is complete for a user."""
     # Check local flag first
-    user_dir = storage.get_user_data_dir()
+    user_dir = storage.get_user_data_dir(uid)
     if os.path.exists(os.path.join(user_dir, '.migrated')):
         return True
 
@@ -400,19 +694,24 @@ def is_migration_complete(uid: str) -> bool:
 # AUTO SYNC ON DATA CHANGE
 # =============================================================================
 
-def auto_sync_collection(uid: str, collection_name: str):
+def auto_sync_collection(uid: str, collection_name: str) -> bool:
     """
-    Automatically sync a specific collection after data change.
-    Called by storage functions after mutations.
+    Push the changes of a collection after data change. Called by the sync
+    outbox worker (see outbox.py). Returns False if anything failed to push.
     """
     if not is_firebase_available():
-        return
+        return False
     
     try:
-        # Ensure user context is set before loading data
-        storage.set_user_context(uid)
-        data = storage._load_json(collection_name)
-        sync_collection_to_firebase(uid, collection_name, data)
-        print(f"[Firebase Sync] ✅ Auto-synced {len(data)} {collection_name} for user {uid[:8]}...")
+        with storage.user_context(uid):
+            data = storage._load_json(collection_name)
+        # Only what changed since the last push goes out
+        stats = push_collection(uid, collection_name, data, only_changed=True)
+        if stats["failed"] or "error" in stats:
+            return False
+        print(f"[Firebase Sync] ✅ Auto-synced {collection_name} for user {uid[:8]}...: "
+              f"{stats['count']} changed, {stats['deleted']} deleted, {stats['unchanged']} unchanged")
+        return True
     except Exception as e:
         print(f"[Firebase Sync] ❌ Auto-sync error for {collection_name}: {e}")
+        return False
@@ -63,12 +63,13 @@ def calculate_goal_metrics(goal: Dict, summary: Dict) -> Dict:
         "is_completed": percentage >= 100
     }
 
-def get_goals_with_metrics() -> List[Dict]:
+def get_goals_with_metrics(summary: Optional[Dict] = None) -> List[Dict]:
     """
     Get all goals with their real-time progress metrics.
     """
     goals = storage.get_goals()
-    summary = storage.get_summary()
+    if summary is None:
+        summary = storage.get_summary()
     
     return [calculate_goal_metrics(g, summary) for g in goals]
 
@@ -120,8 +121,7 @@ def update_goal_from_piggy_bank(goal_id: str, amount: float, tx_type: str) -> Op
     """
     Update goal progress from a piggy bank transaction.
     """
-    goals = storage.get_goals()
-    goal = next((g for g in goals if g.get('id') == goal_id), None)
+    goal = storage.get_by_id('goals', goal_id)
     
     if not goal:
         return None
@@ -154,18 +154,17 @@ def update_goal_from_piggy_bank(goal_id: str, amount: float, tx_type: str) -> Op
         'just_completed': new_amount >= target and current < target
     }
 
-def check_goal_achievements() -> List[Dict]:
+def check_goal_achievements(goals_with_metrics: Optional[List[Dict]] = None) -> List[Dict]:
     """
     Check all goals and return any that have been recently achieved.
     Used for notification generation.
     """
-    goals = storage.get_goals()
-    summary = storage.get_summary()
+    if goals_with_metrics is None:
+        goals_with_metrics = get_goals_with_metrics()
     
     achieved = []
-    for goal in goals:
-        metrics = calculate_goal_metrics(goal, summary)
-        if metrics['is_completed'] and not goal.get('notified_complete'):
+    for metrics in goals_with_metrics:
+        if metrics['is_completed'] and not metrics.get('notified_complete'):
             achieved.append(metrics)
     
     return achieved
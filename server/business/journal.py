@@ -0,0 +1,205 @@
+"""
+Append-only Journal for JSON Collections
+With LUNA_STORAGE_JOURNAL=1, writes to journaled collections append one JSON
+line per change to <collection>.journal.jsonl instead of rewriting the whole
+<collection>.json snapshot. Loads replay snapshot + journal, and once the
+journal grows past JOURNAL_COMPACT_THRESHOLD entries it is folded back into
+the snapshot by a background thread.
+"""
+import os
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+from . import locks
+from . import serialization
+
+JOURNAL_COMPACT_THRESHOLD = int(os.getenv('LUNA_JOURNAL_COMPACT_THRESHOLD', '500'))
+
+_locks_guard = threading.Lock()
+# snapshot path -> (journal entries, signature they were counted at)
+_entry_counts: Dict[str, Tuple[int, Optional[Tuple]]] = {}
+_compacting: set = set()
+
+def journal_path(snapshot_path: str) -> str:
+    base, _ = os.path.splitext(snapshot_path)
+    return f"{base}.journal.jsonl"
+
+def _lock(snapshot_path: str) -> locks.FileLock:
+    # Shared with other worker processes
+    return locks.lock_for(snapshot_path)
+
+def _stat(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def signature(snapshot_path: str) -> Optional[Tuple]:
+    """Cache signature covering both files, or None if neither exists."""
+    snap = _stat(snapshot_path)
+    jrnl = _stat(journal_path(snapshot_path))
+    if snap is None and jrnl is None:
+        return None
+    return (snap, jrnl)
+
+def _newest_mtime(sig: Optional[Tuple]) -> int:
+    return max((stat[0] for stat in sig if stat), default=0) if sig else 0
+
+def version(snapshot_path: str) -> int:
+    """Newest mtime (ns) of the snapshot and journal; every write moves it forward."""
+    return _newest_mtime(signature(snapshot_path))
+
+def _apply(records: List[Dict], positions: Dict, entry: Dict):
+    op = entry.get('op')
+    if op == 'put':
+        record = entry['record']
+        pos = positions.get(record.get('id'))
+        if pos is None:
+            positions[record.get('id')] = len(records)
+            records.append(record)
+        else:
+            records[pos] = record
+    elif op == 'del':
+        pos = positions.pop(entry.get('id'), None)
+        if pos is not None:
+            records[pos] = None
+
+def _read_journal(path: str, limit: Optional[int] = None) -> Tuple[List[Dict], int]:
+    """Read journal entries up to byte offset `limit`. Returns (entries, bytes read)."""
+    entries = []
+    if not os.path.exists(path):
+        return entries, 0
+    with open(path, 'rb') as f:
+        raw = f.read() if limit is None else f.read(limit)
+    # A torn last line (crash mid-append) is ignored
+    consumed = raw.rfind(b'\n') + 1
+    for line in raw[:consumed].splitlines():
+        if line.strip():
+            try:
+                entries.append(serialization.loads(line))
+            except ValueError as e:
+                print(f"[Journal] Skipping corrupt entry in {path}: {e}")
+    return entries, consumed
+
+def _replay(snapshot_path: str, limit: Optional[int] = None) -> Tuple[List[Dict], int, int]:
+    records = []
+    if os.path.exists(snapshot_path):
+        with open(snapshot_path, 'rb') as f:
+            records = serialization.load(f)
+    entries, consumed = _read_journal(journal_path(snapshot_path), limit)
+    if entries:
+        positions = {r.get('id'): i for i, r in enumerate(records)}
+        for entry in entries:
+            _apply(records, positions, entry)
+        records = [r for r in records if r is not None]
+    return records, len(entries), consumed
+
+def load(snapshot_path: str) -> Tuple[List[Dict], int, Optional[Tuple]]:
+    """
+    Load a collection by replaying its journal over the snapshot.
+    Returns (records, bytes, signature of what was read).
+    """
+    with _lock(snapshot_path):
+        records, count, consumed = _replay(snapshot_path)
+        sig = signature(snapshot_path)
+        _entry_counts[snapshot_path] = (count, sig)
+        size = (os.path.getsize(snapshot_path) if os.path.exists(snapshot_path) else 0) + consumed
+    return records, size, sig
+
+def _write_snapshot_file(snapshot_path: str, data: List[Dict], dump: Callable):
+    serialization.write_atomic(snapshot_path, data, dump, version(snapshot_path))
+
+def write_snapshot(snapshot_path: str, data: List[Dict], dump: Callable):
+    """Replace the whole collection: new snapshot, empty journal."""
+    with _lock(snapshot_path):
+        _write_snapshot_file(snapshot_path, data, dump)
+        jpath = journal_path(snapshot_path)
+        if os.path.exists(jpath):
+            os.remove(jpath)
+        _entry_counts[snapshot_path] = (0, signature(snapshot_path))
+
+def _count_entries(snapshot_path: str) -> int:
+    jpath = journal_path(snapshot_path)
+    if not os.path.exists(jpath):
+        return 0
+    with open(jpath, 'rb') as f:
+        return f.read().count(b'\n')
+
+def append(snapshot_path: str, entries: List[Dict]) -> Tuple[Optional[Tuple], Tuple, bool]:
+    """
+    Append entries ({'op': 'put', 'record': ...} or {'op': 'del', 'id': ...}).
+    Returns (signature_before, signature_after, needs_compaction).
+    """
+    payload = b''.join(serialization.dumps(e) + b'\n' for e in entries)
+    with _lock(snapshot_path):
+        before = signature(snapshot_path)
+        count, counted_at = _entry_counts.get(snapshot_path, (0, None))
+        if counted_at != before:
+            # Another process appended or compacted since we last counted
+            count = _count_entries(snapshot_path)
+        with open(journal_path(snapshot_path), 'ab') as f:
+            f.write(payload)
+            serialization.fsync(f)
+        serialization.advance_mtime(journal_path(snapshot_path), _newest_mtime(before))
+        after = signature(snapshot_path)
+        count += len(entries)
+        _entry_counts[snapshot_path] = (count, after)
+    return before, after, count >= JOURNAL_COMPACT_THRESHOLD
+
+def compact(snapshot_path: str, dump: Callable) -> Optional[Tuple[Tuple, Tuple]]:
+    """
+    Fold the journal into the snapshot. The expensive part (replay + dump) runs
+    without holding the lock; entries appended meanwhile are carried over into
+    the new journal. Returns (signature_before_swap, signature_after_swap).
+    """
+    jpath = journal_path(snapshot_path)
+    with _lock(snapshot_path):
+        offset = os.path.getsize(jpath) if os.path.exists(jpath) else 0
+        if offset == 0:
+            return None
+        snapshot_before = _stat(snapshot_path)
+    records, _, consumed = _replay(snapshot_path, offset)
+    tmp_path = f"{snapshot_path}.compact"
+    with open(tmp_path, 'wb') as f:
+        dump(records, f)
+        serialization.fsync(f)
+
+    with _lock(snapshot_path):
+        if _stat(snapshot_path) != snapshot_before:
+            # The collection was replaced while we were compacting; start over later
+            os.remove(tmp_path)
+            return None
+        before = signature(snapshot_path)
+        with open(jpath, 'rb') as f:
+            f.seek(consumed)
+            tail = f.read()
+        serialization.advance_mtime(tmp_path, _newest_mtime(before))
+        os.replace(tmp_path, snapshot_path)
+        if tail:
+            serialization.write_atomic(jpath, tail, lambda data, f: f.write(data))
+        else:
+            os.remove(jpath)
+        after = signature(snapshot_path)
+        _entry_counts[snapshot_path] = (tail.count(b'\n'), after)
+    print(f"[Journal] Compacted {os.path.basename(snapshot_path)} ({len(records)} records)")
+    return before, after
+
+def schedule_compaction(snapshot_path: str, dump: Callable, on_done: Callable = None):
+    """Run compact() on a daemon thread, at most one per collection at a time."""
+    with _locks_guard:
+        if snapshot_path in _compacting:
+            return
+        _compacting.add(snapshot_path)
+
+    def run():
+        try:
+            result = compact(snapshot_path, dump)
+            if result and on_done:
+                on_done(*result)
+        except Exception as e:
+            print(f"[Journal] Compaction error for {snapshot_path}: {e}")
+        finally:
+            with _locks_guard:
+                _compacting.discard(snapshot_path)
+
+    threading.Thread(target=run, daemon=True, name="journal-compaction").start()
@@ -0,0 +1,111 @@
+"""
+Running Balance Ledger
+Keeps the all-time balance (income - expense - investment) of each user in
+ledger.json, adjusted by every transaction write in storage, so balance
+lookups don't depend on how much history a user has.
+
+reconcile() recomputes the balance from the raw transactions and corrects
+any drift; it runs automatically when the last reconcile is older than
+LEDGER_RECONCILE_HOURS, and can be triggered via the API or the CLI.
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List
+from . import storage
+
+DOC_NAME = 'ledger'
+LEDGER_RECONCILE_HOURS = float(os.getenv('LUNA_LEDGER_RECONCILE_HOURS', '24'))
+
+# Sign of each transaction type in the balance
+_SIGNS = {'income': 1, 'expense': -1, 'investment': -1}
+
+def _effect(txs: Iterable[Dict]) -> float:
+    total = 0.0
+    for tx in txs:
+        sign = _SIGNS.get(tx.get('type'))
+        if sign:
+            try:
+                total += sign * float(tx.get('value', 0) or 0)
+            except (TypeError, ValueError):
+                continue
+    return total
+
+def _source(signature) -> str:
+    return repr(signature)
+
+def _save(balance: float, count: int, source: str, reconciled_at: str):
+    storage._save_doc(DOC_NAME, {
+        "balance": round(balance, 2),
+        "count": count,
+        "source": source,
+        "reconciled_at": reconciled_at
+    })
+
+# =============================================================================
+# MAINTENANCE
+# =============================================================================
+
+def reconcile() -> Dict:
+    """
+    Recompute the balance from every transaction and store it.
+    Returns the stored and recomputed balances and the drift between them.
+    """
+    txs = storage._load_cached('transactions')
+    actual = round(_effect(txs), 2)
+    doc = storage._load_doc(DOC_NAME) or {}
+    stored = doc.get('balance')
+    drift = round(actual - stored, 2) if stored is not None else 0.0
+    _save(actual, len(txs), _source(storage._collection_signature('transactions')),
+          datetime.now().isoformat())
+    if drift:
+        print(f"[Ledger] Corrected balance drift of {drift} for user {storage.get_current_user_id()[:8]}")
+    return {"balance": actual, "stored_balance": stored, "drift": drift, "transaction_count": len(txs)}
+
+def apply_delta(before, after, removed: List[Dict], added: List[Dict]):
+    """
+    Called by storage after a transactions write. Falls back to a reconcile
+    if the ledger doesn't match the pre-write state.
+    """
+    doc = storage._load_doc(DOC_NAME)
+    if doc is None or doc.get('source') != _source(before):
+        reconcile()
+        return
+    count = doc.get('count', 0) - len(removed) + len(added)
+    balance = doc.get('balance', 0.0) - _effect(removed) + _effect(added)
+    _save(balance, count, _source(after), doc.get('reconciled_at'))
+
+def _reconcile_due(doc: Dict) -> bool:
+    reconciled_at = doc.get('reconciled_at')
+    if not reconciled_at:
+        return True
+    try:
+        last = datetime.fromisoformat(reconciled_at)
+    except ValueError:
+        return True
+    return datetime.now() - last > timedelta(hours=LEDGER_RECONCILE_HOURS)
+
+# =============================================================================
+# QUERIES
+# =============================================================================
+
+def get_balance() -> float:
+    """All-time balance of the current user."""
+    doc = storage._load_doc(DOC_NAME)
+    if (doc is None or _reconcile_due(doc)
+            or doc.get('source') != _source(storage._collection_signature('transactions'))):
+        return reconcile()['balance']
+    return doc['balance']
+
+if __name__ == "__main__":
+    # Usage (from the server directory): python -m business.ledger <uid> [<uid> ...] | --all
+    import sys
+
+    args = sys.argv[1:]
+    if not args:
+        print("Usage: python -m business.ledger <uid> [<uid> ...] | --all")
+        sys.exit(1)
+    if args == ['--all']:
+        args = storage.list_user_ids()
+    for uid in args:
+        storage.set_user_context(uid)
+        print(f"[Ledger] {uid}: {reconcile()}")
@@ -0,0 +1,102 @@
+"""
+Cross-process Locks
+Storage writes are read-modify-write cycles, so each collection must have a
+single writer at a time. Within a process that is a thread lock; across
+processes (uvicorn --workers N sharing data/business) it is an advisory lock
+on a small file in a .locks directory next to the data: fcntl.flock on
+POSIX, msvcrt.locking on Windows.
+
+Locks are reentrant per thread; only the outermost acquire takes the file
+lock. LUNA_STORAGE_PROCESS_LOCKS=0 skips the file locks for single-process
+deployments.
+"""
+import os
+import threading
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+PROCESS_LOCKS = os.getenv('LUNA_STORAGE_PROCESS_LOCKS', '1') == '1'
+LOCK_DIR_NAME = '.locks'
+
+class FileLock:
+    """Reentrant lock held by one thread of one process at a time."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd: Optional[int] = None
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        if self._depth == 0 and PROCESS_LOCKS:
+            try:
+                self._fd = _lock_file(self.path)
+            except BaseException:
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fd, self._fd = self._fd, None
+            _unlock_file(fd)
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+_locks: Dict[str, FileLock] = {}
+_locks_guard = threading.Lock()
+
+def lock_for(path: str) -> FileLock:
+    """The lock guarding the data file (or directory entry) at `path`."""
+    lock_path = os.path.join(os.path.dirname(path), LOCK_DIR_NAME, f"{os.path.basename(path)}.lock")
+    with _locks_guard:
+        lock = _locks.get(lock_path)
+        if lock is None:
+            lock = _locks[lock_path] = FileLock(lock_path)
+        return lock
+
+def _lock_file(path: str) -> int:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        elif msvcrt:
+            while True:
+                try:
+                    msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after ~10 seconds; keep waiting
+                    continue
+    except BaseException:
+        os.close(fd)
+        raise
+    return fd
+
+def _unlock_file(fd: int):
+    try:
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        elif msvcrt:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    finally:
+        os.close(fd)
@@ -0,0 +1,92 @@
+"""
+Legacy Data Migration State
+Whether a user still has legacy data to migrate is checked once per user per
+process (a filesystem check, plus a Firestore read when the local flag is
+missing) and remembered, so steady-state requests don't repeat it. A pending
+migration runs once on a background thread; its progress can be read with
+get_status() while requests carry on. Migrated records are merged into the
+user's collections by id, so anything the user writes meanwhile is kept.
+
+States: not_needed, pending, running, complete, failed. A failed migration is
+retried by a request arriving LUNA_MIGRATION_RETRY_SECONDS (default 60) later.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from . import storage
+from . import firebase_sync
+from . import locks
+
+RETRY_SECONDS = int(os.getenv('LUNA_MIGRATION_RETRY_SECONDS', '60'))
+
+_status: Dict[str, Dict] = {}
+_status_lock = threading.Lock()
+
+def get_status(uid: str) -> Optional[Dict]:
+    """Known migration state of `uid` in this process, or None if not checked yet."""
+    with _status_lock:
+        status = _status.get(uid)
+        return dict(status) if status else None
+
+def needs_check(status: Optional[Dict]) -> bool:
+    """True if check_and_start has to run (a blocking call) before serving `uid`."""
+    if status is None:
+        return True
+    return status['state'] == 'failed' and time.time() - status['failed_at'] >= RETRY_SECONDS
+
+def _set(uid: str, **fields) -> Dict:
+    with _status_lock:
+        status = _status.setdefault(uid, {})
+        status.update(fields)
+        return dict(status)
+
+def check_and_start(uid: str) -> Dict:
+    """
+    Work out whether `uid` needs migrating and, if so, start the migration in
+    the background. Blocking; returns the resulting status.
+    """
+    if not firebase_sync.check_legacy_data_exists(uid):
+        return _set(uid, state='not_needed')
+    if firebase_sync.is_migration_complete(uid):
+        return _set(uid, state='complete')
+    with _status_lock:
+        status = _status.get(uid)
+        if status and status['state'] in ('pending', 'running'):
+            # Another request got here first
+            return dict(status)
+        _status[uid] = {'state': 'pending', 'progress': None}
+    print(f"[Migration] Starting background migration for user {uid[:8]}...")
+    threading.Thread(target=_run_in_background, args=(uid,), daemon=True, name="legacy-migration").start()
+    return get_status(uid)
+
+def _run_in_background(uid: str):
+    try:
+        run(uid)
+    except Exception as e:
+        print(f"[Migration] Migration failed for user {uid[:8]}: {e}")
+
+def run(uid: str) -> Dict[str, int]:
+    """
+    Migrate `uid` now, in the calling thread. Only one worker process
+    migrates a user; the others wait for it and then find it complete.
+    Returns the migrated counts per collection.
+    """
+    with locks.lock_for(os.path.join(storage.get_user_data_dir(uid), '.migrated')):
+        if firebase_sync.is_migration_complete(uid):
+            _set(uid, state='complete')
+            return {}
+        _set(uid, state='running', started_at=datetime.now().isoformat(), progress=None, error=None)
+
+        def on_progress(step: str, done: int, total: int):
+            _set(uid, progress={'step': step, 'done': done, 'total': total})
+
+        try:
+            results = firebase_sync.migrate_legacy_data(uid, on_progress)
+        except Exception as e:
+            _set(uid, state='failed', error=str(e), failed_at=time.time())
+            raise
+    _set(uid, state='complete', finished_at=datetime.now().isoformat(), results=results)
+    return results
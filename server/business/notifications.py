@@ -6,10 +6,14 @@ from . import credit_cards
 from . import goals
 from .models import Notification
 
-def generate_notifications() -> List[Notification]:
+def generate_notifications(budgets: Optional[List[Dict]] = None, cards: Optional[List[Dict]] = None,
+                           balance: Optional[float] = None,
+                           goals_with_metrics: Optional[List[Dict]] = None) -> List[Notification]:
     """
     Analyzes current data and generates or updates notifications.
-    Returns the list of active notifications.
+    Returns the list of active notifications. This month's budgets with usage,
+    cards with metrics, the balance and goals with metrics are computed here
+    unless the caller already has them.
     """
     notifications = storage.get_notifications()
     new_notifications = []
@@ -47,7 +51,7 @@ def generate_notifications() -> List[Notification]:
                 )
 
     # 2. Check Budget Thresholds
-    budgets_with_metrics = budget.get_budgets_with_usage()
+    budgets_with_metrics = budget.get_budgets_with_usage() if budgets is None else budgets
     for b in budgets_with_metrics:
         percent = (b['actual'] / b['amount']) * 100 if b['amount'] > 0 else 0
         notif_id = f"budget_{b['id']}_{b['period']}"
@@ -74,7 +78,8 @@ def generate_notifications() -> List[Notification]:
             )
 
     # 3. Check Credit Card Due Dates
-    cards = credit_cards.get_cards_with_metrics()
+    if cards is None:
+        cards = credit_cards.get_cards_with_metrics()
     for card in cards:
         if card.get('days_until_due', 99) <= 3:
             notif_id = f"card_{card['id']}_{card['next_due_date']}"
@@ -89,8 +94,8 @@ def generate_notifications() -> List[Notification]:
             )
 
     # 4. Low Balance Warning
-    summary = storage.get_summary()
-    balance = summary.get('balance', 0)
+    if balance is None:
+        balance = storage.get_balance()
     if balance < 500:
         priority = 'critical' if balance < 100 else 'warning'
         add_or_update_notification(
@@ -122,7 +127,7 @@ def generate_notifications() -> List[Notification]:
                 )
 
     # 6. Goal Achievements
-    achieved_goals = goals.check_goal_achievements()
+    achieved_goals = goals.check_goal_achievements(goals_with_metrics)
     for goal in achieved_goals:
         notif_id = f"goal_achieved_{goal['id']}"
         add_or_update_notification(
@@ -140,7 +145,11 @@ def generate_notifications() -> List[Notification]:
     # Actually, if the condition is no longer met, the notification should probably go away.
     # We only save current "active" notifications.
     
-    storage._save_json('notifications', [n.dict() for n in new_notifications])
+    new_data = [n.dict() for n in new_notifications]
+    # Usually nothing changed; skipping the write keeps the collection version
+    # (and so the endpoint's ETag) stable between polls
+    if new_data != notifications:
+        storage._save_json('notifications', new_data)
     return new_notifications
 
 def add_or_update_notification(new_list, existing_list, **kwargs):
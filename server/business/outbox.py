@@ -0,0 +1,150 @@
+"""
+Firestore Sync Outbox
+Routes don't push to Firestore before responding: they enqueue the changed
+(user, collection) here and return once the local write is done. A background
+worker pushes each entry with the delta auto-sync.
+
+- Debounce: an entry is pushed LUNA_SYNC_DEBOUNCE_SECONDS (default 2) after
+  its last change, so a burst of writes becomes one push; a collection that
+  keeps changing is still pushed LUNA_SYNC_MAX_DELAY_SECONDS (default 30)
+  after its first pending change.
+- Retries: a failed push (offline, Firestore errors) is retried with
+  exponential backoff, from LUNA_SYNC_RETRY_SECONDS (default 5) up to
+  LUNA_SYNC_RETRY_MAX_SECONDS (default 300).
+- Persistence: pending entries are kept in data/business/.sync_outbox.json
+  until pushed, and are picked up again when the server restarts. Worker
+  processes share the file; an entry is only removed if no change was
+  enqueued after its push started.
+"""
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from . import firebase_sync
+from . import locks
+from . import serialization
+from . import storage
+
+DEBOUNCE_SECONDS = float(os.getenv('LUNA_SYNC_DEBOUNCE_SECONDS', '2'))
+MAX_DELAY_SECONDS = float(os.getenv('LUNA_SYNC_MAX_DELAY_SECONDS', '30'))
+RETRY_SECONDS = float(os.getenv('LUNA_SYNC_RETRY_SECONDS', '5'))
+RETRY_MAX_SECONDS = float(os.getenv('LUNA_SYNC_RETRY_MAX_SECONDS', '300'))
+
+OUTBOX_PATH = os.path.join(storage.BASE_DATA_DIR, '.sync_outbox.json')
+
+Key = Tuple[str, str]
+
+# Entries this process will push: key -> {"due", "first", "attempts"}
+_pending: Dict[Key, Dict] = {}
+_lock = threading.Lock()
+_wake = threading.Event()
+_worker: Optional[threading.Thread] = None
+
+# =============================================================================
+# OUTBOX FILE
+# =============================================================================
+# {"<uid>/<collection>": {"uid", "collection", "enqueued_at"}}
+
+def _key_name(key: Key) -> str:
+    return f"{key[0]}/{key[1]}"
+
+def _read_outbox() -> Dict[str, Dict]:
+    try:
+        with open(OUTBOX_PATH, 'rb') as f:
+            return serialization.load(f) or {}
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"[Outbox] Could not read {OUTBOX_PATH}: {e}")
+        return {}
+
+def _persist(key: Key, enqueued_at: float):
+    with locks.lock_for(OUTBOX_PATH):
+        entries = _read_outbox()
+        entries[_key_name(key)] = {"uid": key[0], "collection": key[1], "enqueued_at": enqueued_at}
+        serialization.write_atomic(OUTBOX_PATH, entries)
+
+def _remove_if_unchanged(key: Key, claimed_at: float):
+    """Drop a pushed entry, unless a change was enqueued (by any process) after the push started."""
+    with locks.lock_for(OUTBOX_PATH):
+        entries = _read_outbox()
+        entry = entries.get(_key_name(key))
+        if entry is None or entry.get("enqueued_at", 0) >= claimed_at:
+            return
+        del entries[_key_name(key)]
+        serialization.write_atomic(OUTBOX_PATH, entries)
+
+# =============================================================================
+# QUEUE
+# =============================================================================
+
+def enqueue(uid: str, collection_name: str):
+    """Schedule `collection_name` of `uid` to be pushed to Firestore."""
+    if not firebase_sync.is_firebase_available():
+        return
+    key, now = (uid, collection_name), time.time()
+    with _lock:
+        entry = _pending.get(key)
+        if entry is not None:
+            # Already on disk; just push back the debounce deadline
+            entry["due"] = max(entry["due"], min(now + DEBOUNCE_SECONDS, entry["first"] + MAX_DELAY_SECONDS))
+            return
+        _pending[key] = {"due": now + DEBOUNCE_SECONDS, "first": now, "attempts": 0}
+    _persist(key, now)
+    start()
+    _wake.set()
+
+def pending_collections(uid: str) -> List[str]:
+    """Collections of `uid` waiting to be pushed by this process."""
+    with _lock:
+        return sorted(c for u, c in _pending if u == uid)
+
+def start():
+    """Start the worker (once per process), taking over the entries left in the outbox file."""
+    global _worker
+    with _lock:
+        if _worker is not None:
+            return
+        _worker = threading.Thread(target=_run, daemon=True, name="sync-outbox")
+    now = time.time()
+    entries = _read_outbox()
+    with _lock:
+        for entry in entries.values():
+            _pending.setdefault((entry["uid"], entry["collection"]), {"due": now, "first": now, "attempts": 0})
+    if entries:
+        print(f"[Outbox] Resuming {len(entries)} pending sync(s)")
+    _worker.start()
+
+def _next_due() -> Tuple[Optional[Key], float]:
+    """The earliest due entry and how long until it is due."""
+    with _lock:
+        if not _pending:
+            return None, DEBOUNCE_SECONDS
+        key = min(_pending, key=lambda k: _pending[k]["due"])
+        return key, _pending[key]["due"] - time.time()
+
+def _run():
+    while True:
+        key, wait = _next_due()
+        if key is None or wait > 0:
+            _wake.wait(timeout=wait if key is not None else None)
+            _wake.clear()
+            continue
+        with _lock:
+            entry = _pending.pop(key)
+        process(key, entry)
+
+def process(key: Key, entry: Dict):
+    """Push one entry now; on failure it goes back to the queue with a backoff."""
+    claimed_at = time.time()
+    uid, collection_name = key
+    if firebase_sync.auto_sync_collection(uid, collection_name):
+        _remove_if_unchanged(key, claimed_at)
+        return
+    attempts = entry["attempts"] + 1
+    delay = min(RETRY_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+    print(f"[Outbox] Sync of {collection_name} for user {uid[:8]}... failed, retrying in {delay:.0f}s")
+    with _lock:
+        # A change enqueued meanwhile is covered by the retry
+        _pending[key] = {"due": time.time() + delay, "first": claimed_at, "attempts": attempts}
@@ -7,23 +7,13 @@ def pay_bill_and_create_transaction(bill_id: str, credit_card_id: Optional[str]
     """
     Marks a bill as paid and creates a corresponding expense transaction.
     """
-    bills = storage.get_bills()
-    bill_to_pay = None
-    bill_idx = -1
-    
-    for idx, b in enumerate(bills):
-        if b.get('id') == bill_id:
-            bill_to_pay = b
-            bill_idx = idx
-            break
+    bill_to_pay = storage.get_by_id('bills', bill_id)
             
     if not bill_to_pay or bill_to_pay.get('status') == 'paid':
         return None
         
     # 1. Update bill status
-    bill_to_pay['status'] = 'paid'
-    bill_to_pay['paid_at'] = datetime.now().isoformat()
-    storage._save_json('bills', bills)
+    storage.update_bill(bill_id, {'status': 'paid', 'paid_at': datetime.now().isoformat()})
     
     # 2. Create transaction
     tx_data = {
@@ -0,0 +1,202 @@
+"""
+Month-partitioned Transaction Storage
+With LUNA_STORAGE_PARTITIONED=1 (JSON backend), transactions live in one file
+per month under <user_dir>/transactions/YYYY-MM.json plus a small
+manifest.json listing the partitions and their record counts. Period-scoped
+reads open only the partitions they need and writes rewrite only the months
+they touch.
+"""
+import os
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from . import locks
+from . import serialization
+
+MANIFEST_FILENAME = 'manifest.json'
+UNDATED = 'undated'
+
+def partition_dir(snapshot_path: str) -> str:
+    """transactions.json -> transactions/"""
+    base, _ = os.path.splitext(snapshot_path)
+    return base
+
+def manifest_path(snapshot_path: str) -> str:
+    return os.path.join(partition_dir(snapshot_path), MANIFEST_FILENAME)
+
+def partition_path(snapshot_path: str, period: str) -> str:
+    return os.path.join(partition_dir(snapshot_path), f"{period}.json")
+
+def period_of(record: Dict) -> str:
+    date = record.get('date') or ''
+    if len(date) >= 7 and date[4] == '-':
+        return date[:7]
+    return UNDATED
+
+def _lock(snapshot_path: str) -> locks.FileLock:
+    # Shared with other worker processes
+    return locks.lock_for(snapshot_path)
+
+def _stat(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def signature(snapshot_path: str) -> Optional[Tuple[int, int]]:
+    """The manifest is rewritten on every write, so its stat covers the whole collection."""
+    return _stat(manifest_path(snapshot_path))
+
+def version(snapshot_path: str) -> int:
+    """mtime (ns) of the manifest, which moves forward on every write."""
+    sig = signature(snapshot_path)
+    return sig[0] if sig else 0
+
+def partition_signature(snapshot_path: str, period: str) -> Optional[Tuple[int, int]]:
+    return _stat(partition_path(snapshot_path, period))
+
+def _write_atomic(path: str, data, dump: Callable):
+    serialization.write_atomic(path, data, dump)
+
+def load_manifest(snapshot_path: str) -> Dict:
+    path = manifest_path(snapshot_path)
+    if not os.path.exists(path):
+        return {"version": 0, "partitions": {}}
+    with open(path, 'rb') as f:
+        return serialization.load(f)
+
+def _save_manifest(snapshot_path: str, manifest: Dict):
+    manifest['version'] = manifest.get('version', 0) + 1
+    _write_atomic(manifest_path(snapshot_path), manifest, serialization.dump)
+
+def _read_partition(snapshot_path: str, period: str) -> List[Dict]:
+    path = partition_path(snapshot_path, period)
+    if not os.path.exists(path):
+        return []
+    with open(path, 'rb') as f:
+        return serialization.load(f)
+
+def _write_partition(snapshot_path: str, manifest: Dict, period: str, records: List[Dict], dump: Callable):
+    path = partition_path(snapshot_path, period)
+    if records:
+        _write_atomic(path, records, dump)
+        manifest['partitions'][period] = {"count": len(records)}
+    else:
+        if os.path.exists(path):
+            os.remove(path)
+        manifest['partitions'].pop(period, None)
+
+# =============================================================================
+# READS
+# =============================================================================
+
+def list_periods(snapshot_path: str) -> List[str]:
+    return sorted(load_manifest(snapshot_path).get('partitions', {}).keys())
+
+def load_period(snapshot_path: str, period: str) -> Tuple[List[Dict], int]:
+    """Load a single month. Returns (records, bytes)."""
+    path = partition_path(snapshot_path, period)
+    return _read_partition(snapshot_path, period), (os.path.getsize(path) if os.path.exists(path) else 0)
+
+def load_all(snapshot_path: str) -> Tuple[List[Dict], int, Optional[Tuple[int, int]]]:
+    """
+    Load every partition, oldest month first.
+    Returns (records, bytes, signature of what was read).
+    """
+    with _lock(snapshot_path):
+        records, size = [], 0
+        for period in list_periods(snapshot_path):
+            part, part_size = load_period(snapshot_path, period)
+            records.extend(part)
+            size += part_size
+        sig = signature(snapshot_path)
+    return records, size, sig
+
+# =============================================================================
+# WRITES
+# =============================================================================
+
+def apply(snapshot_path: str, inserts: Iterable[Dict], updates: Iterable[Dict], deletes: Iterable[str],
+          known_periods: Dict[str, str], dump: Callable) -> Tuple[Optional[Tuple], Tuple, int]:
+    """
+    Add `inserts`, overwrite `updates` (by id) and remove `deletes` (ids),
+    rewriting only the affected months. `known_periods` maps ids to the month
+    they are currently stored in; updated/deleted ids missing from it are
+    located by scanning the partitions.
+    Returns (signature_before, signature_after, deleted_count).
+    """
+    updates = list(updates)
+    puts = list(inserts) + updates
+    update_ids = {r.get('id') for r in updates}
+    deletes = set(deletes)
+    with _lock(snapshot_path):
+        before = signature(snapshot_path)
+        manifest = load_manifest(snapshot_path)
+        os.makedirs(partition_dir(snapshot_path), exist_ok=True)
+
+        # Where each updated/deleted id currently lives
+        located = deletes | update_ids
+        locations = {i: known_periods[i] for i in located if i in known_periods}
+        missing = located - set(locations)
+        if missing:
+            for period in manifest['partitions']:
+                for r in _read_partition(snapshot_path, period):
+                    if r.get('id') in missing:
+                        locations[r.get('id')] = period
+
+        removals: Dict[str, set] = {}
+        for record_id, period in locations.items():
+            removals.setdefault(period, set()).add(record_id)
+        additions: Dict[str, List[Dict]] = {}
+        for record in puts:
+            additions.setdefault(period_of(record), []).append(record)
+
+        deleted = 0
+        for period in set(removals) | set(additions):
+            records = _read_partition(snapshot_path, period)
+            remove_ids = removals.get(period, set())
+            new_records = {r.get('id'): r for r in additions.get(period, [])}
+            result = []
+            for r in records:
+                rid = r.get('id')
+                if rid in new_records:
+                    # Updated in place, keeps its position in the month
+                    result.append(new_records.pop(rid))
+                elif rid in remove_ids:
+                    if rid in deletes:
+                        deleted += 1
+                else:
+                    result.append(r)
+            result.extend(new_records.values())
+            _write_partition(snapshot_path, manifest, period, result, dump)
+
+        _save_manifest(snapshot_path, manifest)
+        after = signature(snapshot_path)
+    return before, after, deleted
+
+def replace_all(snapshot_path: str, records: List[Dict], dump: Callable):
+    """Rewrite the whole collection, dropping months that no longer have records."""
+    with _lock(snapshot_path):
+        manifest = load_manifest(snapshot_path)
+        os.makedirs(partition_dir(snapshot_path), exist_ok=True)
+        grouped: Dict[str, List[Dict]] = {}
+        for record in records:
+            grouped.setdefault(period_of(record), []).append(record)
+        for period in set(manifest['partitions']) | set(grouped):
+            _write_partition(snapshot_path, manifest, period, grouped.get(period, []), dump)
+        _save_manifest(snapshot_path, manifest)
+
+def migrate_single_file(snapshot_path: str, dump: Callable) -> int:
+    """
+    Split an existing transactions.json into monthly partitions. The original
+    file is kept as transactions.pre-partition.json.
+    """
+    with _lock(snapshot_path):
+        if os.path.exists(manifest_path(snapshot_path)) or not os.path.exists(snapshot_path):
+            return 0
+        with open(snapshot_path, 'rb') as f:
+            records = serialization.load(f)
+        replace_all(snapshot_path, records, dump)
+        base, ext = os.path.splitext(snapshot_path)
+        os.replace(snapshot_path, f"{base}.pre-partition{ext}")
+    print(f"[Partitions] Split {len(records)} records from {os.path.basename(snapshot_path)} into monthly files")
+    return len(records)
@@ -8,6 +8,7 @@ import uuid
 from datetime import datetime
 from typing import Dict, List, Optional
 from . import storage
+from . import rollups
 
 # Period metadata file helper
 def _get_periods_file() -> str:
@@ -54,27 +55,16 @@ def get_period_summary(period: str) -> Dict:
     """
     Get financial summary for a specific period.
     """
-    transactions = storage.get_transactions({'limit': 10000})
-    
-    # Filter by period
-    period_txs = [t for t in transactions if t.get('date', '').startswith(period)]
-    
-    income = 0.0
-    expenses = 0.0
-    
-    for t in period_txs:
-        val = float(t.get('value', 0))
-        if t['type'] == 'income':
-            income += val
-        elif t['type'] == 'expense':
-            expenses += val
+    totals = rollups.period_totals(period)
+    income = totals['income']
+    expenses = totals['expense']
     
     return {
         "period": period,
         "income": round(income, 2),
         "expenses": round(expenses, 2),
         "balance": round(income - expenses, 2),
-        "transaction_count": len(period_txs)
+        "transaction_count": totals['count']
     }
 
 def rollover_budgets(old_period: str, new_period: str) -> int:
@@ -108,7 +98,7 @@ def close_card_billing(period: str) -> int:
     Returns number of cards processed.
     """
     cards = storage.get_cards()
-    transactions = storage.get_transactions({'limit': 5000})
+    transactions = storage.query_transactions(period=period, types='expense')
     
     count = 0
     for card in cards:
@@ -259,12 +249,5 @@ def get_available_periods() -> List[str]:
     """
     Returns list of all periods that have data.
     """
-    transactions = storage.get_transactions({'limit': 10000})
-    periods = set()
-    
-    for tx in transactions:
-        date = tx.get('date', '')
-        if len(date) >= 7:
-            periods.add(date[:7])
-    
-    return sorted(list(periods), reverse=True)
+    periods = [p for p in rollups.totals_by_period() if p != 'undated']
+    return sorted(periods, reverse=True)
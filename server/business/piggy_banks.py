@@ -48,8 +48,7 @@ def deposit_to_piggy_bank(piggy_bank_id: str, amount: float, description: Option
     This creates an expense transaction to reduce the user's balance.
     """
     # Get piggy bank name for transaction description
-    piggy_banks = storage.get_piggy_banks()
-    piggy_bank = next((pb for pb in piggy_banks if pb.get('id') == piggy_bank_id), None)
+    piggy_bank = storage.get_by_id('piggy_banks', piggy_bank_id)
     
     if not piggy_bank:
         raise ValueError("Piggy bank not found")
@@ -92,8 +91,7 @@ def withdraw_from_piggy_bank(piggy_bank_id: str, amount: float, description: Opt
     This creates an income transaction to add back to the user's balance.
     """
     # Check if piggy bank has enough balance
-    piggy_banks = storage.get_piggy_banks()
-    piggy_bank = next((pb for pb in piggy_banks if pb.get('id') == piggy_bank_id), None)
+    piggy_bank = storage.get_by_id('piggy_banks', piggy_bank_id)
     
     if not piggy_bank:
         raise ValueError("Piggy bank not found")
@@ -20,7 +20,7 @@ def process_recurring_items(target_month: Optional[str] = None) -> List[Transact
         target_month = datetime.now().strftime("%Y-%m")
         
     items = load_recurring()
-    all_tx = storage.get_transactions()
+    all_tx = storage.query_transactions(period=target_month)
     
     # Map for duplicate detection: recurring_id -> month
     # This ensures we don't generate more than one transaction per recurring item per month
@@ -0,0 +1,143 @@
+"""
+Monthly Rollups
+Materialized sums and counts of transactions keyed by
+(period, type, category, credit_card_id), kept in rollups.json and updated
+incrementally by every transaction write in storage. Summaries, period
+history, cash flow and report totals read these instead of scanning every
+transaction.
+
+Each rollup document records the transactions signature it was computed
+from; if the collection changed behind our back (another process, manual
+edit) the rollups are rebuilt on the next read.
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+from . import storage
+from . import partitions
+
+DOC_NAME = 'rollups'
+
+RollupKey = Tuple[str, str, str, Optional[str]]
+
+def _key(tx: Dict) -> RollupKey:
+    return (
+        partitions.period_of(tx),
+        tx.get('type', 'expense'),
+        tx.get('category', 'geral'),
+        tx.get('credit_card_id')
+    )
+
+def _value(tx: Dict) -> float:
+    try:
+        return float(tx.get('value', 0) or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def _source(signature) -> str:
+    return repr(signature)
+
+def _accumulate(rows: Dict[RollupKey, List], txs: Iterable[Dict], sign: int):
+    for tx in txs:
+        key = _key(tx)
+        row = rows.get(key)
+        if row is None:
+            row = rows[key] = [0.0, 0]
+        row[0] += sign * _value(tx)
+        row[1] += sign
+        if row[1] <= 0:
+            del rows[key]
+
+def _to_doc(rows: Dict[RollupKey, List], source: str) -> Dict:
+    return {
+        "source": source,
+        "rows": [[*key, round(row[0], 2), row[1]] for key, row in rows.items()]
+    }
+
+def _from_doc(doc: Dict) -> Dict[RollupKey, List]:
+    return {tuple(r[:4]): [r[4], r[5]] for r in doc.get('rows', [])}
+
+# =============================================================================
+# MAINTENANCE
+# =============================================================================
+
+def rebuild() -> int:
+    """Recompute all rollups from the stored transactions. Returns the number of rows."""
+    rows: Dict[RollupKey, List] = {}
+    _accumulate(rows, storage._load_cached('transactions'), 1)
+    storage._save_doc(DOC_NAME, _to_doc(rows, _source(storage._collection_signature('transactions'))))
+    print(f"[Rollups] Rebuilt {len(rows)} rows for user {storage.get_current_user_id()[:8]}")
+    return len(rows)
+
+def apply_delta(before, after, removed: List[Dict], added: List[Dict]):
+    """
+    Called by storage after a transactions write: subtract the previous
+    versions of changed records and add the new ones. Falls back to a full
+    rebuild if the stored rollups don't match the pre-write state.
+    """
+    doc = storage._load_doc(DOC_NAME)
+    if doc is None or doc.get('source') != _source(before):
+        rebuild()
+        return
+    rows = _from_doc(doc)
+    _accumulate(rows, removed, -1)
+    _accumulate(rows, added, 1)
+    storage._save_doc(DOC_NAME, _to_doc(rows, _source(after)))
+
+def get_rows() -> Dict[RollupKey, List]:
+    """Current rollups as {(period, type, category, card_id): [sum, count]}."""
+    doc = storage._load_doc(DOC_NAME)
+    if doc is None or doc.get('source') != _source(storage._collection_signature('transactions')):
+        rebuild()
+        doc = storage._load_doc(DOC_NAME) or {}
+    return _from_doc(doc)
+
+# =============================================================================
+# QUERIES
+# =============================================================================
+
+def _empty_totals() -> Dict:
+    return {"income": 0.0, "expense": 0.0, "investment": 0.0, "other": 0.0,
+            "count": 0, "income_count": 0, "expense_count": 0, "investment_count": 0}
+
+def _add(totals: Dict, tx_type: str, row: List):
+    totals['count'] += row[1]
+    if tx_type in ('income', 'expense', 'investment'):
+        totals[tx_type] += row[0]
+        totals[f"{tx_type}_count"] += row[1]
+    else:
+        totals['other'] += row[0]
+
+def totals_by_period() -> Dict[str, Dict]:
+    """{period: totals} for every period that has transactions."""
+    result = defaultdict(_empty_totals)
+    for (period, tx_type, _, _), row in get_rows().items():
+        _add(result[period], tx_type, row)
+    return dict(result)
+
+def period_totals(period: str) -> Dict:
+    """Income/expense/investment sums and counts for one month (YYYY-MM)."""
+    totals = _empty_totals()
+    for (row_period, tx_type, _, _), row in get_rows().items():
+        if row_period == period:
+            _add(totals, tx_type, row)
+    return totals
+
+def all_time_totals() -> Dict:
+    totals = _empty_totals()
+    for (_, tx_type, _, _), row in get_rows().items():
+        _add(totals, tx_type, row)
+    return totals
+
+if __name__ == "__main__":
+    # Usage (from the server directory): python -m business.rollups <uid> [<uid> ...] | --all
+    import sys
+
+    args = sys.argv[1:]
+    if not args:
+        print("Usage: python -m business.rollups <uid> [<uid> ...] | --all")
+        sys.exit(1)
+    if args == ['--all']:
+        args = storage.list_user_ids()
+    for uid in args:
+        storage.set_user_context(uid)
+        rebuild()
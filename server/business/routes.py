@@ -1,8 +1,12 @@
-from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi import APIRouter, HTTPException, Query, Depends, Request, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi.responses import StreamingResponse
+import hashlib
 import io
-from pydantic import BaseModel
-from typing import List, Optional, Literal
+import os
+from datetime import date
+from pydantic import BaseModel, Field, ValidationError
+from typing import Any, List, Optional, Literal
 from .models import (
     Transaction, TransactionCreate, 
     RecurringItem, RecurringItemCreate,
@@ -26,222 +30,456 @@ from . import export
 from . import ai
 from . import overdue
 from . import analytics
+from . import dashboard
 from . import periods
 from . import firebase_sync
 from . import piggy_banks
-
-router = APIRouter()
+from . import rollups
+from . import ledger
+from . import serialization
+from . import migration
+from . import outbox
+from .executor import offload, run_blocking
 
 # =============================================================================
-# USER CONTEXT DEPENDENCY
+# REQUEST DEPENDENCIES
 # =============================================================================
 
-def set_user_from_query(uid: Optional[str] = Query(None, description="User ID for multi-tenant access")):
-    """Dependency to set user context from query parameter."""
+async def commit_storage_writes():
+    """
+    Router-wide dependency: the storage writes of a request are coalesced
+    into one durable flush per collection, done before the response is sent.
+    """
+    token = storage.begin_group_commit()
+    try:
+        yield
+    finally:
+        keys = storage.end_group_commit(token)
+        if keys:
+            await run_blocking('storage', storage.flush_pending, None, keys)
+
+# The sync outbox worker resumes pushes left pending by a previous run
+router = APIRouter(dependencies=[Depends(commit_storage_writes)], on_startup=[outbox.start])
+
+async def set_user_from_query(uid: Optional[str] = Query(None, description="User ID for multi-tenant access")):
+    """
+    Dependency to set user context from query parameter. It is async so the
+    context is set in the request's own task, where the handler (and anything
+    it runs through the executor) will see it.
+    """
     if uid:
         storage.set_user_context(uid)
         
-        # Check if migration is needed
-        if firebase_sync.check_legacy_data_exists(uid) and not firebase_sync.is_migration_complete(uid):
-            print(f"[Routes] Triggering legacy migration for user {uid[:8]}...")
-            firebase_sync.migrate_legacy_data(uid)
+        # Check if migration is needed; only the first request of a user
+        # (per process) pays for the check, the migration itself runs in the background
+        if migration.needs_check(migration.get_status(uid)):
+            await run_blocking('firestore', migration.check_and_start, uid)
     
     return uid
 
+def fast_json(content, model=None, headers: Optional[dict] = None) -> Response:
+    """
+    JSON response encoded with orjson (when installed), bypassing response_model
+    validation for large lists. With `model`, each record is reduced to that
+    model's fields (missing ones get their defaults), the same shape
+    response_model would produce.
+    """
+    if model is not None:
+        fields = model.model_fields
+        content = [
+            {name: r[name] if name in r else field.get_default(call_default_factory=True)
+             for name, field in fields.items()}
+            for r in content
+        ]
+    return Response(content=serialization.dumps(content), media_type="application/json", headers=headers)
+
+# =============================================================================
+# CONDITIONAL GET
+# =============================================================================
+# Read endpoints the frontend polls carry an ETag built from the versions of
+# the collections they are computed from, and answer a matching If-None-Match
+# with 304 before computing anything. The date is part of the tag because
+# several of them depend on "today" (current month, due dates).
+
+NOTIFICATION_SOURCES = ('notifications', 'bills', 'budget', 'transactions', 'recurring',
+                        'goals', 'cards', 'piggy_banks')
+
+def collection_etag(*collections: str) -> str:
+    versions = ",".join(f"{c}={storage.get_collection_version(c)}" for c in collections)
+    raw = f"{storage.get_current_user_id()}|{date.today().isoformat()}|{versions}"
+    return '"' + hashlib.blake2b(raw.encode(), digest_size=12).hexdigest() + '"'
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(',')]
+    # Weak comparison, as If-None-Match calls for
+    return '*' in tags or etag in [t[2:] if t.startswith('W/') else t for t in tags]
+
+def conditional(request: Request, response: Response, *collections: str) -> Optional[Response]:
+    """
+    Set the ETag of a read endpoint that depends on `collections`. Returns
+    the 304 response to send instead when the client already has it.
+    """
+    etag = collection_etag(*collections)
+    response.headers["ETag"] = etag
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
 # --- SUMMARY ---
 @router.get("/summary")
-async def get_summary(period: Optional[str] = None, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def get_summary(request: Request, response: Response, period: Optional[str] = None,
+                uid: Optional[str] = Depends(set_user_from_query)):
     """Retorna o resumo financeiro (saldo, receitas, despesas). Aceita period=YYYY-MM."""
     # Check for period transition on every summary request
     periods.check_and_process_transition()
+    not_modified = conditional(request, response, 'transactions')
+    if not_modified:
+        return not_modified
     return storage.get_summary(period)
 
+# --- DASHBOARD ---
+@router.get("/dashboard")
+@offload('storage')
+def get_dashboard(request: Request, response: Response, period: Optional[str] = None,
+                  uid: Optional[str] = Depends(set_user_from_query)):
+    """
+    Summary, budgets, cards, goals, piggy bank summary, notifications and
+    analytics in one response, built from a single pass over the transactions.
+    """
+    periods.check_and_process_transition()
+    not_modified = conditional(request, response, *NOTIFICATION_SOURCES)
+    if not_modified:
+        return not_modified
+    key = (storage.get_current_user_id(), period)
+    etag = response.headers["ETag"]
+    content = dashboard.get_cached(key, etag)
+    if content is None:
+        content = serialization.dumps(dashboard.get_dashboard(period))
+        # Building it may have saved notifications; tag what was actually built
+        etag = collection_etag(*NOTIFICATION_SOURCES)
+        dashboard.remember(key, etag, content)
+    return Response(content=content, media_type="application/json", headers={"ETag": etag})
+
 # --- TRANSACTIONS ---
 @router.get("/transactions", response_model=List[Transaction])
-async def list_transactions(
+@offload('storage')
+def list_transactions(
+    request: Request,
+    response: Response,
     type: str = 'all',
-    limit: int = 50,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    before_date: Optional[str] = None,
     uid: Optional[str] = Depends(set_user_from_query)
 ):
-    return storage.get_transactions({'type': type, 'limit': limit})
+    """
+    Newest transactions first, `limit` per page. Pass the X-Next-Cursor header
+    of a response back as `cursor` to get the next page; the header is absent
+    on the last page.
+    """
+    not_modified = conditional(request, response, 'transactions')
+    if not_modified:
+        return not_modified
+    try:
+        page, next_cursor = storage.get_transactions_page(limit, cursor, before_date, type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {"ETag": response.headers["ETag"]}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return fast_json(page, Transaction, headers)
 
 @router.post("/transactions", response_model=Transaction)
-async def create_transaction(tx: TransactionCreate, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def create_transaction(tx: TransactionCreate, uid: Optional[str] = Depends(set_user_from_query)):
     result = storage.add_transaction(tx.dict())
-    # Auto-sync to Firebase if user is authenticated
+    # Queue the Firebase sync if user is authenticated
     if uid:
-        firebase_sync.auto_sync_collection(uid, 'transactions')
+        outbox.enqueue(uid, 'transactions')
     return result
 
+@router.post("/transactions/batch", response_model=List[Transaction])
+@offload('storage')
+def create_transactions_batch(txs: List[TransactionCreate], uid: Optional[str] = Depends(set_user_from_query)):
+    """
+    Import many transactions in one request: the whole list is validated
+    first, then written with a single commit and synced once.
+    """
+    result = storage.add_transactions([tx.dict() for tx in txs])
+    if uid and result:
+        outbox.enqueue(uid, 'transactions')
+    return fast_json([t.dict() for t in result])
+
+class TransactionFilter(BaseModel):
+    categories: Optional[List[str]] = None
+    start_date: Optional[str] = None  # YYYY-MM-DD or YYYY-MM, inclusive
+    end_date: Optional[str] = None
+    credit_card_id: Optional[str] = None
+
+class TransactionChanges(BaseModel):
+    description: Optional[str] = None
+    value: Optional[float] = Field(None, gt=0)
+    type: Optional[Literal['income', 'expense', 'investment']] = None
+    category: Optional[str] = None
+    date: Optional[str] = None
+    credit_card_id: Optional[str] = None
+
+class BulkTransactionSelection(BaseModel):
+    ids: Optional[List[str]] = None
+    filter: Optional[TransactionFilter] = None
+
+class BulkTransactionUpdate(BulkTransactionSelection):
+    changes: TransactionChanges
+
+def _bulk_selection(selection: BulkTransactionSelection) -> dict:
+    criteria = selection.filter.dict() if selection.filter else {}
+    if selection.ids is None and not any(v is not None for v in criteria.values()):
+        # Never touch the whole collection by accident
+        raise HTTPException(status_code=400, detail="Informe ids ou um filtro.")
+    return dict(criteria, ids=selection.ids)
+
+@router.patch("/transactions/bulk")
+@offload('storage')
+def bulk_update_transactions(request: BulkTransactionUpdate, uid: Optional[str] = Depends(set_user_from_query)):
+    """
+    Apply the same changes to the transactions picked by `ids` and/or
+    `filter`, with one write and one sync. Only the fields sent in `changes`
+    are set; credit_card_id may be sent as null to clear it.
+    """
+    changes = request.changes.dict(exclude_unset=True)
+    if any(v is None for k, v in changes.items() if k != 'credit_card_id'):
+        raise HTTPException(status_code=400, detail="Apenas credit_card_id pode ser nulo.")
+    if not changes:
+        raise HTTPException(status_code=400, detail="Nenhuma alteração informada.")
+    matched, updated = storage.update_transactions(changes, **_bulk_selection(request))
+    if uid and updated:
+        outbox.enqueue(uid, 'transactions')
+    return {"success": True, "matched": matched, "updated": updated}
+
+@router.delete("/transactions/bulk")
+@offload('storage')
+def bulk_delete_transactions(request: BulkTransactionSelection, uid: Optional[str] = Depends(set_user_from_query)):
+    """Delete the transactions picked by `ids` and/or `filter`, with one write and one sync."""
+    deleted = storage.delete_transactions(**_bulk_selection(request))
+    if uid and deleted:
+        outbox.enqueue(uid, 'transactions')
+    return {"success": True, "deleted": deleted}
+
 @router.delete("/transactions/{transaction_id}")
-async def delete_transaction(transaction_id: str, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def delete_transaction(transaction_id: str, uid: Optional[str] = Depends(set_user_from_query)):
     if storage.delete_transaction(transaction_id):
-        # Auto-sync to Firebase if user is authenticated
+        # Queue the Firebase sync if user is authenticated
         if uid:
-            firebase_sync.auto_sync_collection(uid, 'transactions')
+            outbox.enqueue(uid, 'transactions')
         return {"success": True, "message": "Transação removida."}
     raise HTTPException(status_code=404, detail="Transação não encontrada.")
 
 @router.put("/transactions/{transaction_id}", response_model=Transaction)
-async def update_transaction(transaction_id: str, tx: TransactionCreate, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def update_transaction(transaction_id: str, tx: TransactionCreate, uid: Optional[str] = Depends(set_user_from_query)):
     # TransactionCreate fits well for full update behavior
     updated = storage.update_transaction(transaction_id, tx.dict())
     if updated:
-        # Auto-sync to Firebase if user is authenticated
+        # Queue the Firebase sync if user is authenticated
         if uid:
-            firebase_sync.auto_sync_collection(uid, 'transactions')
+            outbox.enqueue(uid, 'transactions')
         return updated
     raise HTTPException(status_code=404, detail="Transação não encontrada.")
 
 # --- RECURRING ITEMS ---
 @router.get("/recurring", response_model=List[RecurringItem])
-async def list_recurring(uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def list_recurring(uid: Optional[str] = Depends(set_user_from_query)):
     return storage.get_recurring()
 
 @router.post("/recurring", response_model=RecurringItem)
-async def create_recurring(item: RecurringItemCreate, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def create_recurring(item: RecurringItemCreate, uid: Optional[str] = Depends(set_user_from_query)):
     return storage.add_recurring(item.dict())
 
 @router.put("/recurring/{item_id}", response_model=RecurringItem)
-async def update_recurring(item_id: str, updates: RecurringItemCreate, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def update_recurring(item_id: str, updates: RecurringItemCreate, uid: Optional[str] = Depends(set_user_from_query)):
     res = storage.update_recurring(item_id, updates.dict())
     if not res:
         raise HTTPException(status_code=404, detail="Item recorrente não encontrado")
     return res
 
 @router.delete("/recurring/{item_id}")
-async def delete_recurring(item_id: str, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def delete_recurring(item_id: str, uid: Optional[str] = Depends(set_user_from_query)):
     if storage.delete_recurring(item_id):
         return {"success": True}
     raise HTTPException(status_code=404, detail="Item recorrente não encontrado")
 
 @router.post("/recurring/process")
-async def process_recurring(month: Optional[str] = None, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def process_recurring(month: Optional[str] = None, uid: Optional[str] = Depends(set_user_from_query)):
     generated = recurring.process_recurring_items(month)
     return {"success": True, "generated_count": len(generated)}
 
 # --- OVERDUE BILLS ---
 @router.get("/bills", response_model=List[dict])
-async def list_bills(uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def list_bills(uid: Optional[str] = Depends(set_user_from_query)):
     return storage.get_bills()
 
 @router.post("/bills", response_model=OverdueBill)
-async def create_bill(bill: OverdueBillCreate, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def create_bill(bill: OverdueBillCreate, uid: Optional[str] = Depends(set_user_from_query)):
     return storage.add_bill(bill.dict())
 
 # --- TAGS ---
 @router.get("/tags", response_model=List[Tag])
-async def list_tags(uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def list_tags(uid: Optional[str] = Depends(set_user_from_query)):
     return tags.load_tags()
 
 @router.get("/tags/sync")
-async def sync_tags(uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def sync_tags(uid: Optional[str] = Depends(set_user_from_query)):
     updated_tags = tags.sync_tags_from_transactions()
     return {"success": True, "message": "Tags sincronizadas com sucesso", "tags_count": len(updated_tags)}
 
 @router.post("/tags", response_model=Tag)
-async def create_tag(tag: TagCreate, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def create_tag(tag: TagCreate, uid: Optional[str] = Depends(set_user_from_query)):
     return tags.add_tag(tag.label, tag.color)
 
 @router.delete("/tags/{tag_id}")
-async def delete_tag(tag_id: str, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def delete_tag(tag_id: str, uid: Optional[str] = Depends(set_user_from_query)):
     if tags.delete_tag(tag_id):
         return {"success": True}
     raise HTTPException(status_code=404, detail="Tag não encontrada")
 
 # --- BUDGET ---
 @router.get("/budget")
-async def list_budgets(period: Optional[str] = None, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def list_budgets(request: Request, response: Response, period: Optional[str] = None,
+                 uid: Optional[str] = Depends(set_user_from_query)):
+    not_modified = conditional(request, response, 'budget', 'transactions')
+    if not_modified:
+        return not_modified
     return budget.get_budgets_with_usage(period)
 
 @router.get("/budget/summary")
-async def get_budget_summary(period: Optional[str] = None, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def get_budget_summary(period: Optional[str] = None, uid: Optional[str] = Depends(set_user_from_query)):
     return budget.get_budget_summary(period)
 
 @router.post("/budget", response_model=Budget)
-async def create_budget(item: BudgetCreate, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def create_budget(item: BudgetCreate, uid: Optional[str] = Depends(set_user_from_query)):
     return storage.add_budget(item.dict())
 
 @router.put("/budget/{budget_id}", response_model=Budget)
-async def update_budget(budget_id: str, updates: BudgetCreate, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def update_budget(budget_id: str, updates: BudgetCreate, uid: Optional[str] = Depends(set_user_from_query)):
     res = storage.update_budget(budget_id, updates.dict())
     if not res:
         raise HTTPException(status_code=404, detail="Orçamento não encontrado")
     return res
 
 @router.delete("/budget/{budget_id}")
-async def delete_budget(budget_id: str, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def delete_budget(budget_id: str, uid: Optional[str] = Depends(set_user_from_query)):
     if storage.delete_budget(budget_id):
         return {"success": True}
     raise HTTPException(status_code=404, detail="Orçamento não encontrado")
 
 # --- GOALS ---
 @router.get("/goals")
-async def list_goals(uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def list_goals(uid: Optional[str] = Depends(set_user_from_query)):
     return goals.get_goals_with_metrics()
 
 @router.post("/goals", response_model=Goal)
-async def create_goal(item: GoalCreate, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def create_goal(item: GoalCreate, uid: Optional[str] = Depends(set_user_from_query)):
     return storage.add_goal(item.dict())
 
 @router.put("/goals/{goal_id}", response_model=Goal)
-async def update_goal(goal_id: str, updates: GoalBase, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def update_goal(goal_id: str, updates: GoalBase, uid: Optional[str] = Depends(set_user_from_query)):
     res = storage.update_goal(goal_id, updates.dict())
     if not res:
         raise HTTPException(status_code=404, detail="Meta não encontrada")
     return res
 
 @router.delete("/goals/{goal_id}")
-async def delete_goal(goal_id: str, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def delete_goal(goal_id: str, uid: Optional[str] = Depends(set_user_from_query)):
     if storage.delete_goal(goal_id):
         return {"success": True}
     raise HTTPException(status_code=404, detail="Meta não encontrada")
 
 # --- CREDIT CARDS ---
 @router.get("/cards")
-async def list_cards(uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def list_cards(request: Request, response: Response, uid: Optional[str] = Depends(set_user_from_query)):
+    not_modified = conditional(request, response, 'cards', 'transactions')
+    if not_modified:
+        return not_modified
     return credit_cards.get_cards_with_metrics()
 
 @router.get("/cards/summary")
-async def get_cards_summary(uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def get_cards_summary(uid: Optional[str] = Depends(set_user_from_query)):
     return credit_cards.get_cards_summary()
 
 @router.post("/cards", response_model=CreditCard)
-async def create_card(item: CreditCardCreate, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def create_card(item: CreditCardCreate, uid: Optional[str] = Depends(set_user_from_query)):
     return storage.add_card(item.dict())
 
 @router.put("/cards/{card_id}", response_model=CreditCard)
-async def update_card(card_id: str, updates: CreditCardBase, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def update_card(card_id: str, updates: CreditCardBase, uid: Optional[str] = Depends(set_user_from_query)):
     res = storage.update_card(card_id, updates.dict())
     if not res:
         raise HTTPException(status_code=404, detail="Cartão não encontrado")
     return res
 
 @router.delete("/cards/{card_id}")
-async def delete_card(card_id: str, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def delete_card(card_id: str, uid: Optional[str] = Depends(set_user_from_query)):
     if storage.delete_card(card_id):
         return {"success": True}
     raise HTTPException(status_code=404, detail="Cartão não encontrado")
 
 # --- NOTIFICATIONS ---
 @router.get("/notifications", response_model=List[Notification])
-async def list_notifications(uid: Optional[str] = Depends(set_user_from_query)):
-    return notifications.generate_notifications()
+@offload('storage')
+def list_notifications(request: Request, response: Response, uid: Optional[str] = Depends(set_user_from_query)):
+    not_modified = conditional(request, response, *NOTIFICATION_SOURCES)
+    if not_modified:
+        return not_modified
+    active = [n.dict() for n in notifications.generate_notifications()]
+    # Generating may have saved notifications; tag what is actually returned
+    return fast_json(active, headers={"ETag": collection_etag(*NOTIFICATION_SOURCES)})
 
 @router.post("/notifications/{notification_id}/read")
-async def mark_notification_read(notification_id: str, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def mark_notification_read(notification_id: str, uid: Optional[str] = Depends(set_user_from_query)):
     if storage.mark_notification_as_read(notification_id):
         return {"success": True}
     raise HTTPException(status_code=404, detail="Notificação não encontrada")
 
 @router.delete("/notifications/clear")
-async def clear_notifications(uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def clear_notifications(uid: Optional[str] = Depends(set_user_from_query)):
     storage.clear_notifications()
     return {"success": True}
 
 # --- EXPORT & REPORTS ---
 @router.get("/export/csv")
-async def export_csv(uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def export_csv(uid: Optional[str] = Depends(set_user_from_query)):
     csv_data = export.export_transactions_csv()
     return StreamingResponse(
         io.StringIO(csv_data),
@@ -250,49 +488,57 @@ async def export_csv(uid: Optional[str] = Depends(set_user_from_query)):
     )
 
 @router.get("/export/json")
-async def export_json(uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def export_json(uid: Optional[str] = Depends(set_user_from_query)):
     json_data = export.export_full_report_json()
-    return StreamingResponse(
-        io.StringIO(json_data),
+    return Response(
+        content=json_data,
         media_type="application/json",
         headers={"Content-Disposition": "attachment; filename=luna_business_backup.json"}
     )
 
 @router.get("/export/summary")
-async def get_export_summary(uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def get_export_summary(uid: Optional[str] = Depends(set_user_from_query)):
     return export.get_report_summary()
 
 # --- OVERDUE BILLS ---
 @router.get("/bills")
-async def get_bills(uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def get_bills(uid: Optional[str] = Depends(set_user_from_query)):
     return storage.get_bills()
 
 @router.post("/bills")
-async def add_bill(request: OverdueBillCreate, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def add_bill(request: OverdueBillCreate, uid: Optional[str] = Depends(set_user_from_query)):
     return storage.add_bill(request.dict())
 
 @router.put("/bills/{bill_id}")
-async def update_bill(bill_id: str, request: OverdueBillCreate, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def update_bill(bill_id: str, request: OverdueBillCreate, uid: Optional[str] = Depends(set_user_from_query)):
     updated = storage.update_bill(bill_id, request.dict())
     if not updated:
         raise HTTPException(status_code=404, detail="Bill not found")
     return updated
 
 @router.delete("/bills/{bill_id}")
-async def delete_bill(bill_id: str, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def delete_bill(bill_id: str, uid: Optional[str] = Depends(set_user_from_query)):
     if storage.delete_bill(bill_id):
         return {"success": True}
     raise HTTPException(status_code=404, detail="Bill not found")
 
 @router.get("/bills/summary")
-async def get_bills_summary(uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def get_bills_summary(uid: Optional[str] = Depends(set_user_from_query)):
     return overdue.get_overdue_summary()
 
 class PayBillRequest(BaseModel):
     credit_card_id: Optional[str] = None
 
 @router.post("/bills/{bill_id}/pay")
-async def pay_bill(bill_id: str, request: PayBillRequest, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def pay_bill(bill_id: str, request: PayBillRequest, uid: Optional[str] = Depends(set_user_from_query)):
     tx = overdue.pay_bill_and_create_transaction(bill_id, request.credit_card_id)
     if not tx:
         raise HTTPException(status_code=400, detail="Could not pay bill (already paid or not found)")
@@ -304,7 +550,8 @@ class CategorizeRequest(BaseModel):
     type: Literal['income', 'expense'] = 'expense'
 
 @router.post("/ai/categorize")
-async def categorize_description(request: CategorizeRequest, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def categorize_description(request: CategorizeRequest, uid: Optional[str] = Depends(set_user_from_query)):
     category, confidence = ai.suggest_category(request.description, request.type)
     return {
         "category": category,
@@ -313,29 +560,38 @@ async def categorize_description(request: CategorizeRequest, uid: Optional[str]
 
 # --- ANALYTICS ---
 @router.get("/analytics")
-async def get_analytics(uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def get_analytics(request: Request, response: Response, uid: Optional[str] = Depends(set_user_from_query)):
     """Returns full analytics data: cashflow, categories, projections, metrics."""
+    not_modified = conditional(request, response, 'transactions', 'recurring', 'bills')
+    if not_modified:
+        return not_modified
     return analytics.get_full_analytics()
 
 @router.get("/analytics/cashflow")
-async def get_cashflow(months: int = 6, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def get_cashflow(months: int = 6, uid: Optional[str] = Depends(set_user_from_query)):
     return analytics.get_cash_flow_data(months)
 
 @router.get("/analytics/categories")
-async def get_categories(period: str = 'month', uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def get_categories(period: str = 'month', uid: Optional[str] = Depends(set_user_from_query)):
     return analytics.get_category_breakdown(period)
 
 @router.get("/analytics/projections")
-async def get_projections(uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def get_projections(uid: Optional[str] = Depends(set_user_from_query)):
     return analytics.get_projections()
 
 @router.get("/analytics/metrics")
-async def get_metrics(uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def get_metrics(uid: Optional[str] = Depends(set_user_from_query)):
     return analytics.get_key_metrics()
 
 # --- PERIODS ---
 @router.get("/periods")
-async def get_periods(uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def get_periods(uid: Optional[str] = Depends(set_user_from_query)):
     """Returns period metadata and available periods."""
     return {
         "metadata": periods.get_period_metadata(),
@@ -344,20 +600,35 @@ async def get_periods(uid: Optional[str] = Depends(set_user_from_query)):
     }
 
 @router.get("/periods/history")
-async def get_period_history(uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def get_period_history(uid: Optional[str] = Depends(set_user_from_query)):
     """Returns historical period summaries."""
     metadata = periods.get_period_metadata()
     return metadata.get('history', [])
 
 @router.post("/periods/transition")
-async def force_transition(uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def force_transition(uid: Optional[str] = Depends(set_user_from_query)):
     """Force check and process any pending period transitions."""
     result = periods.check_and_process_transition()
     return result
 
+@router.post("/rollups/rebuild")
+@offload('storage')
+def rebuild_rollups(uid: Optional[str] = Depends(set_user_from_query)):
+    """Recompute the monthly transaction rollups from scratch."""
+    return {"success": True, "rows": rollups.rebuild()}
+
+@router.post("/ledger/reconcile")
+@offload('storage')
+def reconcile_ledger(uid: Optional[str] = Depends(set_user_from_query)):
+    """Recompute the running balance from all transactions and report any drift."""
+    return ledger.reconcile()
+
 # --- FIREBASE SYNC ---
 @router.get("/sync/status")
-async def get_sync_status(uid: Optional[str] = Depends(set_user_from_query)):
+@offload('firestore')
+def get_sync_status(uid: Optional[str] = Depends(set_user_from_query)):
     """Get sync status for the current user."""
     if not uid:
         return {"error": "No user ID provided", "firebase_available": False}
@@ -367,29 +638,51 @@ async def get_sync_status(uid: Optional[str] = Depends(set_user_from_query)):
         "firebase_available": firebase_sync.is_firebase_available(),
         "metadata": firebase_sync.get_sync_metadata(uid),
         "legacy_data_exists": firebase_sync.check_legacy_data_exists(uid),
-        "migration_complete": firebase_sync.is_migration_complete(uid)
+        "migration_complete": firebase_sync.is_migration_complete(uid),
+        "migration": migration.get_status(uid),
+        "pending_sync": outbox.pending_collections(uid)
     }
 
 @router.post("/sync/push")
-async def push_to_firebase(uid: Optional[str] = Depends(set_user_from_query)):
+@offload('firestore')
+def push_to_firebase(uid: Optional[str] = Depends(set_user_from_query)):
     """Push all local data to Firebase."""
     if not uid:
         raise HTTPException(400, "User ID required for sync")
     
-    results = firebase_sync.sync_all_to_firebase(uid)
-    return {"success": True, "synced": results}
+    push = firebase_sync.push_all_to_firebase(uid)
+    return {
+        "success": push["failed"] == 0 and not push["errors"],
+        "synced": push["synced"],
+        "failed": push["failed"],
+        "errors": push["errors"],
+        "seconds": push["seconds"],
+        "docs_per_sec": push["docs_per_sec"],
+        "collections": push["stats"]
+    }
 
 @router.post("/sync/pull")
-async def pull_from_firebase(uid: Optional[str] = Depends(set_user_from_query)):
-    """Pull all data from Firebase to local."""
+@offload('firestore')
+def pull_from_firebase(full: bool = False, uid: Optional[str] = Depends(set_user_from_query)):
+    """
+    Pull data from Firebase to local: what changed since the last pull, or
+    everything (replacing local records Firebase doesn't have) with full=true.
+    """
     if not uid:
         raise HTTPException(400, "User ID required for sync")
     
-    results = firebase_sync.sync_all_from_firebase(uid)
-    return {"success": True, "pulled": results}
+    pull = firebase_sync.pull_all_from_firebase(uid, full)
+    return {
+        "success": not pull["errors"],
+        "pulled": pull["pulled"],
+        "errors": pull["errors"],
+        "seconds": pull["seconds"],
+        "collections": pull["stats"]
+    }
 
 @router.post("/sync/migrate")
-async def migrate_legacy(uid: Optional[str] = Depends(set_user_from_query)):
+@offload('firestore')
+def migrate_legacy(uid: Optional[str] = Depends(set_user_from_query)):
     """Migrate legacy data for the user."""
     if not uid:
         raise HTTPException(400, "User ID required for migration")
@@ -397,54 +690,69 @@ async def migrate_legacy(uid: Optional[str] = Depends(set_user_from_query)):
     if not firebase_sync.check_legacy_data_exists(uid):
         return {"success": False, "message": "No legacy data found"}
     
-    results = firebase_sync.migrate_legacy_data(uid)
+    results = migration.run(uid)
     return {"success": True, "migrated": results}
 
+@router.get("/sync/migrate")
+@offload('storage')
+def get_migration_status(uid: Optional[str] = Depends(set_user_from_query)):
+    """Progress of the user's background legacy migration."""
+    if not uid:
+        raise HTTPException(400, "User ID required for migration")
+    return migration.get_status(uid) or {"state": "unknown"}
+
 # --- PIGGY BANKS (CAIXINHAS) ---
 @router.get("/piggy-banks")
-async def list_piggy_banks(uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def list_piggy_banks(uid: Optional[str] = Depends(set_user_from_query)):
     """List all piggy banks with metrics."""
     return piggy_banks.get_piggy_banks_with_metrics()
 
 @router.get("/piggy-banks/summary")
-async def get_piggy_banks_summary(uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def get_piggy_banks_summary(uid: Optional[str] = Depends(set_user_from_query)):
     """Get summary of all piggy banks."""
     return piggy_banks.get_piggy_bank_summary()
 
 @router.post("/piggy-banks", response_model=PiggyBank)
-async def create_piggy_bank(item: PiggyBankCreate, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def create_piggy_bank(item: PiggyBankCreate, uid: Optional[str] = Depends(set_user_from_query)):
     """Create a new piggy bank."""
     result = storage.add_piggy_bank(item.dict())
     if uid:
-        firebase_sync.auto_sync_collection(uid, 'piggy_banks')
+        outbox.enqueue(uid, 'piggy_banks')
     return result
 
 @router.put("/piggy-banks/{piggy_bank_id}", response_model=PiggyBank)
-async def update_piggy_bank(piggy_bank_id: str, updates: PiggyBankBase, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def update_piggy_bank(piggy_bank_id: str, updates: PiggyBankBase, uid: Optional[str] = Depends(set_user_from_query)):
     """Update a piggy bank."""
     res = storage.update_piggy_bank(piggy_bank_id, updates.dict())
     if not res:
         raise HTTPException(status_code=404, detail="Caixinha não encontrada")
     if uid:
-        firebase_sync.auto_sync_collection(uid, 'piggy_banks')
+        outbox.enqueue(uid, 'piggy_banks')
     return res
 
 @router.delete("/piggy-banks/{piggy_bank_id}")
-async def delete_piggy_bank(piggy_bank_id: str, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def delete_piggy_bank(piggy_bank_id: str, uid: Optional[str] = Depends(set_user_from_query)):
     """Delete a piggy bank."""
     if storage.delete_piggy_bank(piggy_bank_id):
         if uid:
-            firebase_sync.auto_sync_collection(uid, 'piggy_banks')
+            outbox.enqueue(uid, 'piggy_banks')
         return {"success": True}
     raise HTTPException(status_code=404, detail="Caixinha não encontrada")
 
 @router.get("/piggy-banks/{piggy_bank_id}/transactions")
-async def list_piggy_bank_transactions(piggy_bank_id: str, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def list_piggy_bank_transactions(piggy_bank_id: str, uid: Optional[str] = Depends(set_user_from_query)):
     """List transactions for a specific piggy bank."""
     return storage.get_piggy_bank_transactions(piggy_bank_id)
 
 @router.post("/piggy-banks/{piggy_bank_id}/deposit")
-async def deposit_to_piggy_bank(
+@offload('storage')
+def deposit_to_piggy_bank(
     piggy_bank_id: str,
     request: dict,
     uid: Optional[str] = Depends(set_user_from_query)
@@ -457,14 +765,15 @@ async def deposit_to_piggy_bank(
     try:
         result = piggy_banks.deposit_to_piggy_bank(piggy_bank_id, float(amount), description)
         if uid:
-            firebase_sync.auto_sync_collection(uid, 'piggy_banks')
-            firebase_sync.auto_sync_collection(uid, 'piggy_bank_transactions')
+            outbox.enqueue(uid, 'piggy_banks')
+            outbox.enqueue(uid, 'piggy_bank_transactions')
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/piggy-banks/{piggy_bank_id}/withdraw")
-async def withdraw_from_piggy_bank(
+@offload('storage')
+def withdraw_from_piggy_bank(
     piggy_bank_id: str,
     request: dict,
     uid: Optional[str] = Depends(set_user_from_query)
@@ -477,18 +786,127 @@ async def withdraw_from_piggy_bank(
     try:
         result = piggy_banks.withdraw_from_piggy_bank(piggy_bank_id, float(amount), description)
         if uid:
-            firebase_sync.auto_sync_collection(uid, 'piggy_banks')
-            firebase_sync.auto_sync_collection(uid, 'piggy_bank_transactions')
+            outbox.enqueue(uid, 'piggy_banks')
+            outbox.enqueue(uid, 'piggy_bank_transactions')
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.delete("/piggy-banks/transactions/{transaction_id}")
-async def delete_piggy_bank_transaction(transaction_id: str, uid: Optional[str] = Depends(set_user_from_query)):
+@offload('storage')
+def delete_piggy_bank_transaction(transaction_id: str, uid: Optional[str] = Depends(set_user_from_query)):
     """Delete a piggy bank transaction."""
     if storage.delete_piggy_bank_transaction(transaction_id):
         if uid:
-            firebase_sync.auto_sync_collection(uid, 'piggy_banks')
-            firebase_sync.auto_sync_collection(uid, 'piggy_bank_transactions')
+            outbox.enqueue(uid, 'piggy_banks')
+            outbox.enqueue(uid, 'piggy_bank_transactions')
         return {"success": True}
     raise HTTPException(status_code=404, detail="Transação não encontrada")
+
+# =============================================================================
+# BATCH
+# =============================================================================
+# POST /batch runs a list of operations in one request: one user context and
+# migration check, one worker thread working on the same cached collections
+# (later operations see earlier writes), one storage flush at the end and one
+# queued sync per changed collection. Write operations call the same handlers
+# as their own endpoints, with the sync left to the batch.
+
+BATCH_MAX_OPERATIONS = int(os.getenv('LUNA_BATCH_MAX_OPERATIONS', '50'))
+
+class BatchOperation(BaseModel):
+    op: str                     # e.g. "transactions.create", see BATCH_OPERATIONS
+    params: dict = {}           # path/query parameters, e.g. {"id": "..."}
+    body: Optional[Any] = None
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+
+def _batch_transactions_page(p: dict, body) -> dict:
+    try:
+        page, next_cursor = storage.get_transactions_page(
+            int(p.get('limit', 50)), p.get('cursor'), p.get('before_date'), p.get('type', 'all'))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": page, "next_cursor": next_cursor}
+
+# op -> (body model, collections to sync when it succeeds, call(params, body))
+BATCH_OPERATIONS = {
+    'summary.get': (None, (), lambda p, b: storage.get_summary(p.get('period'))),
+    'transactions.list': (None, (), _batch_transactions_page),
+    'transactions.create': (TransactionCreate, ('transactions',),
+                            lambda p, b: create_transaction.__wrapped__(b, uid=None)),
+    'transactions.update': (TransactionCreate, ('transactions',),
+                            lambda p, b: update_transaction.__wrapped__(p['id'], b, uid=None)),
+    'transactions.delete': (None, ('transactions',),
+                            lambda p, b: delete_transaction.__wrapped__(p['id'], uid=None)),
+    'budget.list': (None, (), lambda p, b: budget.get_budgets_with_usage(p.get('period'))),
+    'budget.create': (BudgetCreate, (), lambda p, b: create_budget.__wrapped__(b, uid=None)),
+    'budget.update': (BudgetCreate, (), lambda p, b: update_budget.__wrapped__(p['id'], b, uid=None)),
+    'budget.delete': (None, (), lambda p, b: delete_budget.__wrapped__(p['id'], uid=None)),
+    'goals.list': (None, (), lambda p, b: goals.get_goals_with_metrics()),
+    'goals.create': (GoalCreate, (), lambda p, b: create_goal.__wrapped__(b, uid=None)),
+    'goals.update': (GoalBase, (), lambda p, b: update_goal.__wrapped__(p['id'], b, uid=None)),
+    'goals.delete': (None, (), lambda p, b: delete_goal.__wrapped__(p['id'], uid=None)),
+    'piggy_banks.list': (None, (), lambda p, b: piggy_banks.get_piggy_banks_with_metrics()),
+    'piggy_banks.create': (PiggyBankCreate, ('piggy_banks',),
+                           lambda p, b: create_piggy_bank.__wrapped__(b, uid=None)),
+    'piggy_banks.update': (PiggyBankBase, ('piggy_banks',),
+                           lambda p, b: update_piggy_bank.__wrapped__(p['id'], b, uid=None)),
+    'piggy_banks.delete': (None, ('piggy_banks',),
+                           lambda p, b: delete_piggy_bank.__wrapped__(p['id'], uid=None)),
+    'piggy_banks.deposit': (dict, ('piggy_banks', 'piggy_bank_transactions'),
+                            lambda p, b: deposit_to_piggy_bank.__wrapped__(p['id'], b, uid=None)),
+    'piggy_banks.withdraw': (dict, ('piggy_banks', 'piggy_bank_transactions'),
+                             lambda p, b: withdraw_from_piggy_bank.__wrapped__(p['id'], b, uid=None)),
+    'piggy_banks.transactions.delete': (None, ('piggy_banks', 'piggy_bank_transactions'),
+                                        lambda p, b: delete_piggy_bank_transaction.__wrapped__(p['id'], uid=None)),
+}
+
+def _run_batch_operation(operation: BatchOperation):
+    """Returns (result entry, collections changed)."""
+    spec = BATCH_OPERATIONS.get(operation.op)
+    if spec is None:
+        return {"status": 400, "detail": f"Operação desconhecida: {operation.op}"}, ()
+    model, synced, call = spec
+    try:
+        body = operation.body
+        if model is dict:
+            if not isinstance(body, dict):
+                raise HTTPException(status_code=422, detail="body deve ser um objeto")
+        elif model is not None:
+            body = model.model_validate(body)
+        result = call(operation.params, body)
+    except ValidationError as e:
+        return {"status": 422, "detail": jsonable_encoder(e.errors(include_url=False))}, ()
+    except KeyError as e:
+        return {"status": 400, "detail": f"Parâmetro obrigatório ausente: {e.args[0]}"}, ()
+    except HTTPException as e:
+        return {"status": e.status_code, "detail": e.detail}, ()
+    except (ValueError, TypeError) as e:
+        # The operation may have written before failing, so its collections still sync
+        return {"status": 400, "detail": str(e)}, synced
+    except Exception as e:
+        print(f"[Batch] {operation.op} failed: {e}")
+        return {"status": 500, "detail": "Erro interno ao executar a operação."}, synced
+    return {"status": 200, "data": result}, synced
+
+@router.post("/batch")
+@offload('storage')
+def run_batch(request: BatchRequest, uid: Optional[str] = Depends(set_user_from_query)):
+    """
+    Run `operations` in order and return one {status, data|detail} entry per
+    operation. A failed operation doesn't stop the others; writes that
+    succeeded are kept.
+    """
+    if len(request.operations) > BATCH_MAX_OPERATIONS:
+        raise HTTPException(status_code=413, detail=f"No máximo {BATCH_MAX_OPERATIONS} operações por lote.")
+    results, changed = [], {}
+    for operation in request.operations:
+        entry, synced = _run_batch_operation(operation)
+        results.append(entry)
+        changed.update(dict.fromkeys(synced))
+    if uid:
+        for collection in changed:
+            outbox.enqueue(uid, collection)
+    return fast_json(jsonable_encoder({"results": results}))
@@ -0,0 +1,122 @@
+"""
+JSON Serialization
+Single place where business data is encoded/decoded, for storage files,
+journals, SQLite documents and fast API responses. Uses orjson when it is
+installed and falls back to the standard json module otherwise.
+
+Storage files are written compact by default; set LUNA_STORAGE_PRETTY=1 to
+get indented files for debugging. Both formats read back the same way.
+
+Whole files are replaced with write_atomic() (temp file + fsync + rename), so
+a crash leaves either the old or the new version on disk. LUNA_STORAGE_FSYNC=0
+skips the fsyncs, e.g. for tests or throwaway data.
+"""
+import json
+import os
+import threading
+from typing import Any, BinaryIO, Callable
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    orjson = None
+    HAS_ORJSON = False
+
+PRETTY = os.getenv('LUNA_STORAGE_PRETTY', '0') == '1'
+FSYNC = os.getenv('LUNA_STORAGE_FSYNC', '1') == '1'
+
+def dumps(data: Any, pretty: bool = False, sort_keys: bool = False) -> bytes:
+    """
+    Encode to UTF-8 JSON bytes (non-ASCII kept as-is). `sort_keys` gives the
+    same bytes for equal data whatever the key order, e.g. for hashing.
+    """
+    if HAS_ORJSON:
+        option = (orjson.OPT_INDENT_2 if pretty else 0) | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        try:
+            return orjson.dumps(data, option=option)
+        except TypeError:
+            # Values orjson refuses (e.g. ints over 64 bits) go through json
+            pass
+    if pretty:
+        return json.dumps(data, indent=2, ensure_ascii=False, sort_keys=sort_keys).encode('utf-8')
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), sort_keys=sort_keys).encode('utf-8')
+
+def loads(raw) -> Any:
+    """Decode JSON from bytes or str."""
+    if HAS_ORJSON:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # Older files may contain NaN/Infinity, which only json accepts
+            pass
+    return json.loads(raw)
+
+def dump(data: Any, f: BinaryIO, pretty: bool = None):
+    """Write a storage file (opened in binary mode). Honours LUNA_STORAGE_PRETTY."""
+    f.write(dumps(data, PRETTY if pretty is None else pretty))
+
+def load(f: BinaryIO) -> Any:
+    """Read a storage file opened in binary mode."""
+    return loads(f.read())
+
+def dumps_str(data: Any) -> str:
+    """Compact encoding as str, for text columns."""
+    return dumps(data).decode('utf-8')
+
+def fsync(f: BinaryIO):
+    """Push a file opened for writing through to disk."""
+    f.flush()
+    if FSYNC:
+        os.fsync(f.fileno())
+
+def _fsync_dir(path: str):
+    # Makes the rename itself durable; directories can't be opened on Windows
+    if not FSYNC or os.name != 'posix':
+        return
+    fd = os.open(os.path.dirname(path) or '.', os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def advance_mtime(path: str, floor_ns: int) -> bool:
+    """
+    Make sure `path` has an mtime later than `floor_ns`. Returns True if it
+    had to be moved forward.
+    """
+    st = os.stat(path)
+    if st.st_mtime_ns > floor_ns:
+        return False
+    os.utime(path, ns=(st.st_atime_ns, floor_ns + 1000))
+    return True
+
+def write_atomic(path: str, data: Any, dump_fn: Callable = dump, min_mtime_ns: int = 0):
+    """
+    Replace the file at `path` with `data`, written by `dump_fn(data, f)`.
+    Readers and crashes see the old file or the new one, never a partial write.
+
+    The new file's mtime is later than the old one's (and than min_mtime_ns):
+    caches in every worker process spot changes by mtime, and storage uses it
+    as the collection version, so it must move forward even when two writes
+    land within the filesystem's timestamp granularity.
+    """
+    # Unique per thread, so concurrent writers never share a temp file
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            dump_fn(data, f)
+            fsync(f)
+        try:
+            previous = os.stat(path).st_mtime_ns
+        except OSError:
+            previous = 0
+        advance_mtime(tmp_path, max(previous, min_mtime_ns))
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    _fsync_dir(path)
@@ -0,0 +1,327 @@
+"""
+SQLite Storage Backend
+Optional per-user database (data/business/<uid>/business.db) used by storage
+when LUNA_STORAGE_BACKEND=sqlite. Transactions get a real table with indexes
+on the columns we filter by; the other collections share a generic table.
+Every record keeps its full JSON document, so the dicts returned are the same
+ones the JSON backend would return.
+"""
+import os
+import sqlite3
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from . import serialization
+
+DB_FILENAME = 'business.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    date TEXT,
+    type TEXT,
+    category TEXT,
+    credit_card_id TEXT,
+    recurring_id TEXT,
+    value REAL,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions(date);
+CREATE INDEX IF NOT EXISTS idx_transactions_type ON transactions(type);
+CREATE INDEX IF NOT EXISTS idx_transactions_category ON transactions(category);
+CREATE INDEX IF NOT EXISTS idx_transactions_card ON transactions(credit_card_id);
+
+CREATE TABLE IF NOT EXISTS records (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    collection TEXT NOT NULL,
+    id TEXT NOT NULL,
+    doc TEXT NOT NULL,
+    UNIQUE (collection, id)
+);
+
+CREATE TABLE IF NOT EXISTS collection_versions (
+    collection TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+"""
+
+# Columns copied out of the transaction document so they can be indexed
+TRANSACTION_COLUMNS = ['date', 'type', 'category', 'credit_card_id', 'recurring_id', 'value']
+
+# Each thread keeps connections to the databases it used most recently; the
+# least recently used one is closed when it opens more than this many
+MAX_CONNECTIONS_PER_THREAD = max(2, int(os.getenv('LUNA_SQLITE_CONNECTIONS_PER_THREAD', '8')))
+
+_local = threading.local()
+
+def db_path(user_dir: str) -> str:
+    return os.path.join(user_dir, DB_FILENAME)
+
+def db_exists(user_dir: str) -> bool:
+    return os.path.exists(db_path(user_dir))
+
+def connect(user_dir: str) -> sqlite3.Connection:
+    """Return this thread's connection to the user's database, creating it if needed."""
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = OrderedDict()
+    path = db_path(user_dir)
+    conn = connections.get(path)
+    if conn is not None:
+        connections.move_to_end(path)
+        return conn
+    os.makedirs(user_dir, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.create_function("py_lower", 1, _py_lower, deterministic=True)
+    conn.executescript(SCHEMA)
+    connections[path] = conn
+    while len(connections) > MAX_CONNECTIONS_PER_THREAD:
+        _, idle = connections.popitem(last=False)
+        idle.close()
+    return conn
+
+def _py_lower(value) -> str:
+    """
+    Python's str.lower() as an SQL function. SQLite's own lower() and LIKE
+    only fold ASCII ('SAÚDE' -> 'saÚde'); queries must match the JSON
+    backend, which compares with str.lower().
+    """
+    return str(value).lower() if value is not None else ''
+
+def _dumps(record: Dict) -> str:
+    return serialization.dumps_str(record)
+
+def _ensure_id(record: Dict) -> str:
+    if not record.get('id'):
+        record['id'] = str(uuid.uuid4())
+    return str(record['id'])
+
+def _transaction_row(record: Dict) -> Tuple:
+    value = record.get('value')
+    try:
+        value = float(value) if value is not None else None
+    except (TypeError, ValueError):
+        value = None
+    return (
+        _ensure_id(record),
+        record.get('date'),
+        record.get('type'),
+        record.get('category'),
+        record.get('credit_card_id'),
+        record.get('recurring_id'),
+        value,
+        _dumps(record)
+    )
+
+# =============================================================================
+# VERSIONS
+# =============================================================================
+
+def _get_version(conn: sqlite3.Connection, collection: str) -> int:
+    row = conn.execute(
+        "SELECT version FROM collection_versions WHERE collection = ?", (collection,)
+    ).fetchone()
+    return row[0] if row else 0
+
+def _bump_version(conn: sqlite3.Connection, collection: str) -> int:
+    conn.execute(
+        "INSERT INTO collection_versions (collection, version) VALUES (?, 1) "
+        "ON CONFLICT(collection) DO UPDATE SET version = version + 1",
+        (collection,)
+    )
+    return _get_version(conn, collection)
+
+def collection_version(user_dir: str, collection: str) -> int:
+    """Version of a collection, bumped by every write. Used to validate caches."""
+    return _get_version(connect(user_dir), collection)
+
+# =============================================================================
+# READS
+# =============================================================================
+
+def load(user_dir: str, collection: str) -> Tuple[List[Dict], int]:
+    """Load a whole collection in insertion order. Returns (records, approximate bytes)."""
+    conn = connect(user_dir)
+    if collection == 'transactions':
+        rows = conn.execute("SELECT doc FROM transactions ORDER BY seq").fetchall()
+    else:
+        rows = conn.execute(
+            "SELECT doc FROM records WHERE collection = ? ORDER BY seq", (collection,)
+        ).fetchall()
+    size = sum(len(r[0]) for r in rows)
+    return [serialization.loads(r[0]) for r in rows], size
+
+def query_transactions(user_dir: str, start: Optional[str] = None, end: Optional[str] = None,
+                       types: Optional[List[str]] = None, categories: Optional[List[str]] = None,
+                       credit_card_id: Optional[str] = None, recurring_id: Optional[str] = None,
+                       min_value: Optional[float] = None, max_value: Optional[float] = None,
+                       text: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+    """
+    Filtered transactions, newest first by (date, created_at, id) like the
+    other backends, using the indexed columns. Date bounds are inclusive
+    string comparisons; categories ignore case and text is a case-insensitive
+    substring of the description, compared like storage._transaction_matcher does.
+    """
+    where, params = [], []
+    if start:
+        where.append("date >= ?")
+        params.append(start)
+    if end:
+        where.append("date <= ?")
+        params.append(end)
+    if types:
+        where.append(f"type IN ({', '.join('?' * len(types))})")
+        params.extend(types)
+    if categories:
+        where.append(f"py_lower(category) IN ({', '.join('?' * len(categories))})")
+        params.extend(c.lower() for c in categories)
+    if credit_card_id is not None:
+        where.append("credit_card_id = ?")
+        params.append(credit_card_id)
+    if recurring_id is not None:
+        where.append("recurring_id = ?")
+        params.append(recurring_id)
+    if min_value is not None:
+        where.append("value >= ?")
+        params.append(min_value)
+    if max_value is not None:
+        where.append("value <= ?")
+        params.append(max_value)
+    if text:
+        # instr, not LIKE: '%' and '_' in the search text are literal characters
+        where.append("instr(py_lower(json_extract(doc, '$.description')), ?) > 0")
+        params.append(text.lower())
+
+    sql = "SELECT doc FROM transactions"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    # Same order as the other backends' sorted view: (date, created_at, id)
+    sql += (" ORDER BY coalesce(date, '') DESC, coalesce(json_extract(doc, '$.created_at'), '') DESC,"
+            " id DESC")
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    rows = connect(user_dir).execute(sql, params).fetchall()
+    return [serialization.loads(r[0]) for r in rows]
+
+# =============================================================================
+# WRITES
+# =============================================================================
+
+def _insert_rows(conn: sqlite3.Connection, collection: str, records: List[Dict]):
+    if collection == 'transactions':
+        conn.executemany(
+            "INSERT OR REPLACE INTO transactions "
+            "(id, date, type, category, credit_card_id, recurring_id, value, doc) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [_transaction_row(r) for r in records]
+        )
+    else:
+        conn.executemany(
+            "INSERT OR REPLACE INTO records (collection, id, doc) VALUES (?, ?, ?)",
+            [(collection, _ensure_id(r), _dumps(r)) for r in records]
+        )
+
+def _update_rows(conn: sqlite3.Connection, collection: str, records: List[Dict]):
+    if collection == 'transactions':
+        rows = [_transaction_row(r) for r in records]
+        conn.executemany(
+            "UPDATE transactions SET date = ?, type = ?, category = ?, credit_card_id = ?, "
+            "recurring_id = ?, value = ?, doc = ? WHERE id = ?",
+            [row[1:] + (row[0],) for row in rows]
+        )
+    else:
+        conn.executemany(
+            "UPDATE records SET doc = ? WHERE collection = ? AND id = ?",
+            [(_dumps(r), collection, str(r.get('id'))) for r in records]
+        )
+
+def _delete_rows(conn: sqlite3.Connection, collection: str, ids: List[str]) -> int:
+    if collection == 'transactions':
+        cur = conn.executemany("DELETE FROM transactions WHERE id = ?", [(i,) for i in ids])
+    else:
+        cur = conn.executemany(
+            "DELETE FROM records WHERE collection = ? AND id = ?",
+            [(collection, i) for i in ids]
+        )
+    return cur.rowcount
+
+def apply(user_dir: str, collection: str, inserts: List[Dict], updates: List[Dict],
+          deletes: List[str]) -> Tuple[int, int, int]:
+    """
+    Apply inserts, updates (by id) and deletes (ids) in one SQLite transaction.
+    Returns (version_before, version_after, deleted_count) so callers can patch
+    their caches in place.
+    """
+    conn = connect(user_dir)
+    with conn:
+        before = _get_version(conn, collection)
+        deleted = _delete_rows(conn, collection, list(deletes)) if deletes else 0
+        if updates:
+            _update_rows(conn, collection, updates)
+        if inserts:
+            _insert_rows(conn, collection, inserts)
+        after = _bump_version(conn, collection)
+    return before, after, deleted
+
+def replace_all(user_dir: str, collection: str, records: List[Dict]) -> int:
+    """Replace a whole collection (used by full saves, pulls and migrations)."""
+    conn = connect(user_dir)
+    with conn:
+        if collection == 'transactions':
+            conn.execute("DELETE FROM transactions")
+        else:
+            conn.execute("DELETE FROM records WHERE collection = ?", (collection,))
+        if records:
+            _insert_rows(conn, collection, records)
+        return _bump_version(conn, collection)
+
+# =============================================================================
+# MIGRATION
+# =============================================================================
+
+def migrate_from_json(user_dir: str, files: Dict[str, str], overwrite: bool = False) -> Dict[str, int]:
+    """
+    One-shot import of a user's JSON collection files into business.db.
+    Collections that already have rows are skipped unless overwrite=True.
+    The JSON files are left in place as a backup.
+    """
+    results = {}
+    conn = connect(user_dir)
+    for collection, path in files.items():
+        if not os.path.exists(path):
+            continue
+        if not overwrite and _get_version(conn, collection) > 0:
+            continue
+        try:
+            with open(path, 'rb') as f:
+                data = serialization.load(f)
+        except Exception as e:
+            print(f"[SQLite] Error reading {path}: {e}")
+            continue
+        if not isinstance(data, list):
+            continue
+        replace_all(user_dir, collection, data)
+        results[collection] = len(data)
+    print(f"[SQLite] Migrated {sum(results.values())} records into {db_path(user_dir)}")
+    return results
+
+if __name__ == "__main__":
+    # Usage (from the server directory): python -m business.sqlite_store <uid> [<uid> ...] | --all
+    import sys
+    from . import storage
+
+    args = sys.argv[1:]
+    if not args:
+        print("Usage: python -m business.sqlite_store <uid> [<uid> ...] | --all")
+        sys.exit(1)
+    if args == ['--all']:
+        args = storage.list_user_ids()
+    for uid in args:
+        storage.set_user_context(uid)
+        counts = migrate_from_json(storage.get_user_data_dir(), storage._get_files(), overwrite=True)
+        print(f"[SQLite] {uid}: {counts}")
@@ -1,7 +1,22 @@
+import atexit
+import base64
+import bisect
+import itertools
 import json
 import os
-from typing import List, Dict, Optional
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from copy import deepcopy
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
+from . import journal
+from . import locks
+from . import partitions
+from . import serialization
+from . import sqlite_store
 from .models import Transaction, RecurringItem, OverdueBill, Budget, Goal, CreditCard, Notification, PiggyBank, PiggyBankTransaction
 
 # =============================================================================
@@ -14,32 +29,65 @@ BASE_DATA_DIR = os.path.join(BASE_DIR, 'data', 'business')
 if not os.path.exists(BASE_DATA_DIR):
     os.makedirs(BASE_DATA_DIR, exist_ok=True)
 
-# Current user context (thread-local would be better for production)
-_current_user_id: Optional[str] = None
+# Current user context. A ContextVar is private to each request (asyncio task)
+# and is copied into threads started with run_in_threadpool/copy_context, so
+# concurrent requests for different users never see each other's uid.
+_current_user_id: ContextVar[Optional[str]] = ContextVar('luna_user_id', default=None)
+_known_user_dirs: set = set()
 
 def set_user_context(uid: str):
-    """Set the current user context for all storage operations."""
-    global _current_user_id
-    _current_user_id = uid
-    # Ensure user directory exists
-    user_dir = get_user_data_dir()
-    if not os.path.exists(user_dir):
-        os.makedirs(user_dir, exist_ok=True)
-    print(f"[Storage] User context set to: {uid}")
+    """
+    Set the user for storage operations in the current context (request,
+    task or thread). Returns a token that can be passed to reset_user_context.
+    """
+    token = _current_user_id.set(uid)
+    if _ensure_user_dir(get_user_data_dir()):
+        print(f"[Storage] User context set to: {uid}")
+    return token
+
+def _ensure_user_dir(user_dir: str) -> bool:
+    """
+    Create a user directory if needed. It is checked once per process, as this
+    runs on every request and storage call. Returns True on that first check.
+    """
+    if user_dir in _known_user_dirs:
+        return False
+    os.makedirs(user_dir, exist_ok=True)
+    _known_user_dirs.add(user_dir)
+    return True
+
+def reset_user_context(token):
+    """Restore the user context that was active before set_user_context."""
+    _current_user_id.reset(token)
+
+@contextmanager
+def user_context(uid: str):
+    """Run a block of storage operations as `uid`, restoring the previous user afterwards."""
+    token = set_user_context(uid)
+    try:
+        yield
+    finally:
+        reset_user_context(token)
 
 def get_current_user_id() -> str:
     """Get current user ID, defaulting to 'local' for non-authenticated users."""
-    return _current_user_id or 'local'
+    return _current_user_id.get() or 'local'
 
-def get_user_data_dir() -> str:
-    """Get the data directory for the current user."""
-    return os.path.join(BASE_DATA_DIR, get_current_user_id())
+def get_user_data_dir(uid: Optional[str] = None) -> str:
+    """Get the data directory for `uid`, or for the current user."""
+    return os.path.join(BASE_DATA_DIR, uid or get_current_user_id())
+
+def list_user_ids() -> List[str]:
+    """Users with a data directory. Dot-entries (.locks, .sync_outbox.json) aren't users."""
+    if not os.path.isdir(BASE_DATA_DIR):
+        return []
+    return sorted(d for d in os.listdir(BASE_DATA_DIR)
+                  if not d.startswith('.') and os.path.isdir(os.path.join(BASE_DATA_DIR, d)))
 
 def _get_files() -> Dict[str, str]:
     """Get file paths for the current user context."""
     user_dir = get_user_data_dir()
-    if not os.path.exists(user_dir):
-        os.makedirs(user_dir, exist_ok=True)
+    _ensure_user_dir(user_dir)
     
     return {
         'transactions': os.path.join(user_dir, 'transactions.json'),
@@ -63,46 +111,893 @@ def get_data_dir() -> str:
 DATA_DIR = property(lambda self: get_user_data_dir()) # This won't work for top-level imports
 
 
-def _load_json(file_key: str) -> List[Dict]:
+# =============================================================================
+# IN-MEMORY COLLECTION CACHE
+# =============================================================================
+
+# Parsed collections are kept in memory per user so that read-heavy requests
+# (summary, analytics, notifications) don't re-parse the same file several
+# times. Entries are validated against the file's mtime/size on every read,
+# so edits made outside this process are still picked up.
+CACHE_MAX_BYTES = int(os.getenv('LUNA_STORAGE_CACHE_MB', '64')) * 1024 * 1024
+
+# Rough ratio between the size of a JSON file on disk and the memory used by
+# the parsed Python objects.
+_CACHE_OVERHEAD_FACTOR = 4
+
+_cache: "OrderedDict[str, Dict[str, Dict]]" = OrderedDict()  # uid -> file_key -> entry
+_cache_bytes = 0
+_cache_lock = threading.RLock()
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """Return (mtime_ns, size) for a file, or None if it doesn't exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def _cache_get(uid: str, file_key: str, signature: Tuple) -> Optional[List[Dict]]:
+    with _cache_lock:
+        user_entries = _cache.get(uid)
+        if not user_entries:
+            return None
+        entry = user_entries.get(file_key)
+        if not entry or entry['signature'] != signature:
+            return None
+        _cache.move_to_end(uid)
+        return entry['data']
+
+def _cache_put(uid: str, file_key: str, signature: Tuple, data: List[Dict], size: int):
+    global _cache_bytes
+    size = size * _CACHE_OVERHEAD_FACTOR
+    with _cache_lock:
+        user_entries = _cache.setdefault(uid, {})
+        previous = user_entries.get(file_key)
+        if previous:
+            _cache_bytes -= previous['size']
+        user_entries[file_key] = {'signature': signature, 'data': data, 'size': size, 'index': None, 'order': None}
+        _cache_bytes += size
+        _cache.move_to_end(uid)
+        _evict_idle_users(keep=uid)
+
+def _cache_patch(uid: str, file_key: str, expected: Tuple, signature: Tuple, apply):
+    """
+    Apply an in-place change to a cached collection after a row-level write.
+    `apply` gets the cached list, its id index and its sorted view (or None)
+    and must keep them in step.
+    If the cached copy isn't the one the write started from, it is dropped instead.
+    """
+    with _cache_lock:
+        entry = _cache.get(uid, {}).get(file_key)
+        if not entry:
+            return
+        if entry['signature'] != expected:
+            invalidate_cache(uid, file_key)
+            return
+        apply(entry['data'], _entry_index(entry), entry['order'])
+        entry['signature'] = signature
+
+def _build_index(data: List[Dict]) -> Dict[str, int]:
+    return {item.get('id'): pos for pos, item in enumerate(data) if isinstance(item, dict)}
+
+def _entry_index(entry: Dict) -> Dict[str, int]:
+    """id -> position index of a cached collection, built on first use."""
+    if entry['index'] is None:
+        entry['index'] = _build_index(entry['data'])
+    return entry['index']
+
+def _cache_index(uid: str, file_key: str, data: List[Dict]) -> Dict[str, int]:
+    """Index for `data` if it is the cached list, otherwise a throwaway one."""
+    with _cache_lock:
+        entry = _cache.get(uid, {}).get(file_key)
+        if entry and entry['data'] is data:
+            return _entry_index(entry)
+    return _build_index(data)
+
+def _sort_key(record: Dict) -> Tuple[str, str, str]:
+    """Chronological position of a record: (date, created_at, id)."""
+    return (record.get('date') or '', record.get('created_at') or '', str(record.get('id') or ''))
+
+def _key_resolver(data: List[Dict], index: Dict[str, int]):
+    """
+    Returns resolve(sort key) -> position in `data`, or None. Keys are found
+    through the id index; records whose id isn't a non-empty string (legacy
+    data with missing or numeric ids) aren't in it under their key's id, so
+    those are matched by the whole sort key instead, each one once.
+    """
+    legacy = None
+
+    def resolve(key: Tuple[str, str, str]) -> Optional[int]:
+        nonlocal legacy
+        pos = index.get(key[2]) if key[2] else None
+        if pos is not None:
+            return pos
+        if legacy is None:
+            legacy = defaultdict(list)
+            for i, record in enumerate(data):
+                if isinstance(record, dict) and not (isinstance(record.get('id'), str) and record.get('id')):
+                    legacy[_sort_key(record)].append(i)
+        positions = legacy.get(key)
+        return positions.pop() if positions else None
+    return resolve
+
+def _cache_order(uid: str, file_key: str, data: List[Dict]) -> List[Tuple[str, str, str]]:
+    """
+    Sort keys of a collection in ascending order. Built on first use for the
+    cached list and then maintained with bisect by row-level writes.
+    """
+    with _cache_lock:
+        entry = _cache.get(uid, {}).get(file_key)
+        if entry and entry['data'] is data:
+            if entry['order'] is None:
+                entry['order'] = sorted(_sort_key(r) for r in data if isinstance(r, dict))
+            return entry['order']
+    return sorted(_sort_key(r) for r in data if isinstance(r, dict))
+
+def _evict_idle_users(keep: str):
+    """Drop least recently used users until the cache fits in its budget."""
+    global _cache_bytes
+    while _cache_bytes > CACHE_MAX_BYTES and len(_cache) > 1:
+        uid, user_entries = next(iter(_cache.items()))
+        if uid == keep:
+            break
+        del _cache[uid]
+        _cache_bytes -= sum(e['size'] for e in user_entries.values())
+
+def invalidate_cache(uid: Optional[str] = None, file_key: Optional[str] = None):
+    """Drop cached collections for a user (or every user if uid is None)."""
+    global _cache_bytes
+    with _cache_lock:
+        if uid is None:
+            _cache.clear()
+            _cache_bytes = 0
+            return
+        user_entries = _cache.get(uid)
+        if not user_entries:
+            return
+        keys = [file_key] if file_key else list(user_entries.keys())
+        for key in keys:
+            entry = user_entries.pop(key, None)
+            if entry:
+                _cache_bytes -= entry['size']
+        if not user_entries:
+            del _cache[uid]
+
+def _invalidate_partitions(uid: str, file_key: str):
+    """Drop cached single-month entries (file_key@YYYY-MM) of a collection."""
+    with _cache_lock:
+        prefix = f"{file_key}@"
+        for key in [k for k in _cache.get(uid, {}) if k.startswith(prefix)]:
+            invalidate_cache(uid, key)
+
+def get_cache_stats() -> Dict:
+    """Return cache usage, mostly for debugging/monitoring."""
+    with _cache_lock:
+        return {
+            "users": len(_cache),
+            "collections": sum(len(e) for e in _cache.values()),
+            "bytes": _cache_bytes,
+            "max_bytes": CACHE_MAX_BYTES
+        }
+
+_CONTAINER_TYPES = frozenset((dict, list))
+
+def _copy_record(record: Dict) -> Dict:
+    """
+    Copy a cached record so the caller can mutate it, nested lists and dicts
+    (e.g. a card's billing_history) included, without touching the cache.
+    """
+    copy = dict(record)
+    if _CONTAINER_TYPES.isdisjoint(map(type, copy.values())):
+        # Flat records (nearly all of them) need nothing more
+        return copy
+    for key, value in copy.items():
+        if isinstance(value, (dict, list)):
+            copy[key] = deepcopy(value)
+    return copy
+
+def _copy_records(data: List[Dict]) -> List[Dict]:
+    """Copy a collection so callers can mutate it without touching the cache."""
+    return [_copy_record(item) if isinstance(item, dict) else item for item in data]
+
+def _normalize(file_key: str, data):
+    # Normalization logic for Recurring Items
+    if file_key == 'recurring' and isinstance(data, list):
+        for item in data:
+            # title -> description
+            if 'title' in item and 'description' not in item:
+                item['description'] = item['title']
+            # day_of_month -> due_day
+            if 'day_of_month' in item and 'due_day' not in item:
+                item['due_day'] = item['day_of_month']
+            # Ensure type exists
+            if 'type' not in item:
+                item['type'] = 'expense'
+    return data
+
+# =============================================================================
+# STORAGE BACKEND
+# =============================================================================
+
+# 'json' (default): one JSON array file per collection.
+# 'sqlite': one business.db per user with indexed tables (see sqlite_store.py).
+STORAGE_BACKEND = os.getenv('LUNA_STORAGE_BACKEND', 'json').lower()
+
+def _use_sqlite() -> bool:
+    return STORAGE_BACKEND == 'sqlite'
+
+# Collections that use the append-only journal (JSON backend only) when
+# LUNA_STORAGE_JOURNAL=1. See journal.py.
+JOURNAL_ENABLED = os.getenv('LUNA_STORAGE_JOURNAL', '0') == '1'
+JOURNALED_COLLECTIONS = {'transactions'}
+
+# Month-partitioned transactions (JSON backend only) when
+# LUNA_STORAGE_PARTITIONED=1. Takes precedence over the journal. See partitions.py.
+PARTITIONS_ENABLED = os.getenv('LUNA_STORAGE_PARTITIONED', '0') == '1'
+PARTITIONED_COLLECTIONS = {'transactions'}
+
+def _use_partitions(file_key: str) -> bool:
+    return PARTITIONS_ENABLED and not _use_sqlite() and file_key in PARTITIONED_COLLECTIONS
+
+def _use_journal(file_key: str) -> bool:
+    return (JOURNAL_ENABLED and not _use_sqlite() and not _use_partitions(file_key)
+            and file_key in JOURNALED_COLLECTIONS)
+
+def _json_signature(file_key: str, path: str) -> Optional[Tuple]:
+    """Cache signature for the file(s) backing a JSON collection."""
+    pending = _pending_signature(get_current_user_id(), file_key)
+    if pending:
+        return pending
+    if _use_partitions(file_key):
+        return partitions.signature(path)
+    if _use_journal(file_key):
+        return journal.signature(path)
+    return _file_signature(path)
+
+
+def _sqlite_dir() -> str:
+    """User directory for the SQLite backend. Imports existing JSON files on first use."""
+    user_dir = get_user_data_dir()
+    if not sqlite_store.db_exists(user_dir):
+        # Only one worker process may do the import
+        with locks.lock_for(sqlite_store.db_path(user_dir)):
+            if not sqlite_store.db_exists(user_dir):
+                sqlite_store.migrate_from_json(user_dir, _get_files())
+    return user_dir
+
+def _load_cached(file_key: str, on_error: Optional[List[Dict]] = None) -> List[Dict]:
+    """
+    Return the cached list for a collection, loading it if needed.
+    The list is shared with the cache: read it, never mutate it.
+    `on_error` is returned instead of [] when the collection can't be read.
+    """
     files = _get_files()
     path = files.get(file_key)
-    if not path or not os.path.exists(path):
+    if not path:
+        return []
+    uid = get_current_user_id()
+
+    if _use_sqlite():
+        user_dir = _sqlite_dir()
+        signature = ('sqlite', sqlite_store.collection_version(user_dir, file_key))
+        cached = _cache_get(uid, file_key, signature)
+        if cached is not None:
+            return cached
+        try:
+            data, size = sqlite_store.load(user_dir, file_key)
+        except Exception as e:
+            print(f"Error loading {file_key}: {e}")
+            return [] if on_error is None else on_error
+        data = _normalize(file_key, data)
+        _cache_put(uid, file_key, signature, data, size)
+        return data
+
+    signature = _json_signature(file_key, path)
+    if signature is None and _use_partitions(file_key) and partitions.migrate_single_file(path, serialization.dump):
+        signature = _json_signature(file_key, path)
+    if signature is None:
         return []
+    cached = _cache_get(uid, file_key, signature)
+    if cached is not None:
+        return cached
+    if _flush_pending(uid, file_key):
+        # The cache dropped a collection with deferred changes; they are on disk now
+        signature = _json_signature(file_key, path)
+
     try:
-        with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            
-            # Normalization logic for Recurring Items
-            if file_key == 'recurring' and isinstance(data, list):
-                for item in data:
-                    # title -> description
-                    if 'title' in item and 'description' not in item:
-                        item['description'] = item['title']
-                    # day_of_month -> due_day
-                    if 'day_of_month' in item and 'due_day' not in item:
-                        item['due_day'] = item['day_of_month']
-                    # Ensure type exists
-                    if 'type' not in item:
-                        item['type'] = 'expense'
-            
-            return data
+        if _use_partitions(file_key):
+            # Files may have moved on since the signature was taken; use the one
+            # that matches what was actually read
+            data, size, signature = partitions.load_all(path)
+        elif _use_journal(file_key):
+            data, size, signature = journal.load(path)
+        else:
+            with open(path, 'rb') as f:
+                data = serialization.load(f)
+            size = signature[1]
+        data = _normalize(file_key, data)
     except Exception as e:
         print(f"Error loading {file_key}: {e}")
-        return []
+        return [] if on_error is None else on_error
+
+    if isinstance(data, list):
+        _cache_put(uid, file_key, signature, data, size)
+    return data
+
+def _load_indexed(file_key: str) -> Tuple[List[Dict], Dict[str, int]]:
+    """Cached list of a collection plus its id -> position index. Both are read-only."""
+    data = _load_cached(file_key)
+    if not isinstance(data, list):
+        return [], {}
+    return data, _cache_index(get_current_user_id(), file_key, data)
+
+def _load_sorted(file_key: str) -> Tuple[List[Dict], Dict[str, int], List[Tuple[str, str, str]]]:
+    """Cached list, id index and ascending sort keys of a collection. All read-only."""
+    data, index = _load_indexed(file_key)
+    return data, index, _cache_order(get_current_user_id(), file_key, data)
+
+def _is_cached(file_key: str) -> bool:
+    """Whether an up-to-date copy of the collection is in memory, without loading it."""
+    uid = get_current_user_id()
+    with _cache_lock:
+        entry = _cache.get(uid, {}).get(file_key)
+        if entry is None:
+            return False
+    try:
+        return entry['signature'] == _collection_signature(file_key)
+    except Exception:
+        return False
+
+def _load_json(file_key: str, on_error: Optional[List[Dict]] = None) -> List[Dict]:
+    data = _load_cached(file_key, on_error)
+    if isinstance(data, list):
+        return _copy_records(data)
+    return data
+
+def get_by_id(file_key: str, record_id: str) -> Optional[Dict]:
+    """Look up a single record of a collection by id. Returns a copy, or None."""
+    data, index = _load_indexed(file_key)
+    pos = index.get(record_id)
+    if pos is None:
+        return None
+    return _copy_record(data[pos])
 
 def _save_json(file_key: str, data: List[Dict]):
+    """Replace a whole collection."""
+    if _persist(file_key, data) and file_key == 'transactions':
+        _on_transactions_replaced()
+
+def _write_collection(file_key: str, path: str, data: List[Dict]):
+    """Write a whole JSON collection in whatever layout it uses. Raises on failure."""
+    # Ensure directory exists
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if _use_partitions(file_key):
+        partitions.replace_all(path, data, serialization.dump)
+    elif _use_journal(file_key):
+        journal.write_snapshot(path, data, serialization.dump)
+    else:
+        serialization.write_atomic(path, data)
+
+def _collection_writer(file_key: str, path: str):
+    """Deferred write of a plain JSON collection, for _defer."""
+    def write(data: List[Dict]) -> Optional[Tuple]:
+        _write_collection(file_key, path, data)
+        return _file_signature(path)
+    return write
+
+def _persist(file_key: str, data: List[Dict]) -> bool:
+    """Write a whole collection and refresh its cache entry. Returns False on failure."""
     files = _get_files()
     path = files.get(file_key)
     if not path:
         print(f"Unknown file key: {file_key}")
-        return
+        return False
+    uid = get_current_user_id()
+
+    if _use_sqlite():
+        try:
+            version = sqlite_store.replace_all(_sqlite_dir(), file_key, data)
+        except Exception as e:
+            print(f"Error saving {file_key}: {e}")
+            invalidate_cache(uid, file_key)
+            return False
+        # Size is only an estimate here; it is recomputed on the next cold load
+        _cache_put(uid, file_key, ('sqlite', version), _copy_records(data), 0)
+        return True
+
+    with _write_lock(uid, file_key):
+        # A whole replacement supersedes any deferred changes
+        _discard_pending(uid, file_key)
+        try:
+            _write_collection(file_key, path, data)
+            if _use_partitions(file_key):
+                _invalidate_partitions(uid, file_key)
+        except Exception as e:
+            print(f"Error saving {file_key}: {e}")
+            invalidate_cache(uid, file_key)
+            return False
+        signature = _json_signature(file_key, path)
+        if signature is None or not isinstance(data, list):
+            invalidate_cache(uid, file_key)
+            return True
+        # Journal/partition signatures don't carry the data size; estimate from the snapshot
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        _cache_put(uid, file_key, signature, _copy_records(data), size)
+    return True
+
+def _collection_signature(file_key: str) -> Optional[Tuple]:
+    """Current cache signature of a collection, whatever the backend."""
+    if _use_sqlite():
+        return ('sqlite', sqlite_store.collection_version(_sqlite_dir(), file_key))
+    return _json_signature(file_key, _get_files()[file_key])
+
+def get_collection_version(file_key: str) -> int:
+    """
+    Version of a collection for the current user, shared by all worker
+    processes: it grows with every write and is 0 if the collection has never
+    been written. SQLite keeps a counter per collection; JSON layouts use the
+    newest mtime (ns) of the collection's files, which every write moves forward.
+    """
+    if _use_sqlite():
+        return sqlite_store.collection_version(_sqlite_dir(), file_key)
+    with _pending_lock:
+        entry = _pending.get((get_current_user_id(), file_key))
+        if entry:
+            return entry['version']
+    path = _get_files()[file_key]
+    if _use_partitions(file_key):
+        return partitions.version(path)
+    if _use_journal(file_key):
+        return journal.version(path)
+    signature = _file_signature(path)
+    return signature[0] if signature else 0
+
+def _collection_exists(file_key: str) -> bool:
+    """Whether a collection has ever been written for the current user."""
+    if _use_sqlite():
+        return sqlite_store.collection_version(_sqlite_dir(), file_key) > 0
+    path = _get_files().get(file_key)
+    if not path:
+        return False
+    return _json_signature(file_key, path) is not None or os.path.exists(path)
+
+def _load_period_cached(file_key: str, period: str) -> List[Dict]:
+    """
+    Records of a single month (YYYY-MM) of a dated collection. With monthly
+    partitions only that month's file is read; otherwise the month's slice of
+    the cached collection's sorted view is used. Read-only, like _load_cached.
+    """
+    if not _use_partitions(file_key):
+        return list(_iter_range(file_key, period, period + _RANGE_END))
+    path = _get_files()[file_key]
+    if partitions.signature(path) is None:
+        # Not migrated yet; a full load takes care of that
+        _load_cached(file_key)
+    uid = get_current_user_id()
+    cache_key = f"{file_key}@{period}"
+    signature = partitions.partition_signature(path, period)
+    if signature is None:
+        return []
+    cached = _cache_get(uid, cache_key, signature)
+    if cached is not None:
+        return cached
+    try:
+        data, size = partitions.load_period(path, period)
+    except Exception as e:
+        print(f"Error loading {file_key} for {period}: {e}")
+        return []
+    _cache_put(uid, cache_key, signature, data, size)
+    return data
+
+# Dates are compared as strings; appending this to an end bound makes it
+# inclusive of anything that starts with it ('2024-05' covers '2024-05-31').
+_RANGE_END = '\uffff'
+
+def _iter_range(file_key: str, start: Optional[str] = None, end: Optional[str] = None,
+                newest_first: bool = False):
+    """Cached records with start <= date <= end, found by bisecting the sorted view."""
+    data, index, order = _load_sorted(file_key)
+    lo = bisect.bisect_left(order, (start, '', '')) if start else 0
+    hi = bisect.bisect_left(order, (end, '', '')) if end else len(order)
+    positions = range(hi - 1, lo - 1, -1) if newest_first else range(lo, hi)
+    resolve = _key_resolver(data, index)
+    for i in positions:
+        pos = resolve(order[i])
+        if pos is not None:
+            yield data[pos]
+
+# Row-level writes. The SQLite backend turns these into single-row statements,
+# partitioned collections rewrite only the months they touch and journaled
+# collections append lines; plain JSON collections still rewrite the whole file,
+# but only once per group commit (see below).
+
+def _apply_changes(data: List[Dict], index: Dict[str, int], order: Optional[List[Tuple]],
+                   inserts: List[Dict], updates: List[Dict], delete_ids: set):
+    """In-memory equivalent of a write, used to patch cached lists, their index and sorted view."""
+    if order is not None:
+        for record_id in delete_ids | {r.get('id') for r in updates}:
+            pos = index.get(record_id)
+            if pos is not None:
+                key = _sort_key(data[pos])
+                i = bisect.bisect_left(order, key)
+                if i < len(order) and order[i] == key:
+                    del order[i]
+    for record in updates:
+        pos = index.get(record.get('id'))
+        if pos is not None:
+            data[pos] = record
+            if order is not None:
+                bisect.insort(order, _sort_key(record))
+    positions = sorted(index.pop(i) for i in delete_ids if i in index)
+    if positions:
+        for pos in reversed(positions):
+            del data[pos]
+        # Only records after the first removed one change position
+        for pos in range(positions[0], len(data)):
+            index[data[pos].get('id')] = pos
+    for record in inserts:
+        index[record.get('id')] = len(data)
+        data.append(record)
+        if order is not None:
+            bisect.insort(order, _sort_key(record))
+
+def _write_records(file_key: str, inserts: List[Dict] = (), updates: List[Dict] = (), deletes: List[str] = ()) -> int:
+    """
+    Add `inserts`, overwrite `updates` (matched by id) and remove `deletes`
+    (ids) from a collection. Returns how many records were deleted.
+    """
+    with _write_lock(get_current_user_id(), file_key):
+        return _write_records_locked(file_key, inserts, updates, deletes)
+
+def _write_records_locked(file_key: str, inserts: List[Dict], updates: List[Dict], deletes: List[str]) -> int:
+    path = _get_files()[file_key]
+    uid = get_current_user_id()
+    if not _deferring():
+        # Changes deferred elsewhere in this process go to disk first
+        _flush_pending(uid, file_key)
+    # Pre-write state; also makes sure the cache can be patched in place
+    current, index = _load_indexed(file_key)
+    delete_ids = {i for i in deletes if i in index}
+    inserts, updates = list(inserts), list(updates)
+    if not (inserts or updates or delete_ids):
+        return 0
+
+    new_inserts, new_updates = _copy_records(inserts), _copy_records(updates)
+    # Previous versions of everything we overwrite or remove
+    touched = delete_ids | {r.get('id') for r in updates}
+    removed = [current[index[i]] for i in touched if i in index]
+
+    def apply(data, data_index, data_order):
+        _apply_changes(data, data_index, data_order, new_inserts, new_updates, delete_ids)
+
+    if _use_sqlite():
+        before, after, _ = sqlite_store.apply(_sqlite_dir(), file_key, inserts, updates, list(delete_ids))
+        _cache_patch(uid, file_key, ('sqlite', before), ('sqlite', after), apply)
+    elif _use_partitions(file_key):
+        known = {r.get('id'): partitions.period_of(r) for r in removed}
+        before, after, _ = partitions.apply(path, inserts, updates, delete_ids, known, serialization.dump)
+        _cache_patch(uid, file_key, before, after, apply)
+        for period in set(known.values()) | {partitions.period_of(r) for r in inserts + updates}:
+            invalidate_cache(uid, f"{file_key}@{period}")
+    elif _use_journal(file_key):
+        entries = [{'op': 'del', 'id': i} for i in delete_ids]
+        entries += [{'op': 'put', 'record': r} for r in updates + inserts]
+        before, after, needs_compaction = journal.append(path, entries)
+        _cache_patch(uid, file_key, before, after, apply)
+        if needs_compaction:
+            def on_done(before_swap, after_swap):
+                # Same content, new files: just move the cached signature along
+                _cache_patch(uid, file_key, before_swap, after_swap, lambda data, data_index, data_order: None)
+            journal.schedule_compaction(path, serialization.dump, on_done)
+    else:
+        before = _json_signature(file_key, path)
+        data = list(current)
+        apply(data, dict(index), None)
+        if _deferring():
+            after = _defer(uid, file_key, path, data, _collection_writer(file_key, path),
+                           (new_inserts, new_updates, delete_ids))
+        else:
+            try:
+                _write_collection(file_key, path, data)
+            except Exception as e:
+                print(f"Error saving {file_key}: {e}")
+                invalidate_cache(uid, file_key)
+                return 0
+            after = _json_signature(file_key, path)
+        if before is None:
+            # The collection didn't exist, so nothing was cached to patch; without
+            # an entry the next read would have to flush deferred changes to load them
+            _cache_put(uid, file_key, after, list(data), 0)
+        else:
+            _cache_patch(uid, file_key, before, after, apply)
+
+    if file_key == 'transactions':
+        if _use_sqlite():
+            before, after = ('sqlite', before), ('sqlite', after)
+        _on_transactions_changed(before, after, removed, new_updates + new_inserts)
+    return len(delete_ids)
+
+def _insert_records(file_key: str, records: List[Dict]):
+    """Append records to a collection."""
+    _write_records(file_key, inserts=records)
+
+def _replace_record(file_key: str, record: Dict):
+    """Overwrite the record with the same id."""
+    _write_records(file_key, updates=[record])
+
+def _delete_records(file_key: str, ids: List[str]) -> int:
+    """Delete records by id. Returns how many were removed."""
+    return _write_records(file_key, deletes=ids)
+
+# Derived data kept in step with the transactions collection
+
+def _on_transactions_changed(before: Tuple, after: Tuple, removed: List[Dict], added: List[Dict]):
+    from . import rollups, ledger
+    try:
+        rollups.apply_delta(before, after, removed, added)
+    except Exception as e:
+        print(f"[Storage] Rollup update error: {e}")
+    try:
+        ledger.apply_delta(before, after, removed, added)
+    except Exception as e:
+        print(f"[Storage] Ledger update error: {e}")
+
+def _on_transactions_replaced():
+    from . import rollups, ledger
+    try:
+        rollups.rebuild()
+    except Exception as e:
+        print(f"[Storage] Rollup rebuild error: {e}")
+    try:
+        ledger.reconcile()
+    except Exception as e:
+        print(f"[Storage] Ledger reconcile error: {e}")
+
+# =============================================================================
+# GROUP COMMIT
+# =============================================================================
+# Plain JSON collections and derived documents are rewritten whole on every
+# change. Inside group_commit() (every API request runs in one) those
+# rewrites are deferred: the change goes into the cache right away and each
+# touched file is written once, when the block exits. With
+# LUNA_STORAGE_GROUP_COMMIT_MS > 0, writes outside any block are deferred too
+# and flushed by a timer after that many milliseconds, which trades a short
+# window of durability for fewer rewrites during bursts.
+#
+# A deferred write gets a ('pending', n) signature instead of a file stat, so
+# the cache and the derived documents stay consistent until the flush moves
+# them on to the real file signature. If the cache drops a collection with
+# deferred changes, the next read flushes it before loading.
+#
+# Deferred changes remember the file signature they started from. If another
+# worker process wrote the file in the meantime, the flush re-reads it and
+# re-applies the deferred row changes; deferred documents are dropped instead
+# and rebuilt from their source when next read.
+GROUP_COMMIT_MS = int(os.getenv('LUNA_STORAGE_GROUP_COMMIT_MS', '0'))
+
+# (uid, cache key) -> {'signature', 'data', 'write', 'path', 'base', 'ops', 'version'}
+_pending: Dict[Tuple[str, str], Dict] = {}
+_pending_lock = threading.RLock()
+_pending_ids = itertools.count(1)
+_flush_timers: Dict[str, threading.Timer] = {}
+_group: ContextVar[Optional[set]] = ContextVar('luna_group_commit', default=None)
+_flushing: ContextVar[bool] = ContextVar('luna_flushing', default=False)
+
+def _write_lock(uid: str, key: str) -> locks.FileLock:
+    """
+    Serializes read-modify-write cycles (and flushes) of one collection or
+    document, across threads and worker processes.
+    """
+    return locks.lock_for(os.path.join(get_user_data_dir(uid), key.replace(':', '_')))
+
+def _deferring() -> bool:
+    return not _flushing.get() and (_group.get() is not None or GROUP_COMMIT_MS > 0)
+
+def _pending_signature(uid: str, key: str) -> Optional[Tuple]:
+    with _pending_lock:
+        entry = _pending.get((uid, key))
+        return entry['signature'] if entry else None
+
+def _defer(uid: str, key: str, path: str, data, write, op: Optional[Tuple] = None) -> Tuple:
+    """
+    Record the new full contents of a collection/document at `path` instead
+    of writing them; `write(data)` does the actual write later and returns
+    the file signature. `op` is the (inserts, updates, delete_ids) row change
+    behind it, if there is one. Returns the pending signature to cache the
+    data under.
+    """
+    signature = ('pending', next(_pending_ids))
+    with _pending_lock:
+        entry = _pending.get((uid, key))
+        if entry is None:
+            base = _file_signature(path)
+            entry = _pending[(uid, key)] = {'path': path, 'base': base, 'ops': [],
+                                            'version': base[0] if base else 0}
+        # Past the file's version; the flush writes the file with a later mtime still
+        entry.update(signature=signature, data=data, write=write,
+                     version=max(entry['version'] + 1, time.time_ns()))
+        if op is None:
+            entry['ops'] = None
+        elif entry['ops'] is not None:
+            entry['ops'].append(op)
+    group = _group.get()
+    if group is not None:
+        group.add((uid, key))
+    else:
+        _schedule_flush(uid)
+    return signature
+
+def _discard_pending(uid: str, key: str):
+    """Forget deferred contents that a direct write has just superseded."""
+    with _pending_lock:
+        _pending.pop((uid, key), None)
+
+def _flush_pending(uid: str, key: str) -> bool:
+    """Write the deferred contents of one collection/document. Returns False if there were none."""
+    with _write_lock(uid, key):
+        with _pending_lock:
+            entry = _pending.pop((uid, key), None)
+        if entry is None:
+            return False
+        data = entry['data']
+        conflict = _file_signature(entry['path']) != entry['base']
+        if conflict:
+            # Another worker process wrote the file since the changes were deferred
+            invalidate_cache(uid, key)
+            if entry['ops'] is None:
+                return True
+            data = _reapply(key, entry['path'], entry['ops'])
+        user_token = _current_user_id.set(uid)
+        flushing_token = _flushing.set(True)
+        try:
+            try:
+                signature = entry['write'](data)
+                if serialization.advance_mtime(entry['path'], entry['version']):
+                    signature = _file_signature(entry['path'])
+            except Exception as e:
+                print(f"Error saving {key}: {e}")
+                invalidate_cache(uid, key)
+                return True
+            if conflict:
+                # Derived documents no longer match and get rebuilt on next read
+                return True
+            with _cache_lock:
+                cached = _cache.get(uid, {}).get(key)
+                if cached and cached['signature'] == entry['signature']:
+                    cached['signature'] = signature
+            if key == 'transactions':
+                # Nothing changed but the signature the derived documents refer to
+                _on_transactions_changed(entry['signature'], signature, [], [])
+        finally:
+            _flushing.reset(flushing_token)
+            _current_user_id.reset(user_token)
+        return True
+
+def _reapply(file_key: str, path: str, ops: List[Tuple]) -> List[Dict]:
+    """The collection as now on disk, with deferred row changes applied again."""
+    data = []
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            data = _normalize(file_key, serialization.load(f))
+    index = _build_index(data)
+    for inserts, updates, delete_ids in ops:
+        _apply_changes(data, index, None, inserts, updates, delete_ids)
+    return data
+
+def flush_pending(uid: Optional[str] = None, keys: Optional[List[Tuple[str, str]]] = None):
+    """
+    Write deferred changes to disk: those of the given (uid, key) pairs,
+    of one user, or of everyone.
+    """
+    with _pending_lock:
+        if keys is None:
+            keys = [k for k in _pending if uid is None or k[0] == uid]
+    # Collections first: flushing them updates the documents derived from them
+    for key_uid, key in sorted(keys, key=lambda k: k[1].startswith('doc:')):
+        _flush_pending(key_uid, key)
+
+def _schedule_flush(uid: str):
+    with _pending_lock:
+        if uid in _flush_timers:
+            return
+        timer = threading.Timer(GROUP_COMMIT_MS / 1000, _flush_timer, (uid,))
+        timer.daemon = True
+        _flush_timers[uid] = timer
+    timer.start()
+
+def _flush_timer(uid: str):
+    with _pending_lock:
+        _flush_timers.pop(uid, None)
+    flush_pending(uid)
+
+atexit.register(flush_pending)
+
+def begin_group_commit():
+    """
+    Start deferring writes in the current context. Returns a token for
+    end_group_commit (None when already inside a group, which is then joined).
+    """
+    if _group.get() is not None:
+        return None
+    return _group.set(set())
+
+def end_group_commit(token) -> List[Tuple[str, str]]:
+    """Stop deferring. Returns the (uid, key) pairs to pass to flush_pending."""
+    if token is None:
+        return []
+    keys = list(_group.get())
+    _group.reset(token)
+    return keys
+
+@contextmanager
+def group_commit():
+    """Coalesce the writes made inside the block into one flush per collection at exit."""
+    token = begin_group_commit()
+    try:
+        yield
+    finally:
+        flush_pending(keys=end_group_commit(token))
+
+# =============================================================================
+# DERIVED DOCUMENTS
+# =============================================================================
+# Small per-user JSON documents (rollups, ledger, ...) that live next to the
+# collections whatever the backend, cached like the collections themselves.
+
+def _doc_path(name: str) -> str:
+    return os.path.join(get_user_data_dir(), f"{name}.json")
+
+def _load_doc(name: str) -> Optional[Dict]:
+    """Load a derived document. The returned dict is shared with the cache."""
+    path = _doc_path(name)
+    uid = get_current_user_id()
+    cache_key = f"doc:{name}"
+    signature = _pending_signature(uid, cache_key) or _file_signature(path)
+    if signature is None:
+        return None
+    cached = _cache_get(uid, cache_key, signature)
+    if cached is not None:
+        return cached
+    if _flush_pending(uid, cache_key):
+        signature = _file_signature(path)
+        if signature is None:
+            return None
     try:
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+        with open(path, 'rb') as f:
+            data = serialization.load(f)
     except Exception as e:
-        print(f"Error saving {file_key}: {e}")
+        print(f"Error loading {name}: {e}")
+        return None
+    _cache_put(uid, cache_key, signature, data, signature[1])
+    return data
+
+def _write_doc(path: str, data: Dict) -> Optional[Tuple]:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    serialization.write_atomic(path, data)
+    return _file_signature(path)
+
+def _save_doc(name: str, data: Dict):
+    path = _doc_path(name)
+    uid = get_current_user_id()
+    cache_key = f"doc:{name}"
+    with _write_lock(uid, cache_key):
+        if _deferring():
+            with _cache_lock:
+                previous = _cache.get(uid, {}).get(cache_key)
+                size = previous['size'] // _CACHE_OVERHEAD_FACTOR if previous else 0
+            signature = _defer(uid, cache_key, path, data, lambda doc: _write_doc(path, doc))
+            _cache_put(uid, cache_key, signature, data, size)
+            return
+        try:
+            signature = _write_doc(path, data)
+        except Exception as e:
+            print(f"Error saving {name}: {e}")
+            invalidate_cache(uid, cache_key)
+            return
+        _discard_pending(uid, cache_key)
+        if signature:
+            _cache_put(uid, cache_key, signature, data, signature[1])
 
 # --- TRANSACTIONS ---
 
@@ -111,8 +1006,6 @@ def add_transaction(data: Dict) -> Transaction:
     from . import budget
     from . import goals
     
-    transactions = _load_json('transactions')
-    
     # Ensure category is set
     category = data.get('category', 'geral')
     tags.get_or_create_tag(category)
@@ -124,8 +1017,7 @@ def add_transaction(data: Dict) -> Transaction:
     if 'created_at' not in data:
         data['created_at'] = datetime.now().isoformat()
         
-    transactions.append(data)
-    _save_json('transactions', transactions)
+    _insert_records('transactions', [data])
     
     # === SMART INTEGRATIONS ===
     tx_type = data.get('type', 'expense')
@@ -147,95 +1039,278 @@ def add_transaction(data: Dict) -> Transaction:
     
     return Transaction(**data)
 
+def add_transactions(items: List[Dict]) -> List[Transaction]:
+    """
+    Add many transactions at once. Same effects as add_transaction for each
+    item, but missing tags are created in one go, the collection is written
+    once and the budget/goal integrations run once per category.
+    """
+    from . import tags
+    from . import budget
+    from . import goals
+    import uuid
+
+    if not items:
+        return []
+    tags.ensure_tags(dict.fromkeys(data.get('category', 'geral') for data in items))
+    created_at = datetime.now().isoformat()
+    for data in items:
+        if 'id' not in data:
+            data['id'] = str(uuid.uuid4())
+        if 'created_at' not in data:
+            data['created_at'] = created_at
+
+    _insert_records('transactions', items)
+
+    # === SMART INTEGRATIONS ===
+    expenses: Dict[str, float] = {}
+    incomes: Dict[str, float] = {}
+    for data in items:
+        totals = {'expense': expenses, 'income': incomes}.get(data.get('type', 'expense'))
+        if totals is not None:
+            category = data.get('category', 'geral')
+            totals[category] = totals.get(category, 0.0) + float(data.get('value', 0))
+    for category, value in expenses.items():
+        try:
+            budget.check_budget_impact(category, value, 'expense')
+        except Exception as e:
+            print(f"[Integration] Budget check error: {e}")
+    for category, value in incomes.items():
+        try:
+            goals.update_goal_from_transaction(category, value, 'income')
+        except Exception as e:
+            print(f"[Integration] Goal update error: {e}")
+
+    return [Transaction(**data) for data in items]
+
+def _iter_newest_first(hi: Optional[int] = None, tx_type: str = 'all'):
+    """Yield (sort key, cached record) newest first, starting below position `hi` of the sorted view."""
+    data, index, order = _load_sorted('transactions')
+    pos = len(order) if hi is None else hi
+    resolve = _key_resolver(data, index)
+    while pos > 0:
+        pos -= 1
+        key = order[pos]
+        record_pos = resolve(key)
+        if record_pos is None:
+            continue
+        record = data[record_pos]
+        if tx_type == 'all' or record.get('type') == tx_type:
+            yield key, record
+
 def get_transactions(filters: Optional[Dict] = None) -> List[Dict]:
-    transactions = _load_json('transactions')
-    # Sort by date desc
-    transactions.sort(key=lambda x: x.get('date', ''), reverse=True)
-    
-    if filters:
-        if 'type' in filters and filters['type'] != 'all':
-            transactions = [t for t in transactions if t['type'] == filters['type']]
-        if 'limit' in filters:
-            transactions = transactions[:int(filters['limit'])]
-            
+    """Transactions, newest first. Filters: type, limit."""
+    filters = filters or {}
+    tx_type = filters.get('type', 'all')
+    limit = int(filters['limit']) if 'limit' in filters else None
+    transactions = []
+    for _, record in _iter_newest_first(tx_type=tx_type):
+        if limit is not None and len(transactions) >= limit:
+            break
+        transactions.append(_copy_record(record))
     return transactions
 
-def delete_transaction(transaction_id: str) -> bool:
-    transactions = _load_json('transactions')
-    original_len = len(transactions)
-    transactions = [t for t in transactions if t.get('id') != transaction_id]
-    
-    if len(transactions) < original_len:
-        _save_json('transactions', transactions)
+def _encode_cursor(key: Tuple[str, str, str]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode('utf-8')).decode('ascii')
+
+def _decode_cursor(cursor: str) -> Tuple[str, str, str]:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not (isinstance(key, list) and len(key) == 3 and all(isinstance(k, str) for k in key)):
+        raise ValueError("Invalid cursor")
+    return tuple(key)
+
+def get_transactions_page(limit: int = 50, cursor: Optional[str] = None, before_date: Optional[str] = None,
+                          tx_type: str = 'all') -> Tuple[List[Dict], Optional[str]]:
+    """
+    Keyset pagination over transactions, newest first. `cursor` is the value
+    returned for the previous page; `before_date` (YYYY-MM-DD) only returns
+    transactions dated strictly before it. Returns (page, next_cursor), with
+    next_cursor None on the last page. Raises ValueError on a malformed cursor
+    or a `limit` below 1.
+    """
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    _, _, order = _load_sorted('transactions')
+    hi = len(order)
+    if cursor:
+        hi = bisect.bisect_left(order, _decode_cursor(cursor))
+    if before_date:
+        hi = min(hi, bisect.bisect_left(order, (before_date, '', '')))
+
+    page, last_key, has_more = [], None, False
+    for key, record in _iter_newest_first(hi, tx_type):
+        if len(page) >= limit:
+            has_more = True
+            break
+        page.append(_copy_record(record))
+        last_key = key
+    return page, (_encode_cursor(last_key) if has_more else None)
+
+def get_transactions_for_period(period: str) -> List[Dict]:
+    """Transactions dated in a given month (YYYY-MM)."""
+    return _copy_records(_load_period_cached('transactions', period))
+
+def _transaction_matcher(types, categories, credit_card_id, recurring_id, min_value, max_value, text):
+    """Predicate for the non-date criteria of query_transactions."""
+    categories = {c.lower() for c in categories} if categories else None
+    text = text.lower() if text else None
+
+    def matches(tx: Dict) -> bool:
+        if types and tx.get('type') not in types:
+            return False
+        if categories is not None and (tx.get('category') or '').lower() not in categories:
+            return False
+        if credit_card_id is not None and tx.get('credit_card_id') != credit_card_id:
+            return False
+        if recurring_id is not None and tx.get('recurring_id') != recurring_id:
+            return False
+        if min_value is not None or max_value is not None:
+            try:
+                value = float(tx.get('value', 0) or 0)
+            except (TypeError, ValueError):
+                return False
+            if min_value is not None and value < min_value:
+                return False
+            if max_value is not None and value > max_value:
+                return False
+        if text and text not in (tx.get('description') or '').lower():
+            return False
         return True
-    return False
+    return matches
+
+def query_transactions(start_date: Optional[str] = None, end_date: Optional[str] = None,
+                       period: Optional[str] = None, types=None, categories=None,
+                       credit_card_id: Optional[str] = None, recurring_id: Optional[str] = None,
+                       min_value: Optional[float] = None, max_value: Optional[float] = None,
+                       text: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+    """
+    Transactions matching every given criterion, newest first.
+    - start_date / end_date: inclusive bounds (YYYY-MM-DD or YYYY-MM)
+    - period: shorthand for a whole month (YYYY-MM)
+    - types / categories: a value or a collection of values (categories ignore case)
+    - credit_card_id / recurring_id: exact match
+    - min_value / max_value: inclusive bounds on value
+    - text: case-insensitive substring of the description
+
+    With SQLite the query runs in the database (indexed date, type, category
+    and card columns) unless the collection is already cached; partitioned
+    collections only open the months in the date range; otherwise the cached
+    sorted view is bisected on the date range.
+    """
+    if period:
+        start_date, end_date = period, period
+    if isinstance(types, str):
+        types = [types]
+    if isinstance(categories, str):
+        categories = [categories]
+    end = end_date + _RANGE_END if end_date else None
+    matches = _transaction_matcher(types, categories, credit_card_id, recurring_id,
+                                   min_value, max_value, text)
+
+    if _use_sqlite() and not _is_cached('transactions'):
+        return sqlite_store.query_transactions(
+            _sqlite_dir(), start_date, end, types, categories, credit_card_id, recurring_id,
+            min_value, max_value, text, limit)
+
+    if _use_partitions('transactions') and start_date and end and not _is_cached('transactions'):
+        path = _get_files()['transactions']
+        if partitions.signature(path) is not None:
+            months = [p for p in partitions.list_periods(path) if start_date[:7] <= p <= end]
+            candidates = [r for p in months for r in _load_period_cached('transactions', p)
+                          if start_date <= (r.get('date') or '') <= end and matches(r)]
+            candidates.sort(key=_sort_key, reverse=True)
+            return _copy_records(candidates[:limit] if limit is not None else candidates)
+
+    result = []
+    for tx in _iter_range('transactions', start_date, end, newest_first=True):
+        if limit is not None and len(result) >= limit:
+            break
+        if matches(tx):
+            result.append(_copy_record(tx))
+    return result
+
+def delete_transaction(transaction_id: str) -> bool:
+    return _delete_records('transactions', [transaction_id]) > 0
 
 def update_transaction(transaction_id: str, updates: Dict) -> Optional[Transaction]:
-    transactions = _load_json('transactions')
-    updated = False
-    updated_tx = None
+    tx = get_by_id('transactions', transaction_id)
+    if tx is None:
+        return None
     
-    for tx in transactions:
-        if tx.get('id') == transaction_id:
-            from . import tags
-            # Update fields, forbidding id change
-            for k, v in updates.items():
-                if k != 'id' and k != 'created_at':
-                     tx[k] = v
-                     if k == 'category':
-                         tags.get_or_create_tag(v)
-            updated = True
-            updated_tx = tx
-            break
+    from . import tags
+    # Update fields, forbidding id change
+    for k, v in updates.items():
+        if k != 'id' and k != 'created_at':
+             tx[k] = v
+             if k == 'category':
+                 tags.get_or_create_tag(v)
             
-    if updated:
-        _save_json('transactions', transactions)
-        return Transaction(**updated_tx)
-    return None
+    _replace_record('transactions', tx)
+    return Transaction(**tx)
+
+def select_transactions(ids: Optional[List[str]] = None, **criteria) -> List[Dict]:
+    """
+    Transactions picked by id and/or by the query_transactions criteria
+    (both must hold when both are given), newest first.
+    """
+    if ids is None:
+        return query_transactions(**criteria)
+    wanted = set(ids)
+    if any(v is not None for v in criteria.values()):
+        return [tx for tx in query_transactions(**criteria) if tx.get('id') in wanted]
+    data, index = _load_indexed('transactions')
+    selected = [_copy_record(data[index[i]]) for i in wanted if i in index]
+    selected.sort(key=_sort_key, reverse=True)
+    return selected
+
+def update_transactions(changes: Dict, ids: Optional[List[str]] = None, **criteria) -> Tuple[int, int]:
+    """
+    Apply the same field changes to every selected transaction, in a single
+    write. Returns (matched, updated); records already holding the new values
+    are left alone.
+    """
+    from . import tags
+
+    changes = {k: v for k, v in changes.items() if k not in ('id', 'created_at')}
+    selected = select_transactions(ids, **criteria)
+    changed = [dict(tx, **changes) for tx in selected
+               if any(tx.get(k) != v for k, v in changes.items())]
+    if changed:
+        if changes.get('category'):
+            tags.ensure_tags([changes['category']])
+        _write_records('transactions', updates=changed)
+    return len(selected), len(changed)
+
+def delete_transactions(ids: Optional[List[str]] = None, **criteria) -> int:
+    """Delete every selected transaction in a single write. Returns how many were removed."""
+    selected = select_transactions(ids, **criteria)
+    if not selected:
+        return 0
+    return _delete_records('transactions', [tx['id'] for tx in selected])
+
+def get_balance() -> float:
+    """All-time balance, read from the running ledger."""
+    from . import ledger
+    return round(ledger.get_balance(), 2)
 
 def get_summary(period: Optional[str] = None) -> Dict:
     """
     Get financial summary. If period is specified (YYYY-MM), 
     returns data for that month only. Balance is always all-time.
     """
-    transactions = _load_json('transactions')
-    
-    # All-time balance
-    all_time_balance = 0.0
-    for t in transactions:
-        val = t.get('value', 0)
-        if t['type'] == 'income':
-            all_time_balance += val
-        elif t['type'] == 'expense':
-            all_time_balance -= val
-        elif t['type'] == 'investment':
-            all_time_balance -= val
-    
-    # Period-specific income/expenses
-    if period:
-        period_txs = [t for t in transactions if t.get('date', '').startswith(period)]
-    else:
-        # Default to current month
-        from datetime import datetime
-        current_period = datetime.now().strftime("%Y-%m")
-        period_txs = [t for t in transactions if t.get('date', '').startswith(current_period)]
-    
-    income = 0.0
-    expenses = 0.0
-    
-    for t in period_txs:
-        val = t.get('value', 0)
-        if t['type'] == 'income':
-            income += val
-        elif t['type'] == 'expense':
-            expenses += val
-            
+    from . import rollups
+    period = period or datetime.now().strftime("%Y-%m")
+    month = rollups.period_totals(period)
+
     return {
-        "balance": round(all_time_balance, 2),
-        "income": round(income, 2),
-        "expenses": round(expenses, 2),
-        "transaction_count": len(period_txs),
-        "period": period or datetime.now().strftime("%Y-%m")
+        "balance": get_balance(),
+        "income": round(month['income'], 2),
+        "expenses": round(month['expense'], 2),
+        "transaction_count": month['count'],
+        "period": period
     }
 
 # --- RECURRING ---
@@ -245,46 +1320,31 @@ def get_recurring() -> List[Dict]:
 
 def add_recurring(data: Dict) -> RecurringItem:
     from . import tags
-    items = _load_json('recurring')
     if 'id' not in data:
         import uuid
         data['id'] = str(uuid.uuid4())
     # Auto-create tag for category
     category = data.get('category', 'fixo')
     tags.get_or_create_tag(category)
-    items.append(data)
-    _save_json('recurring', items)
+    _insert_records('recurring', [data])
     return RecurringItem(**data)
 
 def delete_recurring(item_id: str) -> bool:
-    items = _load_json('recurring')
-    original_len = len(items)
-    items = [i for i in items if i.get('id') != item_id]
-    if len(items) < original_len:
-        _save_json('recurring', items)
-        return True
-    return False
+    return _delete_records('recurring', [item_id]) > 0
 
 def update_recurring(item_id: str, updates: Dict) -> Optional[RecurringItem]:
     from . import tags
-    items = _load_json('recurring')
-    updated = False
-    updated_tx = None
-    for i in items:
-        if i.get('id') == item_id:
-            for k, v in updates.items():
-                if k != 'id':
-                    i[k] = v
-                    # Auto-create tag when category changes
-                    if k == 'category':
-                        tags.get_or_create_tag(v)
-            updated = True
-            updated_tx = i
-            break
-    if updated:
-        _save_json('recurring', items)
-        return RecurringItem(**updated_tx)
-    return None
+    i = get_by_id('recurring', item_id)
+    if i is None:
+        return None
+    for k, v in updates.items():
+        if k != 'id':
+            i[k] = v
+            # Auto-create tag when category changes
+            if k == 'category':
+                tags.get_or_create_tag(v)
+    _replace_record('recurring', i)
+    return RecurringItem(**i)
 
 # --- OVERDUE BILLS ---
 
@@ -293,40 +1353,31 @@ def get_bills() -> List[Dict]:
 
 def add_bill(data: Dict) -> OverdueBill:
     from . import tags
-    bills = _load_json('bills')
     if 'id' not in data:
         import uuid
         data['id'] = str(uuid.uuid4())
     # Auto-create tag for category
     category = data.get('category', 'geral')
     tags.get_or_create_tag(category)
-    bills.append(data)
-    _save_json('bills', bills)
+    _insert_records('bills', [data])
     return OverdueBill(**data)
 
 def update_bill(bill_id: str, updates: Dict) -> Optional[OverdueBill]:
     from . import tags
-    bills = _load_json('bills')
-    updated = False
-    updated_bill = None
+    bill = get_by_id('bills', bill_id)
+    if bill is None:
+        return None
     
-    for bill in bills:
-        if bill.get('id') == bill_id:
-            # Update fields
-            for k, v in updates.items():
-                if k != 'id':
-                    bill[k] = v
-                    # Auto-create tag when category changes
-                    if k == 'category':
-                        tags.get_or_create_tag(v)
-            updated = True
-            updated_bill = bill
-            break
+    # Update fields
+    for k, v in updates.items():
+        if k != 'id':
+            bill[k] = v
+            # Auto-create tag when category changes
+            if k == 'category':
+                tags.get_or_create_tag(v)
     
-    if updated:
-        _save_json('bills', bills)
-        return OverdueBill(**updated_bill)
-    return None
+    _replace_record('bills', bill)
+    return OverdueBill(**bill)
 
 # --- BUDGET ---
 
@@ -334,7 +1385,6 @@ def get_budget() -> List[Dict]:
     return _load_json('budget')
 
 def add_budget(data: Dict) -> Budget:
-    items = _load_json('budget')
     if 'id' not in data:
         import uuid
         data['id'] = str(uuid.uuid4())
@@ -343,36 +1393,22 @@ def add_budget(data: Dict) -> Budget:
     if 'updated_at' not in data:
         data['updated_at'] = datetime.now().isoformat()
         
-    items.append(data)
-    _save_json('budget', items)
+    _insert_records('budget', [data])
     return Budget(**data)
 
 def delete_budget(budget_id: str) -> bool:
-    items = _load_json('budget')
-    original_len = len(items)
-    items = [i for i in items if i.get('id') != budget_id]
-    if len(items) < original_len:
-        _save_json('budget', items)
-        return True
-    return False
+    return _delete_records('budget', [budget_id]) > 0
 
 def update_budget(budget_id: str, updates: Dict) -> Optional[Budget]:
-    items = _load_json('budget')
-    updated = False
-    updated_obj = None
-    for i in items:
-        if i.get('id') == budget_id:
-            for k, v in updates.items():
-                if k not in ['id', 'created_at']:
-                    i[k] = v
-            i['updated_at'] = datetime.now().isoformat()
-            updated = True
-            updated_obj = i
-            break
-    if updated:
-        _save_json('budget', items)
-        return Budget(**updated_obj)
-    return None
+    i = get_by_id('budget', budget_id)
+    if i is None:
+        return None
+    for k, v in updates.items():
+        if k not in ['id', 'created_at']:
+            i[k] = v
+    i['updated_at'] = datetime.now().isoformat()
+    _replace_record('budget', i)
+    return Budget(**i)
 
 # --- GOALS ---
 
@@ -380,7 +1416,6 @@ def get_goals() -> List[Dict]:
     return _load_json('goals')
 
 def add_goal(data: Dict) -> Goal:
-    items = _load_json('goals')
     if 'id' not in data:
         import uuid
         data['id'] = str(uuid.uuid4())
@@ -389,36 +1424,22 @@ def add_goal(data: Dict) -> Goal:
     if 'updated_at' not in data:
         data['updated_at'] = datetime.now().isoformat()
         
-    items.append(data)
-    _save_json('goals', items)
+    _insert_records('goals', [data])
     return Goal(**data)
 
 def delete_goal(goal_id: str) -> bool:
-    items = _load_json('goals')
-    original_len = len(items)
-    items = [i for i in items if i.get('id') != goal_id]
-    if len(items) < original_len:
-        _save_json('goals', items)
-        return True
-    return False
+    return _delete_records('goals', [goal_id]) > 0
 
 def update_goal(goal_id: str, updates: Dict) -> Optional[Goal]:
-    items = _load_json('goals')
-    updated = False
-    updated_obj = None
-    for i in items:
-        if i.get('id') == goal_id:
-            for k, v in updates.items():
-                if k not in ['id', 'created_at']:
-                    i[k] = v
-            i['updated_at'] = datetime.now().isoformat()
-            updated = True
-            updated_obj = i
-            break
-    if updated:
-        _save_json('goals', items)
-        return Goal(**updated_obj)
-    return None
+    i = get_by_id('goals', goal_id)
+    if i is None:
+        return None
+    for k, v in updates.items():
+        if k not in ['id', 'created_at']:
+            i[k] = v
+    i['updated_at'] = datetime.now().isoformat()
+    _replace_record('goals', i)
+    return Goal(**i)
 
 # --- CREDIT CARDS ---
 
@@ -426,42 +1447,27 @@ def get_cards() -> List[Dict]:
     return _load_json('cards')
 
 def add_card(data: Dict) -> CreditCard:
-    items = _load_json('cards')
     if 'id' not in data:
         import uuid
         data['id'] = str(uuid.uuid4())[:8]
     if 'created_at' not in data:
         data['created_at'] = datetime.now().isoformat()
         
-    items.append(data)
-    _save_json('cards', items)
+    _insert_records('cards', [data])
     return CreditCard(**data)
 
 def delete_card(card_id: str) -> bool:
-    items = _load_json('cards')
-    original_len = len(items)
-    items = [i for i in items if i.get('id') != card_id]
-    if len(items) < original_len:
-        _save_json('cards', items)
-        return True
-    return False
+    return _delete_records('cards', [card_id]) > 0
 
 def update_card(card_id: str, updates: Dict) -> Optional[CreditCard]:
-    items = _load_json('cards')
-    updated = False
-    updated_obj = None
-    for i in items:
-        if i.get('id') == card_id:
-            for k, v in updates.items():
-                if k not in ['id', 'created_at']:
-                    i[k] = v
-            updated = True
-            updated_obj = i
-            break
-    if updated:
-        _save_json('cards', items)
-        return CreditCard(**updated_obj)
-    return None
+    i = get_by_id('cards', card_id)
+    if i is None:
+        return None
+    for k, v in updates.items():
+        if k not in ['id', 'created_at']:
+            i[k] = v
+    _replace_record('cards', i)
+    return CreditCard(**i)
 
 # --- NOTIFICATIONS ---
 
@@ -469,41 +1475,28 @@ def get_notifications() -> List[Dict]:
     return _load_json('notifications')
 
 def add_notification(data: Dict) -> Notification:
-    items = _load_json('notifications')
     if 'id' not in data:
         import uuid
         data['id'] = str(uuid.uuid4())
     if 'date' not in data:
         data['date'] = datetime.now().isoformat()
-    items.append(data)
-    _save_json('notifications', items)
+    _insert_records('notifications', [data])
     return Notification(**data)
 
 def mark_notification_as_read(notification_id: str) -> bool:
-    items = _load_json('notifications')
-    updated = False
-    for i in items:
-        if i.get('id') == notification_id:
-            i['read'] = True
-            updated = True
-            break
-    if updated:
-        _save_json('notifications', items)
-        return True
-    return False
+    i = get_by_id('notifications', notification_id)
+    if i is None:
+        return False
+    i['read'] = True
+    _replace_record('notifications', i)
+    return True
 
 def clear_notifications() -> bool:
     _save_json('notifications', [])
     return True
 
 def delete_notification(notification_id: str) -> bool:
-    items = _load_json('notifications')
-    original_len = len(items)
-    items = [i for i in items if i.get('id') != notification_id]
-    if len(items) < original_len:
-        _save_json('notifications', items)
-        return True
-    return False
+    return _delete_records('notifications', [notification_id]) > 0
 
 # --- PIGGY BANKS (CAIXINHAS) ---
 
@@ -511,7 +1504,6 @@ def get_piggy_banks() -> List[Dict]:
     return _load_json('piggy_banks')
 
 def add_piggy_bank(data: Dict) -> PiggyBank:
-    items = _load_json('piggy_banks')
     if 'id' not in data:
         import uuid
         data['id'] = str(uuid.uuid4())
@@ -522,40 +1514,28 @@ def add_piggy_bank(data: Dict) -> PiggyBank:
     if 'current_amount' not in data:
         data['current_amount'] = 0.0
         
-    items.append(data)
-    _save_json('piggy_banks', items)
+    _insert_records('piggy_banks', [data])
     return PiggyBank(**data)
 
 def delete_piggy_bank(piggy_bank_id: str) -> bool:
-    items = _load_json('piggy_banks')
-    original_len = len(items)
-    items = [i for i in items if i.get('id') != piggy_bank_id]
-    if len(items) < original_len:
-        _save_json('piggy_banks', items)
+    if _delete_records('piggy_banks', [piggy_bank_id]):
         # Also delete related transactions
         transactions = _load_json('piggy_bank_transactions')
-        transactions = [t for t in transactions if t.get('piggy_bank_id') != piggy_bank_id]
-        _save_json('piggy_bank_transactions', transactions)
+        related = [t.get('id') for t in transactions if t.get('piggy_bank_id') == piggy_bank_id]
+        _delete_records('piggy_bank_transactions', related)
         return True
     return False
 
 def update_piggy_bank(piggy_bank_id: str, updates: Dict) -> Optional[PiggyBank]:
-    items = _load_json('piggy_banks')
-    updated = False
-    updated_obj = None
-    for i in items:
-        if i.get('id') == piggy_bank_id:
-            for k, v in updates.items():
-                if k not in ['id', 'created_at', 'current_amount']:  # current_amount is managed by transactions
-                    i[k] = v
-            i['updated_at'] = datetime.now().isoformat()
-            updated = True
-            updated_obj = i
-            break
-    if updated:
-        _save_json('piggy_banks', items)
-        return PiggyBank(**updated_obj)
-    return None
+    i = get_by_id('piggy_banks', piggy_bank_id)
+    if i is None:
+        return None
+    for k, v in updates.items():
+        if k not in ['id', 'created_at', 'current_amount']:  # current_amount is managed by transactions
+            i[k] = v
+    i['updated_at'] = datetime.now().isoformat()
+    _replace_record('piggy_banks', i)
+    return PiggyBank(**i)
 
 def get_piggy_bank_transactions(piggy_bank_id: Optional[str] = None) -> List[Dict]:
     transactions = _load_json('piggy_bank_transactions')
@@ -566,46 +1546,33 @@ def get_piggy_bank_transactions(piggy_bank_id: Optional[str] = None) -> List[Dic
     return transactions
 
 def add_piggy_bank_transaction(data: Dict) -> PiggyBankTransaction:
-    transactions = _load_json('piggy_bank_transactions')
-    piggy_banks = _load_json('piggy_banks')
-    
     if 'id' not in data:
         import uuid
         data['id'] = str(uuid.uuid4())
     if 'created_at' not in data:
         data['created_at'] = datetime.now().isoformat()
         
-    transactions.append(data)
-    _save_json('piggy_bank_transactions', transactions)
+    _insert_records('piggy_bank_transactions', [data])
     
     # Update piggy bank current_amount
     piggy_bank_id = data.get('piggy_bank_id')
     amount = float(data.get('amount', 0))
     tx_type = data.get('type', 'deposit')
     
-    for pb in piggy_banks:
-        if pb.get('id') == piggy_bank_id:
-            if tx_type == 'deposit':
-                pb['current_amount'] = pb.get('current_amount', 0.0) + amount
-            elif tx_type == 'withdrawal':
-                pb['current_amount'] = max(0.0, pb.get('current_amount', 0.0) - amount)
-            pb['updated_at'] = datetime.now().isoformat()
-            break
-    
-    _save_json('piggy_banks', piggy_banks)
+    pb = get_by_id('piggy_banks', piggy_bank_id)
+    if pb is not None:
+        if tx_type == 'deposit':
+            pb['current_amount'] = pb.get('current_amount', 0.0) + amount
+        elif tx_type == 'withdrawal':
+            pb['current_amount'] = max(0.0, pb.get('current_amount', 0.0) - amount)
+        pb['updated_at'] = datetime.now().isoformat()
+        _replace_record('piggy_banks', pb)
     
     return PiggyBankTransaction(**data)
 
 def delete_piggy_bank_transaction(transaction_id: str) -> bool:
-    transactions = _load_json('piggy_bank_transactions')
-    piggy_banks = _load_json('piggy_banks')
-    
     # Find the transaction to reverse its effect
-    tx_to_delete = None
-    for tx in transactions:
-        if tx.get('id') == transaction_id:
-            tx_to_delete = tx
-            break
+    tx_to_delete = get_by_id('piggy_bank_transactions', transaction_id)
     
     if not tx_to_delete:
         return False
@@ -615,21 +1582,17 @@ def delete_piggy_bank_transaction(transaction_id: str) -> bool:
     amount = float(tx_to_delete.get('amount', 0))
     tx_type = tx_to_delete.get('type', 'deposit')
     
-    for pb in piggy_banks:
-        if pb.get('id') == piggy_bank_id:
-            if tx_type == 'deposit':
-                pb['current_amount'] = max(0.0, pb.get('current_amount', 0.0) - amount)
-            elif tx_type == 'withdrawal':
-                pb['current_amount'] = pb.get('current_amount', 0.0) + amount
-            pb['updated_at'] = datetime.now().isoformat()
-            break
+    reversed_pb = get_by_id('piggy_banks', piggy_bank_id)
+    if reversed_pb is not None:
+        if tx_type == 'deposit':
+            reversed_pb['current_amount'] = max(0.0, reversed_pb.get('current_amount', 0.0) - amount)
+        elif tx_type == 'withdrawal':
+            reversed_pb['current_amount'] = reversed_pb.get('current_amount', 0.0) + amount
+        reversed_pb['updated_at'] = datetime.now().isoformat()
     
     # Remove transaction
-    original_len = len(transactions)
-    transactions = [t for t in transactions if t.get('id') != transaction_id]
-    
-    if len(transactions) < original_len:
-        _save_json('piggy_bank_transactions', transactions)
-        _save_json('piggy_banks', piggy_banks)
+    if _delete_records('piggy_bank_transactions', [transaction_id]):
+        if reversed_pb:
+            _replace_record('piggy_banks', reversed_pb)
         return True
     return False
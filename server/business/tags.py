@@ -26,20 +26,14 @@ COLOR_PALETTE = [
 ]
 
 def load_tags() -> List[Dict]:
-    path = get_tags_file()
-    if not os.path.exists(path):
+    if not storage._collection_exists('tags'):
         save_tags(DEFAULT_TAGS)
-        return DEFAULT_TAGS
-    try:
-        with open(path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except:
-        return DEFAULT_TAGS
+        return [dict(t) for t in DEFAULT_TAGS]
+    # Goes through the storage cache: tags are read on every transaction write
+    return storage._load_json('tags', on_error=DEFAULT_TAGS)
 
 def save_tags(tags: List[Dict]):
-    path = get_tags_file()
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(tags, f, indent=4, ensure_ascii=False)
+    storage._save_json('tags', tags)
 
 def get_unique_color(existing_tags: List[Dict], tag_id: str) -> str:
     used_colors = {tag.get("color", "").lower() for tag in existing_tags if tag.get("color")}
@@ -90,6 +84,24 @@ def get_or_create_tag(category: str) -> Tag:
     label = " ".join(word.capitalize() for word in category.split())
     return add_tag(label)
 
+def ensure_tags(categories) -> None:
+    """get_or_create_tag for many categories, with a single write for the missing ones."""
+    tags = load_tags()
+    existing_ids = {t["id"] for t in tags}
+    created = False
+    for category in categories:
+        if category.lower().strip().replace(" ", "_") in existing_ids:
+            continue
+        label = " ".join(word.capitalize() for word in category.split())
+        tag_id = label.lower().strip().replace(" ", "_")
+        if tag_id not in existing_ids:
+            tags.append({"id": tag_id, "label": label, "color": get_unique_color(tags, tag_id)})
+            created = True
+        existing_ids.add(tag_id)
+        existing_ids.add(category.lower().strip().replace(" ", "_"))
+    if created:
+        save_tags(tags)
+
 def sync_tags_from_transactions():
     """
     Sync tags from all transactions, bills, and recurring items.
@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from business import storage
+
+
+@pytest.fixture
+def user_store(tmp_path, monkeypatch):
+    """A fresh JSON store for user 'test' under a temporary data directory."""
+    monkeypatch.setattr(storage, 'BASE_DATA_DIR', str(tmp_path))
+    monkeypatch.setattr(storage, 'STORAGE_BACKEND', 'json')
+    monkeypatch.setattr(storage, 'JOURNAL_ENABLED', False)
+    monkeypatch.setattr(storage, 'PARTITIONS_ENABLED', False)
+    storage.invalidate_cache()
+    with storage.user_context('test'):
+        yield storage
+    storage.invalidate_cache()
@@ -0,0 +1,142 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+from business import export
+
+
+def _write_transactions(store, records):
+    path = store._get_files()['transactions']
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(records, f)
+    store.invalidate_cache()
+
+
+LEGACY_TRANSACTIONS = [
+    {'description': 'sem id', 'value': 10, 'type': 'expense', 'date': '2026-01-03'},
+    {'id': 7, 'description': 'id numérico', 'value': 20, 'type': 'expense', 'date': '2026-01-02'},
+    {'id': 's', 'description': 'id texto', 'value': 30, 'type': 'income', 'date': '2026-01-01'},
+]
+
+
+def test_legacy_ids_are_listed(user_store):
+    _write_transactions(user_store, LEGACY_TRANSACTIONS)
+    listed = user_store.get_transactions()
+    assert [t['description'] for t in listed] == ['sem id', 'id numérico', 'id texto']
+    assert user_store.get_summary('2026-01')['transaction_count'] == 3
+
+
+def test_legacy_ids_are_paged_and_queried(user_store):
+    _write_transactions(user_store, LEGACY_TRANSACTIONS)
+    first, cursor = user_store.get_transactions_page(limit=2)
+    rest, last = user_store.get_transactions_page(limit=2, cursor=cursor)
+    assert len(first) == 2 and len(rest) == 1 and last is None
+    assert len(user_store.query_transactions(start_date='2026-01-01')) == 3
+
+
+def test_legacy_ids_are_exported(user_store):
+    _write_transactions(user_store, LEGACY_TRANSACTIONS)
+    csv = export.export_transactions_csv()
+    for description in ('sem id', 'id numérico', 'id texto'):
+        assert description in csv
+
+
+def test_page_limit_must_be_positive(user_store):
+    with pytest.raises(ValueError):
+        user_store.get_transactions_page(limit=0)
+
+
+def test_sqlite_connections_per_thread_are_bounded(tmp_path, monkeypatch):
+    from business import sqlite_store
+    monkeypatch.setattr(sqlite_store, 'MAX_CONNECTIONS_PER_THREAD', 3)
+    opened = [sqlite_store.connect(str(tmp_path / f'user{i}')) for i in range(5)]
+    assert len(sqlite_store._local.connections) == 3
+    with pytest.raises(sqlite3.ProgrammingError):
+        opened[0].execute("SELECT 1")
+    assert sqlite_store.connect(str(tmp_path / 'user4')) is opened[4]
+
+
+def test_loaded_records_do_not_share_nested_data_with_cache(user_store):
+    user_store._save_json('cards', [{'id': 'c1', 'name': 'Card', 'billing_history': [{'period': '2026-01'}]}])
+    card = user_store._load_json('cards')[0]
+    card['billing_history'].append({'period': '2026-02'})
+    card['billing_history'][0]['period'] = 'changed'
+    assert user_store._load_json('cards')[0]['billing_history'] == [{'period': '2026-01'}]
+    assert user_store.get_by_id('cards', 'c1')['billing_history'] == [{'period': '2026-01'}]
+
+
+def test_unreadable_tags_file_falls_back_to_defaults(user_store):
+    from business import tags
+    with open(user_store._get_files()['tags'], 'w', encoding='utf-8') as f:
+        f.write('{not json')
+    user_store.invalidate_cache()
+    assert tags.load_tags() == tags.DEFAULT_TAGS
+
+
+def test_list_user_ids_skips_dot_entries(user_store):
+    from business import locks
+    user_store._save_json('tags', [])
+    with locks.lock_for(os.path.join(user_store.BASE_DATA_DIR, '.sync_outbox.json')):
+        pass
+    assert os.path.isdir(os.path.join(user_store.BASE_DATA_DIR, '.locks'))
+    assert user_store.list_user_ids() == ['test']
+
+
+ACCENTED_TRANSACTIONS = [
+    {'id': 'a1', 'description': 'Consulta SAÚDE', 'value': 10, 'type': 'expense', 'category': 'Saúde', 'date': '2026-02-01'},
+    {'id': 'a2', 'description': 'Doação à instituição', 'value': 20, 'type': 'expense', 'category': 'SAÚDE', 'date': '2026-02-02'},
+    {'id': 'a3', 'description': 'Desconto 50% no mercado', 'value': 30, 'type': 'expense', 'category': 'Mercado', 'date': '2026-02-03'},
+    {'id': 'a4', 'description': 'Educação_infantil', 'value': 40, 'type': 'income', 'category': 'educação', 'date': '2026-02-04'},
+]
+
+
+@pytest.mark.parametrize('criteria', [
+    {'categories': ['SAÚDE']},
+    {'categories': ['saúde', 'EDUCAÇÃO']},
+    {'text': 'ÇÃO'},
+    {'text': 'saúde'},
+    {'text': '50%'},
+    {'text': '%'},
+    {'text': '_'},
+    {'text': 'o_i'},
+])
+def test_sqlite_query_matches_json_backend(user_store, monkeypatch, criteria):
+    user_store._save_json('transactions', ACCENTED_TRANSACTIONS)
+    user_store.invalidate_cache()
+    from_json = [t['id'] for t in user_store.query_transactions(**criteria)]
+
+    monkeypatch.setattr(user_store, 'STORAGE_BACKEND', 'sqlite')
+    from business import sqlite_store
+    sqlite_store.replace_all(user_store.get_user_data_dir(), 'transactions', ACCENTED_TRANSACTIONS)
+    user_store.invalidate_cache()
+    assert not user_store._is_cached('transactions')
+    from_sqlite = [t['id'] for t in user_store.query_transactions(**criteria)]
+
+    assert from_json and from_sqlite == from_json
+
+
+SAME_DAY_TRANSACTIONS = [
+    {'id': 'c', 'description': 'x', 'value': 1, 'type': 'expense', 'date': '2026-03-01', 'created_at': '2026-03-01T09:00:00'},
+    {'id': 'a', 'description': 'x', 'value': 1, 'type': 'expense', 'date': '2026-03-01', 'created_at': '2026-03-01T12:00:00'},
+    {'id': 'b', 'description': 'x', 'value': 1, 'type': 'expense', 'date': '2026-03-01', 'created_at': '2026-03-01T09:00:00'},
+    {'id': 'd', 'description': 'x', 'value': 1, 'type': 'expense', 'date': '2026-03-01'},
+    {'id': 'e', 'description': 'x', 'value': 1, 'type': 'expense', 'date': '2026-03-02', 'created_at': '2026-01-01T00:00:00'},
+]
+
+
+@pytest.mark.parametrize('limit', [None, 2, 4])
+def test_sqlite_query_orders_like_json_backend(user_store, monkeypatch, limit):
+    user_store._save_json('transactions', SAME_DAY_TRANSACTIONS)
+    user_store.invalidate_cache()
+    from_json = [t['id'] for t in user_store.query_transactions(limit=limit)]
+
+    monkeypatch.setattr(user_store, 'STORAGE_BACKEND', 'sqlite')
+    from business import sqlite_store
+    sqlite_store.replace_all(user_store.get_user_data_dir(), 'transactions', SAME_DAY_TRANSACTIONS)
+    user_store.invalidate_cache()
+    from_sqlite = [t['id'] for t in user_store.query_transactions(limit=limit)]
+
+    assert from_json == ['e', 'a', 'c', 'b', 'd'][:limit]
+    assert from_sqlite == from_json